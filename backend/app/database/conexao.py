@@ -2,7 +2,9 @@
 Configuração de Conexão com Banco de Dados
 """
 
-from sqlalchemy import create_engine
+from sqlalchemy import Text, bindparam, cast, create_engine, event, func, inspect, select, text, update
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -16,12 +18,116 @@ DATABASE_URL = os.getenv(
     "sqlite:///./datasciencepro.db"
 )
 
+# Pool de conexões de bancos servidores (PostgreSQL, MySQL)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Conexões mais velhas que isto são refeitas (evita quedas por ociosidade no servidor)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# SQLite: espera por travas em vez de falhar com "database is locked",
+# cache de páginas em KiB e janela de memory-map em bytes
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "30000"))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_CACHE_KB = int(os.getenv("SQLITE_CACHE_KB", "65536"))
+SQLITE_MMAP_BYTES = int(os.getenv("SQLITE_MMAP_BYTES", str(256 * 1024 * 1024)))
+
+
+# Driver assíncrono de cada banco, usado pelo acesso das rotas
+DRIVERS_ASYNC = {"sqlite": "aiosqlite", "postgresql": "asyncpg", "mysql": "aiomysql"}
+
+
+def eh_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def url_async(url: str) -> str:
+    """A mesma URL com o driver assíncrono (ex.: postgresql:// -> postgresql+asyncpg://)"""
+    url_sa = make_url(url)
+    backend = url_sa.get_backend_name()
+    if backend not in DRIVERS_ASYNC:
+        raise ValueError(f"Sem driver assíncrono para o banco '{backend}'")
+    return url_sa.set(drivername=f"{backend}+{DRIVERS_ASYNC[backend]}").render_as_string(hide_password=False)
+
+
+def configurar_sqlite(conexao_dbapi, _registro_conexao):
+    """
+    Pragmas aplicados a cada conexão SQLite aberta pelo pool. Em WAL os
+    leitores não bloqueiam o escritor e vice-versa; com synchronous=NORMAL
+    o commit não espera o fsync do WAL (é durável diante de queda do
+    processo, não de queda de energia).
+    """
+    cursor = conexao_dbapi.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KB}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_BYTES}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cursor.close()
+
+
+def criar_engine(url: str = DATABASE_URL) -> Engine:
+    """
+    Engine do SQLAlchemy para `url`: SQLite com os pragmas de
+    `configurar_sqlite`; bancos servidores com pool dimensionado,
+    reciclagem e verificação da conexão antes do uso (pre-ping)
+    """
+    if eh_sqlite(url):
+        engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+        )
+        event.listen(engine, "connect", configurar_sqlite)
+        return engine
+    return create_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True
+    )
+
+
+def criar_engine_async(url: str = DATABASE_URL) -> AsyncEngine:
+    """
+    Engine assíncrona com a mesma configuração de `criar_engine`. No SQLite
+    o aiosqlite executa cada conexão em uma thread própria, então a espera
+    por travas (busy_timeout) não bloqueia o event loop.
+    """
+    if eh_sqlite(url):
+        engine = create_async_engine(
+            url_async(url),
+            connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+        )
+        event.listen(engine.sync_engine, "connect", configurar_sqlite)
+        return engine
+    return create_async_engine(
+        url_async(url),
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True
+    )
+
+
 # Criar engine do SQLAlchemy
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {})
+engine = criar_engine()
+
+# Engine assíncrona das rotas; a síncrona fica para tarefas em processos e scripts
+engine_async = criar_engine_async()
 
 # Criar SessionLocal
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Sessões assíncronas não expiram os objetos no commit: depois dele,
+# ler um atributo exigiria uma consulta implícita, proibida fora de `await`
+SessionLocalAsync = async_sessionmaker(engine_async, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 # Base para modelos
 Base = declarative_base()
 
@@ -34,6 +140,75 @@ async def inicializar_database():
     
     # Criar todas as tabelas
     Base.metadata.create_all(bind=engine)
+    migrar_analises()
+
+def migrar_analises():
+    """
+    Migração leve de bancos criados antes das colunas `acuracia` e
+    `artefato` e dos índices de `analises` (create_all não altera tabelas
+    existentes). Idempotente.
+    """
+    from app.modelos.analise import Analise, StatusAnalise, TipoAnalise, acuracia_dos_resultados
+    
+    tabela = Analise.__table__
+    colunas = {coluna["name"] for coluna in inspect(engine).get_columns(tabela.name)}
+    with engine.begin() as conexao:
+        for nome in ("acuracia", "artefato"):
+            if nome not in colunas:
+                tipo = tabela.c[nome].type.compile(dialect=engine.dialect)
+                conexao.execute(text(f"ALTER TABLE {tabela.name} ADD COLUMN {nome} {tipo}"))
+        if "acuracia" not in colunas:
+            linhas = conexao.execute(
+                select(tabela.c.id, tabela.c.resultados).where(
+                    tabela.c.tipo == TipoAnalise.CLASSIFICACAO,
+                    tabela.c.status == StatusAnalise.CONCLUIDA
+                )
+            ).all()
+            valores = [
+                {"id_analise": id_analise, "valor": acuracia_dos_resultados(resultados)}
+                for id_analise, resultados in linhas
+            ]
+            valores = [v for v in valores if v["valor"] is not None]
+            if valores:
+                conexao.execute(
+                    update(tabela).where(tabela.c.id == bindparam("id_analise")).values(acuracia=bindparam("valor")),
+                    valores
+                )
+        for indice in tabela.indexes:
+            indice.create(conexao, checkfirst=True)
+    externalizar_documentos_grandes()
+
+def externalizar_documentos_grandes():
+    """
+    Move para o armazenamento de artefatos os documentos de análises
+    concluídas que passam do limiar, uma análise por transação. O espaço
+    só volta ao disco depois de um VACUUM (SQLite) ou equivalente.
+    """
+    from app.modelos.analise import Analise, StatusAnalise
+    from app.servicos.armazenamento_artefatos import ARTEFATOS_LIMIAR_BYTES, separar_documento
+    
+    tabela = Analise.__table__
+    tamanho = sum(
+        func.coalesce(func.length(cast(tabela.c[nome], Text)), 0)
+        for nome in ("resultados", "graficos", "relatorio")
+    )
+    with engine.connect() as conexao:
+        ids = conexao.execute(
+            select(tabela.c.id).where(
+                tabela.c.status == StatusAnalise.CONCLUIDA,
+                tabela.c.artefato.is_(None),
+                tamanho > ARTEFATOS_LIMIAR_BYTES
+            )
+        ).scalars().all()
+    
+    for id_analise in ids:
+        with engine.begin() as conexao:
+            linha = conexao.execute(
+                select(tabela.c.resultados, tabela.c.graficos, tabela.c.relatorio).where(tabela.c.id == id_analise)
+            ).one()
+            colunas, referencia = separar_documento(dict(linha._mapping))
+            if referencia is not None:
+                conexao.execute(update(tabela).where(tabela.c.id == id_analise).values(**colunas, artefato=referencia))
 
 def obter_db():
     """
@@ -45,6 +220,14 @@ def obter_db():
     finally:
         db.close()
 
+async def obter_db_async():
+    """
+    Dependency para obter sessão assíncrona do banco de dados. Consultas
+    e commits devem ser aguardados (`await db.execute(...)`, `await db.commit()`).
+    """
+    async with SessionLocalAsync() as db:
+        yield db
+
 # Alias para compatibilidade
 def get_db():
     """Alias para obter_db para compatibilidade"""
@@ -2,11 +2,12 @@
 Modelo de Análise
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, JSON, Enum
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, JSON, Enum, Float, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database.conexao import Base
 import enum
+from typing import Optional
 
 class TipoAnalise(enum.Enum):
     DESCRITIVA = "descritiva"
@@ -30,15 +31,17 @@ class Analise(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     nome = Column(String(200), nullable=False)
-    tipo = Column(Enum(TipoAnalise), nullable=False)
-    status = Column(Enum(StatusAnalise), default=StatusAnalise.PENDENTE)
+    tipo = Column(Enum(TipoAnalise), nullable=False, index=True)
+    status = Column(Enum(StatusAnalise), default=StatusAnalise.PENDENTE, index=True)
     parametros = Column(JSON)  # parâmetros da análise
     resultados = Column(JSON)  # resultados da análise
     graficos = Column(JSON)  # dados dos gráficos
     relatorio = Column(Text)  # relatório em markdown/html
+    artefato = Column(JSON)  # referência ao documento completo no armazenamento de artefatos (documentos grandes)
     tempo_execucao = Column(Integer)  # em segundos
-    projeto_id = Column(Integer, ForeignKey("projetos.id"), nullable=False)
-    dataset_id = Column(Integer, ForeignKey("datasets.id"), nullable=False)
+    acuracia = Column(Float, index=True)  # acurácia do melhor modelo (cópia de resultados, para listagens)
+    projeto_id = Column(Integer, ForeignKey("projetos.id"), nullable=False, index=True)
+    dataset_id = Column(Integer, ForeignKey("datasets.id"), nullable=False, index=True)
     data_criacao = Column(DateTime(timezone=True), server_default=func.now())
     data_conclusao = Column(DateTime(timezone=True))
     
@@ -46,5 +49,19 @@ class Analise(Base):
     projeto = relationship("Projeto", back_populates="analises")
     dataset = relationship("Dataset", back_populates="analises")
     
+    __table_args__ = (
+        # Listagem de modelos: status e tipo sempre filtrados, projeto opcional
+        Index("ix_analises_status_tipo_projeto", "status", "tipo", "projeto_id"),
+    )
+    
     def __repr__(self):
         return f"<Analise(nome='{self.nome}', tipo={self.tipo.value})>"
+
+def acuracia_dos_resultados(resultados) -> Optional[float]:
+    """Acurácia do melhor modelo de um AutoML de classificação (None se não houver)"""
+    melhor = (resultados or {}).get("melhor_modelo") or {}
+    metricas = melhor.get("metricas") or {}
+    # O AutoML guarda em "metricas" o registro completo do algoritmo vencedor
+    metricas = metricas.get("metricas", metricas)
+    acuracia = metricas.get("accuracy")
+    return float(acuracia) if acuracia is not None else None
@@ -4,6 +4,7 @@ Modelo de Usuário
 
 from sqlalchemy import Column, Integer, String, DateTime, Boolean
 from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
 from app.database.conexao import Base
 
 class Usuario(Base):
@@ -17,5 +18,8 @@ class Usuario(Base):
     data_criacao = Column(DateTime(timezone=True), server_default=func.now())
     ultimo_acesso = Column(DateTime(timezone=True), onupdate=func.now())
     
+    # Relacionamentos
+    projetos = relationship("Projeto", back_populates="usuario")
+    
     def __repr__(self):
         return f"<Usuario(nome='{self.nome}', email='{self.email}')>"
@@ -2,10 +2,14 @@
 Rotas para Análise de Dados
 """
 
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, load_only
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 import pandas as pd
 import numpy as np
 from scipy import stats
@@ -13,41 +17,202 @@ from sklearn.cluster import KMeans, DBSCAN, AgglomerativeClustering
 from sklearn.decomposition import PCA, FactorAnalysis
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import silhouette_score
-import json
+import hashlib
+import os
+from datetime import datetime
 
-from app.database.conexao import obter_db
+from app.database.conexao import SessionLocalAsync, obter_db_async
 from app.modelos.dataset import Dataset
 from app.modelos.analise import Analise, TipoAnalise, StatusAnalise
-from app.servicos.analise_estatistica import (
-    AnalisadorEstatistico, 
-    executar_analise_clustering, 
-    executar_analise_fatorial,
-    executar_analise_correlacao
+from app.servicos.estatisticas import analise_descritiva as calcular_analise_descritiva
+from app.utils.serializacao import RespostaORJSON, TIPO_JSON, dumps
+from app.servicos.cache_analises import cache_analises, impressao_digital_arquivo
+from app.servicos.executor_tarefas import FilaCheia, executor_tarefas, marcar_analise_com_erro
+from app.servicos.carregador_datasets import carregador_datasets
+from app.servicos.armazenamento_artefatos import armazenamento_artefatos, separar_documento
+from app.servicos.progresso import canal_progresso, evento_progresso, publicar_progresso, ETAPAS_FINAIS
+from app.servicos.correlacao import (
+    matriz_correlacao as calcular_matriz_correlacao,
+    pares_fortes,
+    armazenamento_matrizes,
+    METODOS_CORRELACAO,
+    CORRELACAO_LIMITE_COLUNAS_DENSA
 )
-from app.servicos.analise_estatistica import AnalisadorEstatistico
-from app.servicos.visualizacao import GeradorVisualizacao
+
+# Clustering, análise fatorial e gráficos dependem de serviços opcionais:
+# sem eles, essas rotas respondem 501 e as análises são concluídas sem gráficos
+try:
+    from app.servicos.analise_estatistica import (
+        executar_analise_clustering,
+        executar_analise_fatorial
+    )
+    ANALISE_ESTATISTICA_DISPONIVEL = True
+except ImportError:
+    ANALISE_ESTATISTICA_DISPONIVEL = False
+
+try:
+    from app.servicos.visualizacao import GeradorVisualizacao
+    VISUALIZACAO_DISPONIVEL = True
+except ImportError:
+    VISUALIZACAO_DISPONIVEL = False
 
 router = APIRouter()
 
+# Intervalo máximo sem mensagens no fluxo de progresso; a cada intervalo
+# sem eventos o status também é conferido no banco
+PROGRESSO_KEEPALIVE_SEGUNDOS = float(os.getenv("PROGRESSO_KEEPALIVE_SEGUNDOS", "15"))
+
+# Colunas lidas pela consulta de status
+COLUNAS_STATUS = (
+    Analise.id,
+    Analise.nome,
+    Analise.tipo,
+    Analise.status,
+    Analise.data_criacao,
+    Analise.data_conclusao,
+    Analise.tempo_execucao
+)
+
 class SolicitacaoAnalise(BaseModel):
     dataset_id: int
     tipo_analise: str
     parametros: Optional[Dict[str, Any]] = {}
     colunas_selecionadas: Optional[List[str]] = []
 
+# Parâmetros vindos do JSON da solicitação: valores inválidos respondem 400
+
+VALORES_VERDADEIROS = ("true", "1", "sim")
+VALORES_FALSOS = ("false", "0", "nao", "não", "")
+
+def parametro_booleano(parametros: Dict[str, Any], nome: str, padrao: bool = False) -> bool:
+    """Booleano JSON, 0/1 ou texto ("true"/"false"); bool("false") seria True"""
+    valor = parametros.get(nome, padrao)
+    if valor is None:
+        return padrao
+    if isinstance(valor, bool):
+        return valor
+    if isinstance(valor, int) and valor in (0, 1):
+        return bool(valor)
+    if isinstance(valor, str) and valor.strip().lower() in VALORES_VERDADEIROS + VALORES_FALSOS:
+        return valor.strip().lower() in VALORES_VERDADEIROS
+    raise HTTPException(status_code=400, detail=f"Parâmetro '{nome}' deve ser verdadeiro ou falso")
+
+def parametro_inteiro(
+    parametros: Dict[str, Any],
+    nome: str,
+    padrao: Optional[int] = None,
+    minimo: Optional[int] = None
+) -> Optional[int]:
+    """Inteiro (também em texto, como "10"); números com parte fracionária são recusados"""
+    valor = parametros.get(nome, padrao)
+    if valor is None:
+        return padrao
+    try:
+        if isinstance(valor, bool) or float(valor) != int(float(valor)):
+            raise ValueError(valor)
+        valor = int(float(valor))
+    except (TypeError, ValueError, OverflowError):
+        raise HTTPException(status_code=400, detail=f"Parâmetro '{nome}' deve ser um número inteiro")
+    if minimo is not None and valor < minimo:
+        raise HTTPException(status_code=400, detail=f"Parâmetro '{nome}' deve ser no mínimo {minimo}")
+    return valor
+
+def parametro_real(
+    parametros: Dict[str, Any],
+    nome: str,
+    padrao: float,
+    minimo: float,
+    maximo: float
+) -> float:
+    valor = parametros.get(nome, padrao)
+    try:
+        if isinstance(valor, bool):
+            raise ValueError(valor)
+        valor = float(padrao if valor is None else valor)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Parâmetro '{nome}' deve ser numérico")
+    if not minimo <= valor <= maximo:
+        raise HTTPException(status_code=400, detail=f"Parâmetro '{nome}' deve estar entre {minimo} e {maximo}")
+    return valor
+
+def verificar_analise_estatistica():
+    """Recusa as análises que dependem do serviço de análise estatística quando ele não está disponível"""
+    if not ANALISE_ESTATISTICA_DISPONIVEL:
+        raise HTTPException(
+            status_code=501,
+            detail="Serviço de análise estatística indisponível neste servidor."
+        )
+
+async def obter_impressao_dataset(dataset: Dataset) -> Optional[str]:
+    """Impressão digital do conteúdo do dataset, ou None se o arquivo não puder ser lido"""
+    try:
+        return await run_in_threadpool(impressao_digital_arquivo, dataset.caminho_arquivo)
+    except OSError:
+        return None
+
+def verificar_capacidade_tarefas():
+    """Recusa novas análises quando a fila de tarefas está cheia"""
+    if executor_tarefas.fila_cheia():
+        raise HTTPException(
+            status_code=503,
+            detail="Fila de análises cheia. Tente novamente em instantes."
+        )
+
+def obter_do_cache(impressao: Optional[str], tipo: str, parametros: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Resultado memorizado, se os arquivos a que ele se refere (artefato e
+    matriz de correlação) ainda existirem; senão o item sai do cache
+    """
+    em_cache = cache_analises.obter(impressao, tipo, parametros) if impressao else None
+    if em_cache is None:
+        return None
+    artefato = em_cache.get("artefato")
+    origem = em_cache.get("matriz_origem")
+    if (artefato and not armazenamento_artefatos.existe(artefato)) or (
+        origem is not None and not armazenamento_matrizes.existe(origem)
+    ):
+        cache_analises.remover(impressao, tipo, parametros)
+        return None
+    return em_cache
+
+async def concluir_do_cache(db: AsyncSession, analise: Analise, em_cache: Dict[str, Any]) -> Dict[str, Any]:
+    """Conclui a análise imediatamente com um resultado memorizado (documentos grandes reutilizam o artefato)"""
+    analise.status = StatusAnalise.CONCLUIDA
+    analise.resultados = em_cache["resultados"]
+    analise.graficos = em_cache["graficos"]
+    analise.relatorio = em_cache.get("relatorio")
+    analise.artefato = em_cache.get("artefato")
+    analise.tempo_execucao = 0
+    analise.data_conclusao = datetime.now()
+    await db.commit()
+    await canal_progresso.publicar(evento_progresso(
+        analise.id, "concluida", 100, referencia=referencia_resultado(analise.id, analise.artefato)
+    ))
+    
+    return {
+        "analise_id": analise.id,
+        "status": "concluida",
+        "mensagem": "Resultado obtido do cache de análises."
+    }
+
 @router.post("/descritiva")
 async def analise_descritiva(
     solicitacao: SolicitacaoAnalise,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(obter_db)
+    db: AsyncSession = Depends(obter_db_async)
 ):
     """
     Executa análise estatística descritiva completa
     """
-    dataset = db.query(Dataset).filter(Dataset.id == solicitacao.dataset_id).first()
+    dataset = await db.get(Dataset, solicitacao.dataset_id)
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset não encontrado")
     
+    impressao = await obter_impressao_dataset(dataset)
+    parametros_cache = {"colunas": solicitacao.colunas_selecionadas}
+    em_cache = obter_do_cache(impressao, "descritiva", parametros_cache)
+    if em_cache is None:
+        verificar_capacidade_tarefas()
+    
     # Criar registro de análise
     analise = Analise(
         nome=f"Análise Descritiva - {dataset.nome}",
@@ -58,17 +223,31 @@ async def analise_descritiva(
         dataset_id=dataset.id
     )
     db.add(analise)
-    db.commit()
-    db.refresh(analise)
+    await db.commit()
+    await db.refresh(analise)
     
-    # Executar análise em background
-    background_tasks.add_task(
-        executar_analise_descritiva,
-        analise.id,
-        dataset.caminho_arquivo,
-        dataset.tipo_arquivo,
-        solicitacao.colunas_selecionadas
-    )
+    if em_cache is not None:
+        return await concluir_do_cache(db, analise, em_cache)
+    
+    # Executar análise em um processo do pool
+    analise_id = analise.id
+    try:
+        executor_tarefas.submeter(
+            "descritiva",
+            executar_analise_descritiva,
+            analise_id,
+            dataset.id,
+            solicitacao.colunas_selecionadas,
+            ao_concluir=lambda resultado: guardar_no_cache(impressao, "descritiva", parametros_cache, resultado),
+            ao_falhar=lambda erro: marcar_analise_com_erro(analise_id, erro)
+        )
+    except FilaCheia as e:
+        # A fila encheu depois da verificação inicial
+        await marcar_analise_com_erro(analise_id, e)
+        raise HTTPException(
+            status_code=503,
+            detail="Fila de análises cheia. Tente novamente em instantes."
+        )
     
     return {
         "analise_id": analise.id,
@@ -79,16 +258,38 @@ async def analise_descritiva(
 @router.post("/correlacao")
 async def analise_correlacao(
     solicitacao: SolicitacaoAnalise,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(obter_db)
+    db: AsyncSession = Depends(obter_db_async)
 ):
     """
     Executa análise de correlação entre variáveis
     """
-    dataset = db.query(Dataset).filter(Dataset.id == solicitacao.dataset_id).first()
+    dataset = await db.get(Dataset, solicitacao.dataset_id)
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset não encontrado")
     
+    metodo = solicitacao.parametros.get("metodo", "pearson")
+    if metodo not in METODOS_CORRELACAO:
+        raise HTTPException(status_code=400, detail=f"Método deve ser um de: {', '.join(METODOS_CORRELACAO)}")
+    limiar = parametro_real(solicitacao.parametros, "limiar", 0.5, minimo=0.0, maximo=1.0)
+    top_k = parametro_inteiro(solicitacao.parametros, "top_k", minimo=1)
+    float32 = parametro_booleano(solicitacao.parametros, "float32")
+    em_blocos = parametro_booleano(solicitacao.parametros, "em_blocos")
+    if em_blocos and metodo == "kendall":
+        raise HTTPException(status_code=400, detail="O modo em blocos suporta apenas pearson e spearman")
+    
+    impressao = await obter_impressao_dataset(dataset)
+    parametros_cache = {
+        "colunas": solicitacao.colunas_selecionadas,
+        "metodo": metodo,
+        "limiar": limiar,
+        "top_k": top_k,
+        "float32": float32,
+        "em_blocos": em_blocos
+    }
+    em_cache = obter_do_cache(impressao, "correlacao", parametros_cache)
+    if em_cache is None:
+        verificar_capacidade_tarefas()
+    
     analise = Analise(
         nome=f"Análise de Correlação - {dataset.nome}",
         tipo=TipoAnalise.CORRELACAO,
@@ -98,17 +299,35 @@ async def analise_correlacao(
         dataset_id=dataset.id
     )
     db.add(analise)
-    db.commit()
-    db.refresh(analise)
+    await db.commit()
+    await db.refresh(analise)
     
-    background_tasks.add_task(
-        executar_analise_correlacao,
-        analise.id,
-        dataset.caminho_arquivo,
-        dataset.tipo_arquivo,
-        solicitacao.colunas_selecionadas,
-        solicitacao.parametros.get("metodo", "pearson")
-    )
+    if em_cache is not None and vincular_matriz(em_cache, analise.id):
+        return await concluir_do_cache(db, analise, em_cache)
+    
+    analise_id = analise.id
+    try:
+        executor_tarefas.submeter(
+            "correlacao",
+            executar_analise_correlacao,
+            analise_id,
+            dataset.id,
+            solicitacao.colunas_selecionadas,
+            metodo,
+            limiar,
+            top_k,
+            float32,
+            em_blocos,
+            ao_concluir=lambda resultado: guardar_no_cache(impressao, "correlacao", parametros_cache, resultado),
+            ao_falhar=lambda erro: marcar_analise_com_erro(analise_id, erro)
+        )
+    except FilaCheia as e:
+        # A fila encheu depois da verificação inicial
+        await marcar_analise_com_erro(analise_id, e)
+        raise HTTPException(
+            status_code=503,
+            detail="Fila de análises cheia. Tente novamente em instantes."
+        )
     
     return {
         "analise_id": analise.id,
@@ -120,12 +339,13 @@ async def analise_correlacao(
 async def analise_clustering(
     solicitacao: SolicitacaoAnalise,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(obter_db)
+    db: AsyncSession = Depends(obter_db_async)
 ):
     """
     Executa análise de clustering (agrupamento)
     """
-    dataset = db.query(Dataset).filter(Dataset.id == solicitacao.dataset_id).first()
+    verificar_analise_estatistica()
+    dataset = await db.get(Dataset, solicitacao.dataset_id)
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset não encontrado")
     
@@ -138,8 +358,8 @@ async def analise_clustering(
         dataset_id=dataset.id
     )
     db.add(analise)
-    db.commit()
-    db.refresh(analise)
+    await db.commit()
+    await db.refresh(analise)
     
     background_tasks.add_task(
         executar_analise_clustering,
@@ -160,12 +380,13 @@ async def analise_clustering(
 async def analise_fatorial(
     solicitacao: SolicitacaoAnalise,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(obter_db)
+    db: AsyncSession = Depends(obter_db_async)
 ):
     """
     Executa análise fatorial
     """
-    dataset = db.query(Dataset).filter(Dataset.id == solicitacao.dataset_id).first()
+    verificar_analise_estatistica()
+    dataset = await db.get(Dataset, solicitacao.dataset_id)
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset não encontrado")
     
@@ -178,8 +399,8 @@ async def analise_fatorial(
         dataset_id=dataset.id
     )
     db.add(analise)
-    db.commit()
-    db.refresh(analise)
+    await db.commit()
+    await db.refresh(analise)
     
     background_tasks.add_task(
         executar_analise_fatorial,
@@ -199,12 +420,13 @@ async def analise_fatorial(
 @router.get("/status/{analise_id}")
 async def verificar_status_analise(
     analise_id: int,
-    db: Session = Depends(obter_db)
+    db: AsyncSession = Depends(obter_db_async)
 ):
     """
     Verifica o status de uma análise
     """
-    analise = db.query(Analise).filter(Analise.id == analise_id).first()
+    # Consultado em laço: não carrega resultados, gráficos nem relatório
+    analise = await db.get(Analise, analise_id, options=[load_only(*COLUNAS_STATUS)])
     if not analise:
         raise HTTPException(status_code=404, detail="Análise não encontrada")
     
@@ -218,15 +440,75 @@ async def verificar_status_analise(
         "tempo_execucao": analise.tempo_execucao
     }
 
+async def estado_progresso(analise_id: int) -> Tuple[bool, Optional[Dict[str, Any]]]:
+    """
+    (existe, evento final) da análise segundo o banco; o evento é None
+    enquanto ela não terminou. Usa sessão própria e curta: o fluxo de
+    progresso não segura uma conexão enquanto espera.
+    """
+    async with SessionLocalAsync() as db:
+        analise = await db.get(Analise, analise_id, options=[load_only(Analise.id, Analise.status, Analise.artefato)])
+        if analise is None:
+            return False, None
+        if analise.status == StatusAnalise.CONCLUIDA:
+            return True, evento_progresso(
+                analise_id, "concluida", 100, referencia=referencia_resultado(analise_id, analise.artefato)
+            )
+        if analise.status == StatusAnalise.ERRO:
+            resultados = await db.scalar(select(Analise.resultados).where(Analise.id == analise_id))
+            return True, evento_progresso(analise_id, "erro", None, mensagem=(resultados or {}).get("erro"))
+        return True, None
+
+def mensagem_sse(evento: Dict[str, Any]) -> bytes:
+    tipo = evento["etapa"] if evento["etapa"] in ETAPAS_FINAIS else "progresso"
+    return b"event: " + tipo.encode() + b"\ndata: " + dumps(evento) + b"\n\n"
+
+@router.get("/progresso/{analise_id}")
+async def acompanhar_progresso(analise_id: int):
+    """
+    Fluxo de server-sent events com o progresso de uma análise: eventos
+    `progresso` (etapa e percentual) e, por fim, `concluida` (com a
+    referência do resultado) ou `erro`, após o qual o fluxo é encerrado
+    """
+    existe, final = await estado_progresso(analise_id)
+    if not existe:
+        raise HTTPException(status_code=404, detail="Análise não encontrada")
+    
+    async def fluxo():
+        if final is not None:
+            yield mensagem_sse(final)
+            return
+        async with canal_progresso.assinar(analise_id) as assinatura:
+            while True:
+                evento = await assinatura.proximo(PROGRESSO_KEEPALIVE_SEGUNDOS)
+                if evento is None:
+                    # Sem eventos no intervalo: a tarefa pode ter terminado fora deste processo
+                    _, evento = await estado_progresso(analise_id)
+                    if evento is None:
+                        yield b": keepalive\n\n"
+                        continue
+                yield mensagem_sse(evento)
+                if evento["etapa"] in ETAPAS_FINAIS:
+                    return
+    
+    return StreamingResponse(
+        fluxo(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/resultados/{analise_id}")
 async def obter_resultados_analise(
     analise_id: int,
-    db: Session = Depends(obter_db)
+    request: Request,
+    db: AsyncSession = Depends(obter_db_async)
 ):
     """
-    Obtém os resultados de uma análise concluída
+    Obtém os resultados de uma análise concluída. Documentos guardados no
+    armazenamento de artefatos são transmitidos do disco, com ETag e
+    suporte a Range (ex.: `Range: bytes=0-1048575`)
     """
-    analise = db.query(Analise).filter(Analise.id == analise_id).first()
+    analise = await db.get(Analise, analise_id)
     if not analise:
         raise HTTPException(status_code=404, detail="Análise não encontrada")
     
@@ -236,99 +518,330 @@ async def obter_resultados_analise(
             detail=f"Análise ainda não concluída. Status atual: {analise.status.value}"
         )
     
-    return {
+    metadados = {
         "id": analise.id,
         "nome": analise.nome,
         "tipo": analise.tipo.value,
-        "resultados": analise.resultados,
-        "graficos": analise.graficos,
-        "relatorio": analise.relatorio,
         "tempo_execucao": analise.tempo_execucao,
         "data_conclusao": analise.data_conclusao
     }
+    if analise.artefato:
+        return responder_artefato(request, metadados, analise.artefato)
+    
+    # Resultados grandes vão direto para o orjson, sem o jsonable_encoder
+    return RespostaORJSON({
+        **metadados,
+        "resultados": analise.resultados,
+        "graficos": analise.graficos,
+        "relatorio": analise.relatorio
+    })
+
+def intervalo_solicitado(request: Request, etag: str, tamanho: int) -> Optional[Tuple[int, int]]:
+    """
+    Intervalo [inicio, fim) de um cabeçalho Range com uma única faixa de
+    bytes. None = resposta completa (sem Range, várias faixas ou If-Range
+    de outra versão); levanta 416 se a faixa estiver fora do documento.
+    """
+    cabecalho = request.headers.get("range")
+    if not cabecalho or not cabecalho.startswith("bytes=") or "," in cabecalho:
+        return None
+    if request.headers.get("if-range", etag) != etag:
+        return None
+    inicio, _, fim = cabecalho[len("bytes="):].strip().partition("-")
+    try:
+        if inicio:
+            inicio, fim = int(inicio), min(int(fim) + 1, tamanho) if fim else tamanho
+        else:
+            # Sufixo: os últimos N bytes
+            inicio, fim = max(tamanho - int(fim), 0), tamanho
+    except ValueError:
+        return None
+    if inicio >= fim and inicio < tamanho:
+        # Faixa inválida (fim antes do início): ignorada
+        return None
+    if inicio >= tamanho:
+        raise HTTPException(
+            status_code=416,
+            detail="Intervalo fora do documento",
+            headers={"Content-Range": f"bytes */{tamanho}"}
+        )
+    return inicio, fim
+
+def responder_artefato(request: Request, metadados: Dict[str, Any], referencia: Dict[str, Any]) -> Response:
+    """
+    Transmite `{metadados..., resultados, graficos, relatorio}`: o JSON dos
+    metadados seguido do artefato sem o "{" inicial, lido em blocos do disco
+    """
+    if not armazenamento_artefatos.existe(referencia):
+        raise HTTPException(status_code=404, detail="Artefato da análise não encontrado")
+    
+    prefixo = dumps(metadados)[:-1] + b","
+    tamanho = len(prefixo) + referencia["bytes"] - 1
+    etag = f'"{referencia["hash"][:32]}-{hashlib.sha256(prefixo).hexdigest()[:16]}"'
+    cabecalhos = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": "no-cache"}
+    
+    if request.headers.get("if-none-match") in (etag, "*"):
+        return Response(status_code=304, headers=cabecalhos)
+    
+    intervalo = intervalo_solicitado(request, etag, tamanho)
+    inicio, fim = intervalo or (0, tamanho)
+    
+    def blocos():
+        if inicio < len(prefixo):
+            yield prefixo[inicio:min(fim, len(prefixo))]
+        if fim > len(prefixo):
+            # Posição no documento -> posição no artefato (que conserva o "{")
+            yield from armazenamento_artefatos.ler(
+                referencia, max(inicio - len(prefixo), 0) + 1, fim - len(prefixo) + 1
+            )
+    
+    cabecalhos["Content-Length"] = str(fim - inicio)
+    if intervalo is not None:
+        cabecalhos["Content-Range"] = f"bytes {inicio}-{fim - 1}/{tamanho}"
+    return StreamingResponse(
+        blocos(),
+        status_code=206 if intervalo is not None else 200,
+        media_type=TIPO_JSON,
+        headers=cabecalhos
+    )
+
+@router.get("/correlacao/{analise_id}/bloco")
+async def obter_bloco_correlacao(
+    analise_id: int,
+    linha_inicio: int = Query(0, ge=0),
+    coluna_inicio: int = Query(0, ge=0),
+    tamanho: int = Query(256, ge=1, le=1000),
+    db: AsyncSession = Depends(obter_db_async)
+):
+    """
+    Lê um bloco da matriz de uma correlação calculada em blocos,
+    direto do arquivo em disco
+    """
+    analise = await db.get(Analise, analise_id)
+    if not analise:
+        raise HTTPException(status_code=404, detail="Análise não encontrada")
+    
+    matriz = (analise.resultados or {}).get("matriz")
+    if analise.status != StatusAnalise.CONCLUIDA or not matriz:
+        raise HTTPException(status_code=400, detail="Análise não possui matriz de correlação em disco")
+    
+    try:
+        nomes, bloco = await run_in_threadpool(
+            armazenamento_matrizes.ler_bloco, analise_id, linha_inicio, coluna_inicio, tamanho
+        )
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Arquivo da matriz de correlação não encontrado")
+    
+    # O array vai direto para o orjson; NaN vira null
+    return RespostaORJSON({
+        "linha_inicio": linha_inicio,
+        "coluna_inicio": coluna_inicio,
+        "linhas": nomes[linha_inicio:linha_inicio + bloco.shape[0]],
+        "colunas": nomes[coluna_inicio:coluna_inicio + bloco.shape[1]],
+        "valores": bloco,
+        "dimensao_total": matriz["dimensao"]
+    })
+
+@router.delete("/{analise_id}")
+async def remover_analise(analise_id: int, db: AsyncSession = Depends(obter_db_async)):
+    """
+    Remove a análise e os arquivos que só ela usa: a matriz de correlação em
+    disco e o artefato (que pode ser compartilhado por análises com o mesmo documento)
+    """
+    analise = await db.get(Analise, analise_id)
+    if not analise:
+        raise HTTPException(status_code=404, detail="Análise não encontrada")
+    if analise.status in (StatusAnalise.PENDENTE, StatusAnalise.PROCESSANDO):
+        raise HTTPException(status_code=400, detail="Análise em andamento não pode ser removida")
+    
+    artefato = analise.artefato
+    await db.delete(analise)
+    await db.commit()
+    
+    await run_in_threadpool(armazenamento_matrizes.remover, analise_id)
+    if artefato:
+        compartilhado = await db.scalar(
+            select(Analise.id).where(Analise.artefato["hash"].as_string() == artefato["hash"]).limit(1)
+        )
+        if compartilhado is None:
+            await run_in_threadpool(armazenamento_artefatos.remover, artefato)
+    return {"mensagem": f"Análise {analise_id} removida com sucesso"}
+
+@router.get("/tarefas")
+async def estatisticas_tarefas():
+    """
+    Ocupação do pool de processos que executa as análises e assinaturas de progresso
+    """
+    return {**executor_tarefas.estatisticas(), "progresso": canal_progresso.estatisticas()}
 
 # Funções auxiliares para execução em background
+# Rodam em processos do executor de tarefas: são síncronas e devolvem o
+# resultado para o cache do processo principal (ou None em caso de erro)
+
+def concluir_analise(analise: Analise, documento: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Marca a análise como concluída com o documento {resultados, graficos,
+    relatorio}: inteiro nas colunas, se for pequeno, ou no armazenamento de
+    artefatos, com resumo e referência no banco. Devolve o que vai para o
+    cache de análises.
+    """
+    colunas, referencia = separar_documento(documento)
+    analise.status = StatusAnalise.CONCLUIDA
+    analise.resultados = colunas["resultados"]
+    analise.graficos = colunas["graficos"]
+    analise.relatorio = colunas.get("relatorio")
+    analise.artefato = referencia
+    return {**colunas, "artefato": referencia}
+
+def registrar_erro_analise(db: Session, analise_id: int, erro: Exception):
+    """Marca a análise como erro e publica o evento final de progresso"""
+    db.rollback()
+    analise = db.query(Analise).filter(Analise.id == analise_id).first()
+    analise.status = StatusAnalise.ERRO
+    analise.resultados = {"erro": str(erro)}
+    db.commit()
+    publicar_progresso(analise_id, "erro", mensagem=str(erro))
+
+def referencia_resultado(analise_id: int, artefato: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Onde buscar o resultado de uma análise concluída (enviado no evento final de progresso)"""
+    return {
+        "analise_id": analise_id,
+        "hash": artefato["hash"] if artefato else None,
+        "bytes": artefato["bytes"] if artefato else None
+    }
+
+def publicar_conclusao(analise_id: int, guardado: Dict[str, Any]):
+    publicar_progresso(analise_id, "concluida", 100, referencia=referencia_resultado(analise_id, guardado["artefato"]))
+
+def vincular_matriz(em_cache: Dict[str, Any], analise_id: int) -> bool:
+    """
+    Dá à análise os arquivos da matriz de um resultado memorizado do modo em
+    blocos; False se eles sumiram nesse meio tempo (a análise é recalculada)
+    """
+    origem = em_cache.get("matriz_origem")
+    if origem is None:
+        return True
+    try:
+        armazenamento_matrizes.vincular(origem, analise_id)
+    except FileNotFoundError:
+        armazenamento_matrizes.remover(analise_id)
+        return False
+    return True
+
+def guardar_no_cache(impressao: Optional[str], tipo: str, parametros: Dict[str, Any], resultado: Optional[Dict[str, Any]]):
+    """Callback do executor: memoriza o resultado de uma análise concluída"""
+    if impressao and resultado is not None:
+        cache_analises.guardar(impressao, tipo, parametros, resultado)
 
-async def executar_analise_descritiva(
+def gerar_graficos(metodo: str, *args: Any) -> Optional[Dict[str, Any]]:
+    """Gráficos do GeradorVisualizacao, ou None se o serviço de visualização não estiver disponível"""
+    if not VISUALIZACAO_DISPONIVEL:
+        return None
+    return getattr(GeradorVisualizacao(), metodo)(*args)
+
+def executar_analise_descritiva(
     analise_id: int,
-    caminho_arquivo: str,
-    tipo_arquivo: str,
+    dataset_id: int,
     colunas_selecionadas: List[str]
-):
+) -> Optional[Dict[str, Any]]:
     """Executa análise descritiva em background"""
     from app.database.conexao import SessionLocal
     
     db = SessionLocal()
     try:
-        # Carregar dados
-        df = carregar_dataframe(caminho_arquivo, tipo_arquivo)
+        # Carregar dados (apenas as colunas selecionadas são lidas do disco)
+        publicar_progresso(analise_id, "carregar", 0)
+        df = carregador_datasets.carregar_por_id(db, dataset_id, colunas_selecionadas or None)
         
         if colunas_selecionadas:
             df = df[colunas_selecionadas]
         
-        # Executar análise
-        analisador = AnalisadorEstatistico()
-        resultados = analisador.analise_descritiva(df)
+        # Executar análise (todas as colunas numéricas em uma única passada)
+        publicar_progresso(analise_id, "calcular", 25)
+        resultados = calcular_analise_descritiva(df)
         
         # Gerar visualizações
-        gerador_viz = GeradorVisualizacao()
-        graficos = gerador_viz.graficos_descritivos(df)
+        publicar_progresso(analise_id, "visualizar", 60)
+        graficos = gerar_graficos("graficos_descritivos", df)
         
         # Gerar relatório
-        relatorio = gerar_relatorio_descritivo(resultados, df)
+        publicar_progresso(analise_id, "relatorio", 85)
+        relatorio = gerar_relatorio_descritivo(resultados)
         
         # Atualizar banco
         analise = db.query(Analise).filter(Analise.id == analise_id).first()
-        analise.status = StatusAnalise.CONCLUIDA
-        analise.resultados = resultados
-        analise.graficos = graficos
-        analise.relatorio = relatorio
+        guardado = concluir_analise(analise, {
+            "resultados": resultados,
+            "graficos": graficos,
+            "relatorio": relatorio
+        })
         db.commit()
+        publicar_conclusao(analise_id, guardado)
+        
+        return guardado
         
     except Exception as e:
-        # Marcar como erro
-        analise = db.query(Analise).filter(Analise.id == analise_id).first()
-        analise.status = StatusAnalise.ERRO
-        analise.resultados = {"erro": str(e)}
-        db.commit()
+        registrar_erro_analise(db, analise_id, e)
+        return None
     finally:
         db.close()
 
-async def executar_analise_correlacao(
+def executar_analise_correlacao(
     analise_id: int,
-    caminho_arquivo: str,
-    tipo_arquivo: str,
+    dataset_id: int,
     colunas_selecionadas: List[str],
-    metodo: str = "pearson"
-):
-    """Executa análise de correlação em background"""
+    metodo: str = "pearson",
+    limiar: float = 0.5,
+    top_k: Optional[int] = None,
+    float32: bool = False,
+    em_blocos: bool = False
+) -> Optional[Dict[str, Any]]:
+    """
+    Executa análise de correlação em background. Datasets com mais de
+    CORRELACAO_LIMITE_COLUNAS_DENSA colunas numéricas (ou com `em_blocos`)
+    têm a matriz gravada em disco e apenas pares fortes e resumo no banco.
+    """
     from app.database.conexao import SessionLocal
     
     db = SessionLocal()
     try:
-        df = carregar_dataframe(caminho_arquivo, tipo_arquivo)
+        publicar_progresso(analise_id, "carregar", 0)
+        df = carregador_datasets.carregar_por_id(db, dataset_id, colunas_selecionadas or None)
         
         if colunas_selecionadas:
             df = df[colunas_selecionadas]
         
         # Selecionar apenas colunas numéricas
         df_numeric = df.select_dtypes(include=[np.number])
+        publicar_progresso(analise_id, "calcular", 25)
+        
+        if metodo != "kendall" and (em_blocos or len(df_numeric.columns) > CORRELACAO_LIMITE_COLUNAS_DENSA):
+            resultados = correlacao_em_disco(analise_id, df_numeric, metodo, limiar, top_k, float32)
+            
+            analise = db.query(Analise).filter(Analise.id == analise_id).first()
+            guardado = concluir_analise(analise, {
+                "resultados": resultados,
+                "graficos": None
+            })
+            db.commit()
+            publicar_conclusao(analise_id, guardado)
+            
+            # Resultados reaproveitados do cache recebem links para os arquivos desta análise
+            return {**guardado, "matriz_origem": analise_id}
         
         # Calcular matriz de correlação
-        matriz_correlacao = df_numeric.corr(method=metodo)
+        matriz_correlacao = calcular_matriz_correlacao(df_numeric, metodo, float32)
         
-        # Encontrar correlações mais fortes
-        correlacoes_fortes = []
-        for i in range(len(matriz_correlacao.columns)):
-            for j in range(i+1, len(matriz_correlacao.columns)):
-                corr_value = matriz_correlacao.iloc[i, j]
-                if abs(corr_value) > 0.5:  # correlações acima de 0.5
-                    correlacoes_fortes.append({
-                        "variavel1": matriz_correlacao.columns[i],
-                        "variavel2": matriz_correlacao.columns[j],
-                        "correlacao": round(corr_value, 3),
-                        "interpretacao": interpretar_correlacao(corr_value)
-                    })
+        # Encontrar correlações mais fortes (acima do limiar, da mais forte para a mais fraca)
+        correlacoes_fortes = [
+            {
+                "variavel1": variavel1,
+                "variavel2": variavel2,
+                "correlacao": round(corr_value, 3),
+                "interpretacao": interpretar_correlacao(corr_value)
+            }
+            for variavel1, variavel2, corr_value in pares_fortes(matriz_correlacao, limiar, top_k)
+        ]
         
         resultados = {
             "matriz_correlacao": matriz_correlacao.to_dict(),
@@ -338,36 +851,52 @@ async def executar_analise_correlacao(
         }
         
         # Gerar visualizações
-        gerador_viz = GeradorVisualizacao()
-        graficos = gerador_viz.heatmap_correlacao(matriz_correlacao)
+        publicar_progresso(analise_id, "visualizar", 70)
+        graficos = gerar_graficos("heatmap_correlacao", matriz_correlacao)
         
         # Atualizar banco
         analise = db.query(Analise).filter(Analise.id == analise_id).first()
-        analise.status = StatusAnalise.CONCLUIDA
-        analise.resultados = resultados
-        analise.graficos = graficos
+        guardado = concluir_analise(analise, {
+            "resultados": resultados,
+            "graficos": graficos
+        })
         db.commit()
+        publicar_conclusao(analise_id, guardado)
+        
+        return guardado
         
     except Exception as e:
-        analise = db.query(Analise).filter(Analise.id == analise_id).first()
-        analise.status = StatusAnalise.ERRO
-        analise.resultados = {"erro": str(e)}
-        db.commit()
+        registrar_erro_analise(db, analise_id, e)
+        return None
     finally:
         db.close()
 
-def carregar_dataframe(caminho_arquivo: str, tipo_arquivo: str) -> pd.DataFrame:
-    """Carrega DataFrame baseado no tipo de arquivo"""
-    if tipo_arquivo == "csv":
-        return pd.read_csv(caminho_arquivo)
-    elif tipo_arquivo == "excel":
-        return pd.read_excel(caminho_arquivo)
-    elif tipo_arquivo == "json":
-        return pd.read_json(caminho_arquivo)
-    elif tipo_arquivo == "parquet":
-        return pd.read_parquet(caminho_arquivo)
-    else:
-        raise ValueError(f"Tipo de arquivo não suportado: {tipo_arquivo}")
+def correlacao_em_disco(
+    analise_id: int,
+    df_numeric: pd.DataFrame,
+    metodo: str,
+    limiar: float,
+    top_k: Optional[int],
+    float32: bool
+) -> Dict[str, Any]:
+    """Calcula a matriz em blocos para o arquivo da análise e devolve pares fortes, resumo e a descrição da matriz"""
+    calculo = armazenamento_matrizes.gravar(analise_id, df_numeric, metodo, float32, limiar, top_k)
+    
+    return {
+        "correlacoes_fortes": [
+            {
+                "variavel1": variavel1,
+                "variavel2": variavel2,
+                "correlacao": round(corr_value, 3),
+                "interpretacao": interpretar_correlacao(corr_value)
+            }
+            for variavel1, variavel2, corr_value in calculo["pares"]
+        ],
+        "metodo": metodo,
+        "num_variaveis": len(df_numeric.columns),
+        "resumo": calculo["resumo"],
+        "matriz": calculo["matriz"]
+    }
 
 def interpretar_correlacao(valor: float) -> str:
     """Interpreta o valor de correlação"""
@@ -385,16 +914,20 @@ def interpretar_correlacao(valor: float) -> str:
     else:
         return "Correlação quase perfeita"
 
-def gerar_relatorio_descritivo(resultados: dict, df: pd.DataFrame) -> str:
+def formatar_numero(valor: Optional[float]) -> str:
+    return f"{valor:.2f}" if valor is not None else "N/A"
+
+def gerar_relatorio_descritivo(resultados: dict) -> str:
     """Gera relatório em markdown da análise descritiva"""
+    resumo = resultados.get("resumo", {})
     relatorio = f"""
 # Relatório de Análise Descritiva
 
 ## Resumo dos Dados
-- **Total de registros**: {len(df):,}
-- **Total de variáveis**: {len(df.columns)}
-- **Variáveis numéricas**: {len(df.select_dtypes(include=[np.number]).columns)}
-- **Variáveis categóricas**: {len(df.select_dtypes(include=['object']).columns)}
+- **Total de registros**: {resumo.get('num_registros', 0):,}
+- **Total de variáveis**: {resumo.get('num_variaveis', 0)}
+- **Variáveis numéricas**: {resumo.get('variaveis_numericas', 0)}
+- **Variáveis categóricas**: {resumo.get('variaveis_categoricas', 0)}
 
 ## Estatísticas Descritivas
 
@@ -404,11 +937,11 @@ def gerar_relatorio_descritivo(resultados: dict, df: pd.DataFrame) -> str:
     for coluna, stats in resultados.get("estatisticas_numericas", {}).items():
         relatorio += f"""
 #### {coluna}
-- **Média**: {stats.get('media', 'N/A'):.2f}
-- **Mediana**: {stats.get('mediana', 'N/A'):.2f}
-- **Desvio Padrão**: {stats.get('desvio_padrao', 'N/A'):.2f}
-- **Mínimo**: {stats.get('minimo', 'N/A'):.2f}
-- **Máximo**: {stats.get('maximo', 'N/A'):.2f}
+- **Média**: {formatar_numero(stats.get('media'))}
+- **Mediana**: {formatar_numero(stats.get('mediana'))}
+- **Desvio Padrão**: {formatar_numero(stats.get('desvio_padrao'))}
+- **Mínimo**: {formatar_numero(stats.get('minimo'))}
+- **Máximo**: {formatar_numero(stats.get('maximo'))}
 - **Valores ausentes**: {stats.get('valores_nulos', 0)}%
 """
     
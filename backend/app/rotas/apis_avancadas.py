@@ -2,7 +2,7 @@
 Rotas avançadas para APIs de dados públicos e multi-upload
 """
 
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends, Request
 from fastapi.responses import JSONResponse
 from typing import List, Dict, Any, Optional
 import pandas as pd
@@ -18,12 +18,23 @@ from ..servicos.processador_multi_arquivos import criar_processador_arquivos
 from ..servicos.sistema_tags_analise import criar_sistema_tags, NivelExperiencia
 from ..modelos.dataset import Dataset
 from ..modelos.projeto import Projeto
+from ..utils.serializacao import RespostaORJSON, negociar_formato, resposta_tabela
 
 router = APIRouter(prefix="/api/v2", tags=["Funcionalidades Avançadas"])
 
+def formato_solicitado(request: Request, formato: Optional[str]) -> str:
+    try:
+        return negociar_formato(request, formato)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/dados-publicos/municipios-sc")
-async def obter_municipios_sc():
-    """Obtém lista de todos os municípios de Santa Catarina"""
+async def obter_municipios_sc(request: Request, formato: Optional[str] = None):
+    """
+    Obtém lista de todos os municípios de Santa Catarina
+    (JSON, ou Arrow IPC / Parquet via `formato` ou cabeçalho Accept)
+    """
+    formato = formato_solicitado(request, formato)
     try:
         coletor = criar_coletor_dados()
         municipios_df = coletor.buscar_municipios_sc()
@@ -31,23 +42,29 @@ async def obter_municipios_sc():
         if municipios_df.empty:
             raise HTTPException(status_code=404, detail="Nenhum município encontrado")
         
-        return {
+        return resposta_tabela(municipios_df, formato, {
             "success": True,
-            "data": municipios_df.to_dict('records'),
+            "data": municipios_df,
             "total": len(municipios_df),
             "fonte": "IBGE"
-        }
+        }, nome_arquivo="municipios_sc")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao buscar municípios: {str(e)}")
 
 @router.get("/dados-publicos/dataset-completo-sc")
 async def obter_dataset_completo_sc(
+    request: Request,
     municipios: Optional[str] = None,  # Lista de municípios separados por vírgula
     salvar_projeto: bool = False,
     nome_projeto: Optional[str] = None,
+    formato: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Gera dataset completo com todos os indicadores de SC"""
+    """
+    Gera dataset completo com todos os indicadores de SC
+    (JSON, ou Arrow IPC / Parquet via `formato` ou cabeçalho Accept)
+    """
+    formato = formato_solicitado(request, formato)
     try:
         coletor = criar_coletor_dados()
         
@@ -64,7 +81,7 @@ async def obter_dataset_completo_sc(
         
         resultado = {
             "success": True,
-            "data": dataset_completo.to_dict('records'),
+            "data": dataset_completo,
             "metadados": {
                 "total_municipios": len(dataset_completo),
                 "total_variaveis": len(dataset_completo.columns),
@@ -113,7 +130,7 @@ async def obter_dataset_completo_sc(
                 db.rollback()
                 print(f"Erro ao salvar projeto: {e}")
         
-        return resultado
+        return resposta_tabela(dataset_completo, formato, resultado, nome_arquivo="dataset_completo_sc")
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao gerar dataset: {str(e)}")
@@ -125,7 +142,7 @@ async def obter_comparativo_regioes_sc():
         coletor = criar_coletor_dados()
         comparativo_df = coletor.gerar_comparativo_regioes()
         
-        return {
+        return RespostaORJSON({
             "success": True,
             "data": comparativo_df.to_dict('index'),
             "metadados": {
@@ -133,7 +150,7 @@ async def obter_comparativo_regioes_sc():
                 "indicadores": comparativo_df.columns.tolist(),
                 "fonte": "IBGE, SES-SC, SSP-SC"
             }
-        }
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao gerar comparativo: {str(e)}")
 
@@ -198,17 +215,17 @@ async def upload_multiplos_arquivos(
             "datasets": {}
         }
         
-        # Converte DataFrames para dicionários (amostra)
+        # Amostras como DataFrames, codificadas direto pela resposta orjson
         for nome, df in resultado_processamento['dataframes'].items():
             resposta["datasets"][nome] = {
-                "amostra": df.head(10).to_dict('records'),
+                "amostra": df.head(10),
                 "metadados": resultado_processamento['metadados'].get(nome, {}),
                 "qualidade": resultado_processamento['qualidade'].get(nome, {})
             }
         
         if dataset_combinado is not None and not dataset_combinado.empty:
             resposta["dataset_combinado"] = {
-                "amostra": dataset_combinado.head(10).to_dict('records'),
+                "amostra": dataset_combinado.head(10),
                 "linhas": len(dataset_combinado),
                 "colunas": len(dataset_combinado.columns),
                 "metodo": metodo_combinacao
@@ -273,7 +290,7 @@ async def upload_multiplos_arquivos(
         import shutil
         shutil.rmtree(temp_dir, ignore_errors=True)
         
-        return resposta
+        return RespostaORJSON(resposta)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro no upload múltiplo: {str(e)}")
@@ -2,25 +2,48 @@
 Rotas para AutoML (Machine Learning Automatizado)
 """
 
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, File, Form, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.orm import load_only
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split, cross_val_score
+from sklearn.model_selection import train_test_split, check_cv
+from sklearn.base import clone, is_classifier
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
 from sklearn.linear_model import LogisticRegression, LinearRegression
 from sklearn.svm import SVC, SVR
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
-import joblib
+from joblib import Parallel, delayed, effective_n_jobs
 import os
 
-from app.database.conexao import obter_db
+from app.database.conexao import SessionLocal, SessionLocalAsync, obter_db_async
 from app.modelos.dataset import Dataset
-from app.modelos.analise import Analise, TipoAnalise, StatusAnalise
+from app.modelos.analise import Analise, TipoAnalise, StatusAnalise, acuracia_dos_resultados
+from app.servicos.executor_tarefas import FilaCheia, executor_tarefas, marcar_analise_com_erro
+from app.servicos.carregador_datasets import carregador_datasets
+from app.servicos.progresso import publicar_progresso
+from app.servicos.registro_modelos import (
+    RegistroModelos,
+    ModeloIndisponivel,
+    salvar_artefato_atomico,
+    REGISTRO_MODELOS_PRECARREGAR
+)
+from app.servicos.predicao_lote import (
+    EntradaInvalida,
+    lotes_de_dataframe,
+    lotes_de_csv,
+    lotes_de_parquet,
+    validar_primeiro_lote,
+    gerar_ndjson,
+    gerar_parquet
+)
 
 router = APIRouter()
 
@@ -29,6 +52,18 @@ MODELS_DIR = "modelos_treinados"
 if not os.path.exists(MODELS_DIR):
     os.makedirs(MODELS_DIR)
 
+# Modelos desserializados mantidos em memória para as predições
+registro_modelos = RegistroModelos(MODELS_DIR)
+
+# Formato dos modelos salvos: "mmap" (sem compressão, carregado via memory-map)
+# ou "compactado" (zlib, menor em disco mas desserializado por completo)
+FORMATOS_MODELO = ("mmap", "compactado")
+AUTOML_FORMATO_MODELO = os.getenv("AUTOML_FORMATO_MODELO", "mmap")
+AUTOML_NIVEL_COMPRESSAO = int(os.getenv("AUTOML_NIVEL_COMPRESSAO", "3"))
+
+# Núcleos usados por treinamento quando parametros_avancados não define "n_jobs" (-1 = todos)
+AUTOML_N_JOBS = int(os.getenv("AUTOML_N_JOBS", "-1"))
+
 class SolicitacaoAutoML(BaseModel):
     dataset_id: int
     variavel_alvo: str
@@ -42,16 +77,57 @@ class PredicaoRequest(BaseModel):
     modelo_id: int
     dados: Dict[str, Any]
 
+class PredicaoLoteRequest(BaseModel):
+    modelo_id: int
+    registros: Optional[List[Dict[str, Any]]] = None
+    dataset_id: Optional[int] = None
+    formato: Optional[str] = "ndjson"  # "ndjson" ou "parquet"
+
+FORMATOS_PREDICAO_LOTE = ("ndjson", "parquet")
+
+def artefato_mapeavel(modelo: Analise) -> bool:
+    """Modelos salvos sem compressão podem ser abertos via memory-map"""
+    return bool(((modelo.resultados or {}).get("artefato") or {}).get("mmap"))
+
+def variaveis_do_modelo(modelo: Analise) -> List[str]:
+    """Ordem das variáveis usada no treinamento do modelo"""
+    return (
+        (modelo.resultados or {}).get("variaveis_utilizadas")
+        or modelo.parametros.get("variaveis_preditoras", [])
+    )
+
+@router.on_event("startup")
+async def precarregar_modelos():
+    """Carrega em memória os modelos mais usados nas execuções anteriores"""
+    if REGISTRO_MODELOS_PRECARREGAR <= 0:
+        return
+    
+    ids = registro_modelos.mais_usados(REGISTRO_MODELOS_PRECARREGAR)
+    async with SessionLocalAsync() as db:
+        modelos = (await db.execute(select(Analise).options(
+            load_only(Analise.id, Analise.parametros, Analise.resultados)
+        ).where(
+            Analise.id.in_(ids),
+            Analise.status == StatusAnalise.CONCLUIDA
+        ))).scalars().all()
+        pendentes = [(m.id, variaveis_do_modelo(m), artefato_mapeavel(m)) for m in modelos]
+    
+    await run_in_threadpool(registro_modelos.precarregar, pendentes)
+
+@router.on_event("shutdown")
+async def salvar_uso_modelos():
+    """Persiste a contagem de uso dos modelos para o próximo pré-carregamento"""
+    registro_modelos.salvar_uso()
+
 @router.post("/treinar")
 async def treinar_modelo_automl(
     solicitacao: SolicitacaoAutoML,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(obter_db)
+    db: AsyncSession = Depends(obter_db_async)
 ):
     """
     Inicia treinamento automatizado de modelo de machine learning
     """
-    dataset = db.query(Dataset).filter(Dataset.id == solicitacao.dataset_id).first()
+    dataset = await db.get(Dataset, solicitacao.dataset_id)
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset não encontrado")
     
@@ -62,6 +138,12 @@ async def treinar_modelo_automl(
             detail="Tipo de problema deve ser 'classificacao' ou 'regressao'"
         )
     
+    if executor_tarefas.fila_cheia():
+        raise HTTPException(
+            status_code=503,
+            detail="Fila de treinamentos cheia. Tente novamente em instantes."
+        )
+    
     # Criar registro de análise
     tipo_analise = TipoAnalise.CLASSIFICACAO if solicitacao.tipo_problema == "classificacao" else TipoAnalise.REGRESSAO
     
@@ -74,17 +156,27 @@ async def treinar_modelo_automl(
         dataset_id=dataset.id
     )
     db.add(analise)
-    db.commit()
-    db.refresh(analise)
-    
-    # Executar treinamento em background
-    background_tasks.add_task(
-        executar_automl,
-        analise.id,
-        dataset.caminho_arquivo,
-        dataset.tipo_arquivo,
-        solicitacao
-    )
+    await db.commit()
+    await db.refresh(analise)
+    
+    # Executar treinamento em um processo do pool
+    analise_id = analise.id
+    try:
+        executor_tarefas.submeter(
+            "automl",
+            executar_automl,
+            analise_id,
+            dataset.id,
+            solicitacao,
+            ao_falhar=lambda erro: marcar_analise_com_erro(analise_id, erro)
+        )
+    except FilaCheia as e:
+        # A fila encheu depois da verificação inicial
+        await marcar_analise_com_erro(analise_id, e)
+        raise HTTPException(
+            status_code=503,
+            detail="Fila de treinamentos cheia. Tente novamente em instantes."
+        )
     
     return {
         "analise_id": analise.id,
@@ -95,27 +187,36 @@ async def treinar_modelo_automl(
 @router.get("/modelos")
 async def listar_modelos(
     projeto_id: Optional[int] = None,
-    db: Session = Depends(obter_db)
+    db: AsyncSession = Depends(obter_db_async)
 ):
     """
     Lista todos os modelos treinados
     """
-    query = db.query(Analise).filter(
-        Analise.tipo.in_([TipoAnalise.CLASSIFICACAO, TipoAnalise.REGRESSAO]),
-        Analise.status == StatusAnalise.CONCLUIDA
+    # Só as colunas exibidas (resultados, gráficos e relatório ficam no banco);
+    # o filtro usa o índice (status, tipo, projeto_id)
+    query = select(
+        Analise.id,
+        Analise.nome,
+        Analise.tipo,
+        Analise.acuracia,
+        Analise.data_conclusao,
+        Analise.tempo_execucao
+    ).where(
+        Analise.status == StatusAnalise.CONCLUIDA,
+        Analise.tipo.in_([TipoAnalise.CLASSIFICACAO, TipoAnalise.REGRESSAO])
     )
     
     if projeto_id:
-        query = query.filter(Analise.projeto_id == projeto_id)
+        query = query.where(Analise.projeto_id == projeto_id)
     
-    modelos = query.all()
+    modelos = (await db.execute(query)).all()
     
     return [
         {
             "id": modelo.id,
             "nome": modelo.nome,
             "tipo": modelo.tipo.value,
-            "acuracia": modelo.resultados.get("melhor_modelo", {}).get("metricas", {}).get("accuracy"),
+            "acuracia": modelo.acuracia,
             "data_treinamento": modelo.data_conclusao,
             "tempo_execucao": modelo.tempo_execucao
         }
@@ -125,21 +226,12 @@ async def listar_modelos(
 @router.get("/modelo/{modelo_id}")
 async def obter_detalhes_modelo(
     modelo_id: int,
-    db: Session = Depends(obter_db)
+    db: AsyncSession = Depends(obter_db_async)
 ):
     """
     Obtém detalhes completos de um modelo treinado
     """
-    modelo = db.query(Analise).filter(Analise.id == modelo_id).first()
-    
-    if not modelo:
-        raise HTTPException(status_code=404, detail="Modelo não encontrado")
-    
-    if modelo.status != StatusAnalise.CONCLUIDA:
-        raise HTTPException(
-            status_code=400,
-            detail="Modelo ainda não foi treinado com sucesso"
-        )
+    modelo = await obter_modelo_treinado(db, modelo_id)
     
     return {
         "id": modelo.id,
@@ -154,94 +246,206 @@ async def obter_detalhes_modelo(
 @router.post("/prever")
 async def fazer_predicao(
     predicao: PredicaoRequest,
-    db: Session = Depends(obter_db)
+    db: AsyncSession = Depends(obter_db_async)
 ):
     """
     Faz predição usando um modelo treinado
     """
-    modelo = db.query(Analise).filter(Analise.id == predicao.modelo_id).first()
+    modelo = await obter_modelo_treinado(db, predicao.modelo_id)
     
-    if not modelo:
-        raise HTTPException(status_code=404, detail="Modelo não encontrado")
+    # Ordem das variáveis usada no treinamento
+    variaveis_preditoras = variaveis_do_modelo(modelo)
     
-    if modelo.status != StatusAnalise.CONCLUIDA:
-        raise HTTPException(
-            status_code=400,
-            detail="Modelo ainda não foi treinado com sucesso"
-        )
+    # Verificar se todas as variáveis necessárias estão presentes
+    for var in variaveis_preditoras:
+        if var not in predicao.dados:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Variável '{var}' é obrigatória para a predição"
+            )
     
     try:
-        # Carregar modelo salvo
-        caminho_modelo = os.path.join(MODELS_DIR, f"modelo_{modelo.id}.joblib")
-        
-        if not os.path.exists(caminho_modelo):
+        # Modelo e scaler vêm do registro em memória; o disco só é lido na primeira vez
+        try:
+            pacote = await run_in_threadpool(
+                registro_modelos.obter, modelo.id, variaveis_preditoras, artefato_mapeavel(modelo)
+            )
+        except ModeloIndisponivel:
             raise HTTPException(
                 status_code=404,
                 detail="Arquivo do modelo não encontrado"
             )
         
-        modelo_ml = joblib.load(caminho_modelo)
-        scaler = None
-        
-        # Carregar scaler se existir
-        caminho_scaler = os.path.join(MODELS_DIR, f"scaler_{modelo.id}.joblib")
-        if os.path.exists(caminho_scaler):
-            scaler = joblib.load(caminho_scaler)
-        
-        # Preparar dados para predição
-        variaveis_preditoras = modelo.parametros.get("variaveis_preditoras", [])
-        
-        # Verificar se todas as variáveis necessárias estão presentes
-        for var in variaveis_preditoras:
-            if var not in predicao.dados:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Variável '{var}' é obrigatória para a predição"
-                )
-        
-        # Criar DataFrame com os dados
-        dados_predicao = pd.DataFrame([predicao.dados])
-        dados_predicao = dados_predicao[variaveis_preditoras]
+        # Montar a linha diretamente na ordem das variáveis
+        dados_predicao = np.array(
+            [[predicao.dados[var] for var in pacote.variaveis]], dtype=np.float64
+        )
         
         # Aplicar normalização se necessário
-        if scaler:
-            dados_predicao_scaled = scaler.transform(dados_predicao)
-        else:
-            dados_predicao_scaled = dados_predicao
+        if pacote.scaler is not None:
+            dados_predicao = pacote.scaler.transform(dados_predicao)
         
         # Fazer predição
-        predicao_resultado = modelo_ml.predict(dados_predicao_scaled)[0]
+        modelo_ml = pacote.modelo
+        predicao_resultado = modelo_ml.predict(dados_predicao)[0]
         
         # Obter probabilidades se for classificação
         probabilidades = None
         if hasattr(modelo_ml, 'predict_proba'):
-            prob = modelo_ml.predict_proba(dados_predicao_scaled)[0]
+            prob = modelo_ml.predict_proba(dados_predicao)[0]
             classes = modelo_ml.classes_
             probabilidades = {str(classe): float(prob_valor) for classe, prob_valor in zip(classes, prob)}
         
         return {
-            "predicao": predicao_resultado,
+            "predicao": predicao_resultado.item() if hasattr(predicao_resultado, "item") else predicao_resultado,
             "probabilidades": probabilidades,
             "dados_entrada": predicao.dados,
             "modelo_usado": modelo.nome
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Erro ao fazer predição: {str(e)}"
         )
 
+@router.post("/prever-lote")
+async def fazer_predicao_lote(
+    solicitacao: PredicaoLoteRequest,
+    db: AsyncSession = Depends(obter_db_async)
+):
+    """
+    Predição em lote para uma lista de registros ou para um dataset cadastrado.
+    As predições são transmitidas como NDJSON ou como arquivo Parquet.
+    """
+    validar_formato_predicao(solicitacao.formato)
+    modelo = await obter_modelo_treinado(db, solicitacao.modelo_id)
+    pacote = await obter_pacote_modelo(modelo)
+    
+    if solicitacao.registros is not None:
+        lotes = lotes_de_dataframe(pd.DataFrame(solicitacao.registros), pacote.variaveis)
+    elif solicitacao.dataset_id is not None:
+        dataset = await db.get(Dataset, solicitacao.dataset_id)
+        if not dataset:
+            raise HTTPException(status_code=404, detail="Dataset não encontrado")
+        
+        # CSV e Parquet são lidos em blocos, apenas com as colunas do modelo
+        if dataset.tipo_arquivo == "csv":
+            lotes = lotes_de_csv(dataset.caminho_arquivo, pacote.variaveis)
+        elif dataset.tipo_arquivo == "parquet":
+            lotes = lotes_de_parquet(dataset.caminho_arquivo, pacote.variaveis)
+        else:
+            df = await run_in_threadpool(carregar_com_sessao_propria, dataset.id, pacote.variaveis)
+            lotes = lotes_de_dataframe(df, pacote.variaveis)
+    else:
+        raise HTTPException(
+            status_code=400,
+            detail="Informe 'registros' ou 'dataset_id'"
+        )
+    
+    return await responder_predicoes_lote(pacote, lotes, solicitacao.formato)
+
+@router.post("/prever-lote/arquivo")
+async def fazer_predicao_lote_arquivo(
+    modelo_id: int = Form(...),
+    formato: str = Form("ndjson"),
+    arquivo: UploadFile = File(...),
+    db: AsyncSession = Depends(obter_db_async)
+):
+    """
+    Predição em lote para um arquivo CSV ou Parquet enviado
+    """
+    validar_formato_predicao(formato)
+    modelo = await obter_modelo_treinado(db, modelo_id)
+    pacote = await obter_pacote_modelo(modelo)
+    
+    nome = (arquivo.filename or "").lower()
+    if nome.endswith(".csv"):
+        lotes = lotes_de_csv(arquivo.file, pacote.variaveis)
+    elif nome.endswith(".parquet"):
+        lotes = lotes_de_parquet(arquivo.file, pacote.variaveis)
+    else:
+        raise HTTPException(status_code=400, detail="Envie um arquivo CSV ou Parquet")
+    
+    return await responder_predicoes_lote(pacote, lotes, formato)
+
+def validar_formato_predicao(formato: str):
+    if formato not in FORMATOS_PREDICAO_LOTE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Formato deve ser um de: {', '.join(FORMATOS_PREDICAO_LOTE)}"
+        )
+
+async def obter_modelo_treinado(db: AsyncSession, modelo_id: int) -> Analise:
+    """Registro do modelo, garantindo que o treinamento foi concluído"""
+    modelo = await db.get(Analise, modelo_id)
+    
+    if not modelo:
+        raise HTTPException(status_code=404, detail="Modelo não encontrado")
+    
+    if modelo.status != StatusAnalise.CONCLUIDA:
+        raise HTTPException(
+            status_code=400,
+            detail="Modelo ainda não foi treinado com sucesso"
+        )
+    return modelo
+
+def carregar_com_sessao_propria(dataset_id: int, colunas: List[str]) -> pd.DataFrame:
+    """
+    Carrega o dataset em uma thread do pool, com uma sessão síncrona própria
+    (a sessão assíncrona da requisição não pode ser usada fora do event loop)
+    """
+    db = SessionLocal()
+    try:
+        return carregador_datasets.carregar_por_id(db, dataset_id, colunas)
+    finally:
+        db.close()
+
+async def obter_pacote_modelo(modelo: Analise):
+    try:
+        return await run_in_threadpool(
+            registro_modelos.obter, modelo.id, variaveis_do_modelo(modelo), artefato_mapeavel(modelo)
+        )
+    except ModeloIndisponivel:
+        raise HTTPException(
+            status_code=404,
+            detail="Arquivo do modelo não encontrado"
+        )
+
+async def responder_predicoes_lote(pacote, lotes, formato: str) -> StreamingResponse:
+    """Valida o primeiro lote e transmite as predições no formato pedido"""
+    try:
+        lotes = await run_in_threadpool(validar_primeiro_lote, lotes)
+    except EntradaInvalida as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if formato == "parquet":
+        return StreamingResponse(
+            gerar_parquet(pacote, lotes),
+            media_type="application/vnd.apache.parquet",
+            headers={"Content-Disposition": f'attachment; filename="predicoes_{pacote.modelo_id}.parquet"'}
+        )
+    return StreamingResponse(gerar_ndjson(pacote, lotes), media_type="application/x-ndjson")
+
+@router.get("/registro")
+async def estatisticas_registro_modelos():
+    """
+    Modelos mantidos em memória pelo registro de predição
+    """
+    return registro_modelos.estatisticas()
+
 @router.post("/avaliar/{modelo_id}")
 async def avaliar_modelo(
     modelo_id: int,
     dados_teste: Dict[str, Any],
-    db: Session = Depends(obter_db)
+    db: AsyncSession = Depends(obter_db_async)
 ):
     """
     Avalia o modelo com novos dados de teste
     """
-    modelo = db.query(Analise).filter(Analise.id == modelo_id).first()
+    modelo = await db.get(Analise, modelo_id)
     
     if not modelo:
         raise HTTPException(status_code=404, detail="Modelo não encontrado")
@@ -254,23 +458,25 @@ async def avaliar_modelo(
         "modelo_id": modelo_id
     }
 
-# Função auxiliar para execução em background
-async def executar_automl(
+# Função auxiliar para execução em background (roda em um processo do executor de tarefas)
+def executar_automl(
     analise_id: int,
-    caminho_arquivo: str,
-    tipo_arquivo: str,
+    dataset_id: int,
     solicitacao: SolicitacaoAutoML
 ):
     """Executa AutoML em background"""
-    from app.database.conexao import SessionLocal
     import time
     
     db = SessionLocal()
     inicio = time.time()
     
     try:
-        # Carregar dados
-        df = carregar_dataframe(caminho_arquivo, tipo_arquivo)
+        # Carregar dados: com as preditoras informadas, só elas e o alvo são lidos do disco
+        publicar_progresso(analise_id, "carregar", 0)
+        colunas = None
+        if solicitacao.variaveis_preditoras:
+            colunas = list(dict.fromkeys([*solicitacao.variaveis_preditoras, solicitacao.variavel_alvo]))
+        df = carregador_datasets.carregar_por_id(db, dataset_id, colunas)
         
         # Validar variável alvo
         if solicitacao.variavel_alvo not in df.columns:
@@ -323,15 +529,21 @@ async def executar_automl(
             if nome in solicitacao.algoritmos
         }
         
-        # Treinar e avaliar modelos
+        # Treinar e avaliar modelos em paralelo: cada ajuste completo e cada
+        # fold da validação cruzada vira uma tarefa independente
+        n_jobs = effective_n_jobs(int((solicitacao.parametros_avancados or {}).get("n_jobs", AUTOML_N_JOBS)))
+        publicar_progresso(analise_id, "calcular", 20, algoritmos=list(algoritmos_usar))
+        ajustes = treinar_candidatos(algoritmos_usar, X_train_scaled, y_train, n_jobs)
+        
         resultados = {}
         melhor_modelo = None
+        melhor_algoritmo = None
         melhor_score = -np.inf
         
-        for nome, algoritmo in algoritmos_usar.items():
+        for nome, (algoritmo, cv_scores) in ajustes.items():
             try:
-                # Treinar modelo
-                algoritmo.fit(X_train_scaled, y_train)
+                if isinstance(algoritmo, Exception):
+                    raise algoritmo
                 
                 # Fazer predições
                 y_pred = algoritmo.predict(X_test_scaled)
@@ -354,31 +566,44 @@ async def executar_automl(
                     }
                     score_principal = metricas["r2_score"]
                 
-                # Cross-validation
-                cv_scores = cross_val_score(algoritmo, X_train_scaled, y_train, cv=5)
-                
+                # Folds que falharam (NaN) ficam fora da média
+                validos = cv_scores[~np.isnan(cv_scores)]
                 resultados[nome] = {
                     "metricas": metricas,
-                    "cv_score_medio": float(cv_scores.mean()),
-                    "cv_score_std": float(cv_scores.std()),
+                    "cv_score_medio": float(validos.mean()) if len(validos) else None,
+                    "cv_score_std": float(validos.std()) if len(validos) else None,
                     "score_principal": score_principal
                 }
+                if len(validos) < len(cv_scores):
+                    resultados[nome]["cv_folds_com_erro"] = int(len(cv_scores) - len(validos))
                 
-                # Verificar se é o melhor modelo
+                # Verificar se é o melhor modelo (mantido em memória até o fim)
                 if score_principal > melhor_score:
                     melhor_score = score_principal
                     melhor_modelo = nome
-                    
-                    # Salvar melhor modelo
-                    caminho_modelo = os.path.join(MODELS_DIR, f"modelo_{analise_id}.joblib")
-                    caminho_scaler = os.path.join(MODELS_DIR, f"scaler_{analise_id}.joblib")
-                    
-                    joblib.dump(algoritmo, caminho_modelo)
-                    joblib.dump(scaler, caminho_scaler)
+                    melhor_algoritmo = algoritmo
                 
             except Exception as e:
                 resultados[nome] = {"erro": str(e)}
         
+        # Salvar apenas o vencedor, uma única vez e de forma atômica
+        publicar_progresso(analise_id, "relatorio", 85)
+        artefato = None
+        if melhor_algoritmo is not None:
+            formato = (solicitacao.parametros_avancados or {}).get("formato_modelo", AUTOML_FORMATO_MODELO)
+            if formato not in FORMATOS_MODELO:
+                raise ValueError(f"formato_modelo deve ser um de: {', '.join(FORMATOS_MODELO)}")
+            compressao = AUTOML_NIVEL_COMPRESSAO if formato == "compactado" else 0
+            
+            caminho_modelo, caminho_scaler = registro_modelos.caminhos(analise_id)
+            salvar_artefato_atomico(scaler, caminho_scaler, compressao)
+            salvar_artefato_atomico(melhor_algoritmo, caminho_modelo, compressao)
+            artefato = {
+                "formato": formato,
+                "mmap": compressao == 0,
+                "tamanho_bytes": os.path.getsize(caminho_modelo) + os.path.getsize(caminho_scaler)
+            }
+        
         # Preparar resultados finais
         resultados_finais = {
             "algoritmos_testados": resultados,
@@ -389,7 +614,8 @@ async def executar_automl(
             "variaveis_utilizadas": variaveis_preditoras,
             "tamanho_treino": len(X_train),
             "tamanho_teste": len(X_test),
-            "tipo_problema": solicitacao.tipo_problema
+            "tipo_problema": solicitacao.tipo_problema,
+            "artefato": artefato
         }
         
         tempo_execucao = int(time.time() - inicio)
@@ -398,8 +624,13 @@ async def executar_automl(
         analise = db.query(Analise).filter(Analise.id == analise_id).first()
         analise.status = StatusAnalise.CONCLUIDA
         analise.resultados = resultados_finais
+        analise.acuracia = acuracia_dos_resultados(resultados_finais)
         analise.tempo_execucao = tempo_execucao
         db.commit()
+        publicar_progresso(analise_id, "concluida", 100, referencia={
+            "analise_id": analise_id,
+            "melhor_modelo": melhor_modelo
+        })
         
     except Exception as e:
         # Marcar como erro
@@ -407,18 +638,56 @@ async def executar_automl(
         analise.status = StatusAnalise.ERRO
         analise.resultados = {"erro": str(e)}
         db.commit()
+        publicar_progresso(analise_id, "erro", mensagem=str(e))
     finally:
         db.close()
 
-def carregar_dataframe(caminho_arquivo: str, tipo_arquivo: str) -> pd.DataFrame:
-    """Carrega DataFrame baseado no tipo de arquivo"""
-    if tipo_arquivo == "csv":
-        return pd.read_csv(caminho_arquivo)
-    elif tipo_arquivo == "excel":
-        return pd.read_excel(caminho_arquivo)
-    elif tipo_arquivo == "json":
-        return pd.read_json(caminho_arquivo)
-    elif tipo_arquivo == "parquet":
-        return pd.read_parquet(caminho_arquivo)
-    else:
-        raise ValueError(f"Tipo de arquivo não suportado: {tipo_arquivo}")
+def _ajustar(algoritmo, X, y, treino=None, validacao=None):
+    """
+    Ajusta um clone do algoritmo. Sem índices, treina com todos os dados e
+    devolve o modelo; com índices, devolve o score do fold de validação.
+    Exceções são devolvidas em vez de levantadas para não abortar os demais ajustes.
+    """
+    try:
+        modelo = clone(algoritmo)
+        if treino is None:
+            return modelo.fit(X, y)
+        modelo.fit(X[treino], y[treino])
+        return float(modelo.score(X[validacao], y[validacao]))
+    except Exception as e:
+        return e
+
+def treinar_candidatos(algoritmos: Dict[str, Any], X_train, y_train, n_jobs: int = 1, cv: int = 5) -> Dict[str, Any]:
+    """
+    Treina todos os candidatos e executa a validação cruzada de cada um,
+    distribuindo os ajustes entre `n_jobs` processos.
+    
+    Os folds são os mesmos de cross_val_score(cv=cv) e cada ajuste usa um
+    clone com o mesmo random_state, então os resultados são idênticos aos do
+    treinamento sequencial. Um fold que falha vale NaN, como no
+    error_score=np.nan do cross_val_score, sem descartar o algoritmo.
+    Retorna {nome: (modelo ou exceção, scores por fold)}.
+    """
+    X = np.asarray(X_train)
+    y = np.asarray(y_train)
+    
+    tarefas = []
+    for nome, algoritmo in algoritmos.items():
+        tarefas.append((nome, delayed(_ajustar)(algoritmo, X, y)))
+        divisor = check_cv(cv, y, classifier=is_classifier(algoritmo))
+        for treino, validacao in divisor.split(X, y):
+            tarefas.append((nome, delayed(_ajustar)(algoritmo, X, y, treino, validacao)))
+    
+    saidas = Parallel(n_jobs=min(n_jobs, len(tarefas)) or 1)(tarefa for _, tarefa in tarefas)
+    
+    ajustes = {nome: [None, []] for nome in algoritmos}
+    for (nome, _), saida in zip(tarefas, saidas):
+        if ajustes[nome][0] is None:
+            ajustes[nome][0] = saida
+        else:
+            ajustes[nome][1].append(saida)
+    
+    return {
+        nome: (modelo, np.array([np.nan if isinstance(score, Exception) else score for score in scores]))
+        for nome, (modelo, scores) in ajustes.items()
+    }
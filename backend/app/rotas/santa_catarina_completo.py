@@ -1,51 +1,62 @@
-from fastapi import APIRouter, HTTPException
-from typing import Dict, List, Any
-import httpx
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import Dict, List, Any, Optional
 import asyncio
 from datetime import datetime
 
+from app.servicos.cliente_ibge import cliente_ibge, ErroFonteDados, IBGE_BASE_URL
+from app.servicos.tabelas_ibge import tabelas_ibge, TabelaIndicador, CursorInvalido
+
 router = APIRouter()
 
 # APIs de dados de Santa Catarina
 SC_DATA_SOURCES = {
-    "municipios": "https://servicodados.ibge.gov.br/api/v1/localidades/estados/42/municipios",
-    "populacao": "https://servicodados.ibge.gov.br/api/v3/agregados/6579/periodos/2010|2020/variaveis/9324?localidades=N6[all]",
-    "economia": "https://servicodados.ibge.gov.br/api/v3/agregados/5938/periodos/2019|2020/variaveis/37?localidades=N6[all]",
-    "educacao": "https://servicodados.ibge.gov.br/api/v3/agregados/7113/periodos/2010|2020/variaveis/10267?localidades=N6[all]",
-    "saude": "https://servicodados.ibge.gov.br/api/v3/agregados/4709/periodos/2010|2020/variaveis/8331?localidades=N6[all]"
+    "municipios": f"{IBGE_BASE_URL}/api/v1/localidades/estados/42/municipios",
+    "populacao": f"{IBGE_BASE_URL}/api/v3/agregados/6579/periodos/2010|2020/variaveis/9324?localidades=N6[all]",
+    "economia": f"{IBGE_BASE_URL}/api/v3/agregados/5938/periodos/2019|2020/variaveis/37?localidades=N6[all]",
+    "educacao": f"{IBGE_BASE_URL}/api/v3/agregados/7113/periodos/2010|2020/variaveis/10267?localidades=N6[all]",
+    "saude": f"{IBGE_BASE_URL}/api/v3/agregados/4709/periodos/2010|2020/variaveis/8331?localidades=N6[all]"
 }
 
+FORMATOS_SERIE = ("json", "ndjson", "csv")
+
+@router.on_event("startup")
+async def iniciar_cliente_ibge():
+    await cliente_ibge.iniciar()
+    tabelas_ibge.iniciar_atualizacao([SC_DATA_SOURCES["populacao"], SC_DATA_SOURCES["economia"]])
+
+@router.on_event("shutdown")
+async def fechar_cliente_ibge():
+    await tabelas_ibge.parar_atualizacao()
+    await cliente_ibge.fechar()
+
 @router.get("/")
 async def get_santa_catarina_overview():
     """Visão geral dos dados de Santa Catarina"""
     try:
-        async with httpx.AsyncClient() as client:
-            # Buscar dados básicos
-            municipios_response = await client.get(SC_DATA_SOURCES["municipios"])
-            
-        if municipios_response.status_code == 200:
-            municipios = municipios_response.json()
-            
-            return {
-                "estado": "Santa Catarina",
-                "codigo_uf": 42,
-                "total_municipios": len(municipios),
-                "capital": "Florianópolis",
-                "regiao": "Sul",
-                "principais_municipios": [
-                    m["nome"] for m in sorted(municipios, key=lambda x: x["nome"])[:10]
-                ],
-                "dados_atualizados": datetime.now().isoformat(),
-                "fontes_disponiveis": [
-                    "População por município",
-                    "Dados econômicos",
-                    "Indicadores de educação",
-                    "Dados de saúde"
-                ]
-            }
-        else:
-            raise HTTPException(status_code=503, detail="Erro ao acessar dados do IBGE")
-            
+        # Buscar dados básicos
+        municipios = await cliente_ibge.obter_json(SC_DATA_SOURCES["municipios"])
+
+        return {
+            "estado": "Santa Catarina",
+            "codigo_uf": 42,
+            "total_municipios": len(municipios),
+            "capital": "Florianópolis",
+            "regiao": "Sul",
+            "principais_municipios": [
+                m["nome"] for m in sorted(municipios, key=lambda x: x["nome"])[:10]
+            ],
+            "dados_atualizados": datetime.now().isoformat(),
+            "fontes_disponiveis": [
+                "População por município",
+                "Dados econômicos",
+                "Indicadores de educação",
+                "Dados de saúde"
+            ]
+        }
+
+    except ErroFonteDados:
+        raise HTTPException(status_code=503, detail="Erro ao acessar dados do IBGE")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
@@ -53,97 +64,110 @@ async def get_santa_catarina_overview():
 async def get_municipios_sc():
     """Lista todos os municípios de Santa Catarina"""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(SC_DATA_SOURCES["municipios"])
-            
-        if response.status_code == 200:
-            municipios = response.json()
-            
-            return {
-                "total": len(municipios),
-                "municipios": [
-                    {
-                        "id": m["id"],
-                        "nome": m["nome"],
-                        "microrregiao": m["microrregiao"]["nome"],
-                        "mesorregiao": m["mesorregiao"]["nome"]
-                    }
-                    for m in municipios
-                ]
-            }
-        else:
-            raise HTTPException(status_code=503, detail="Erro ao acessar dados do IBGE")
-            
+        municipios = await cliente_ibge.obter_json(SC_DATA_SOURCES["municipios"])
+
+        return {
+            "total": len(municipios),
+            "municipios": [
+                {
+                    "id": m["id"],
+                    "nome": m["nome"],
+                    "microrregiao": m["microrregiao"]["nome"],
+                    "mesorregiao": m["mesorregiao"]["nome"]
+                }
+                for m in municipios
+            ]
+        }
+
+    except ErroFonteDados:
+        raise HTTPException(status_code=503, detail="Erro ao acessar dados do IBGE")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
+def responder_serie(
+    tabela: TabelaIndicador,
+    campo_valor: str,
+    nome_arquivo: str,
+    municipio_id: Optional[int],
+    ano: Optional[int],
+    cursor: Optional[str],
+    limite: int,
+    formato: str
+):
+    """
+    Aplica os filtros sobre a tabela indexada e devolve uma página JSON ou,
+    em ndjson/csv, transmite todos os registros a partir do cursor
+    """
+    if formato not in FORMATOS_SERIE:
+        raise HTTPException(status_code=400, detail=f"Formato deve ser um de: {', '.join(FORMATOS_SERIE)}")
+    selecionadas = tabela.selecionar(municipio_id, ano)
+    try:
+        posicoes = tabela.apos_cursor(selecionadas, cursor)
+    except CursorInvalido as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if formato == "ndjson":
+        return StreamingResponse(tabela.gerar_ndjson(posicoes, campo_valor), media_type="application/x-ndjson")
+    if formato == "csv":
+        return StreamingResponse(
+            tabela.gerar_csv(posicoes, campo_valor),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="{nome_arquivo}.csv"'}
+        )
+
+    pagina = posicoes[:limite]
+    return {
+        "total_registros": len(selecionadas),
+        "dados": tabela.registros(pagina, campo_valor),
+        "proximo_cursor": tabela.cursor_de(pagina[-1]) if len(posicoes) > limite else None
+    }
+
 @router.get("/populacao")
-async def get_populacao_sc():
-    """Dados de população dos municípios de SC"""
+async def get_populacao_sc(
+    ano: Optional[int] = None,
+    municipio_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limite: int = Query(50, ge=1, le=1000),
+    formato: str = "json"
+):
+    """
+    Dados de população dos municípios de SC, paginados por cursor
+    (ou transmitidos por completo com formato=ndjson|csv)
+    """
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(SC_DATA_SOURCES["populacao"])
-            
-        if response.status_code == 200:
-            data = response.json()
-            
-            # Processar dados de população
-            populacao_data = []
-            for item in data:
-                for resultado in item.get("resultados", []):
-                    for serie in resultado.get("series", []):
-                        localidade = serie.get("localidade", {})
-                        for periodo, valor in serie.get("serie", {}).items():
-                            if valor and valor != "...":
-                                populacao_data.append({
-                                    "municipio_id": localidade.get("id"),
-                                    "municipio_nome": localidade.get("nome"),
-                                    "ano": periodo,
-                                    "populacao": int(valor) if valor.isdigit() else valor
-                                })
-            
-            return {
-                "total_registros": len(populacao_data),
-                "anos_disponiveis": list(set([d["ano"] for d in populacao_data])),
-                "dados": populacao_data[:50]  # Limitar para evitar response muito grande
-            }
-        else:
-            raise HTTPException(status_code=503, detail="Erro ao acessar dados do IBGE")
-            
+        tabela = await tabelas_ibge.obter(SC_DATA_SOURCES["populacao"])
+        resposta = responder_serie(tabela, "populacao", "populacao_sc", municipio_id, ano, cursor, limite, formato)
+        if isinstance(resposta, dict):
+            resposta["anos_disponiveis"] = [str(a) for a in tabela.anos]
+        return resposta
+
+    except HTTPException:
+        raise
+    except ErroFonteDados:
+        raise HTTPException(status_code=503, detail="Erro ao acessar dados do IBGE")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
 @router.get("/economia")
-async def get_economia_sc():
-    """Dados econômicos de Santa Catarina"""
+async def get_economia_sc(
+    ano: Optional[int] = None,
+    municipio_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limite: int = Query(50, ge=1, le=1000),
+    formato: str = "json"
+):
+    """
+    Dados econômicos de Santa Catarina, paginados por cursor
+    (ou transmitidos por completo com formato=ndjson|csv)
+    """
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(SC_DATA_SOURCES["economia"])
-            
-        if response.status_code == 200:
-            data = response.json()
-            
-            economia_data = []
-            for item in data:
-                for resultado in item.get("resultados", []):
-                    for serie in resultado.get("series", []):
-                        localidade = serie.get("localidade", {})
-                        for periodo, valor in serie.get("serie", {}).items():
-                            if valor and valor != "...":
-                                economia_data.append({
-                                    "municipio_id": localidade.get("id"),
-                                    "municipio_nome": localidade.get("nome"),
-                                    "ano": periodo,
-                                    "pib_municipal": valor
-                                })
-            
-            return {
-                "total_registros": len(economia_data),
-                "dados": economia_data[:50]
-            }
-        else:
-            raise HTTPException(status_code=503, detail="Erro ao acessar dados do IBGE")
-            
+        tabela = await tabelas_ibge.obter(SC_DATA_SOURCES["economia"])
+        return responder_serie(tabela, "pib_municipal", "economia_sc", municipio_id, ano, cursor, limite, formato)
+
+    except HTTPException:
+        raise
+    except ErroFonteDados:
+        raise HTTPException(status_code=503, detail="Erro ao acessar dados do IBGE")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
@@ -151,35 +175,29 @@ async def get_economia_sc():
 async def get_indicadores_municipio(municipio_id: int):
     """Indicadores específicos de um município"""
     try:
-        tasks = []
-        async with httpx.AsyncClient() as client:
-            # Buscar múltiplos indicadores em paralelo
-            for endpoint in ["populacao", "economia"]:
-                tasks.append(client.get(SC_DATA_SOURCES[endpoint]))
-            
-            responses = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        # Processar respostas
+        # Buscar múltiplos indicadores em paralelo (tabelas já indexadas por município)
+        endpoints = ["populacao", "economia"]
+        tabelas = await asyncio.gather(
+            *[tabelas_ibge.obter(SC_DATA_SOURCES[endpoint]) for endpoint in endpoints],
+            return_exceptions=True
+        )
+
         indicadores = {
             "municipio_id": municipio_id,
             "populacao": [],
             "economia": [],
             "ultima_atualizacao": datetime.now().isoformat()
         }
-        
-        # Processar dados de população
-        if len(responses) > 0 and hasattr(responses[0], 'json'):
-            pop_data = responses[0].json()
-            # Filtrar dados do município específico
-            for item in pop_data:
-                for resultado in item.get("resultados", []):
-                    for serie in resultado.get("series", []):
-                        if serie.get("localidade", {}).get("id") == str(municipio_id):
-                            indicadores["populacao"] = serie.get("serie", {})
-                            break
-        
+
+        # Série do município: busca direta pelo código, sem percorrer o payload
+        for endpoint, tabela in zip(endpoints, tabelas):
+            if not isinstance(tabela, Exception):
+                serie = tabela.serie_municipio(municipio_id)
+                if serie:
+                    indicadores[endpoint] = serie
+
         return indicadores
-        
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
@@ -187,15 +205,13 @@ async def get_indicadores_municipio(municipio_id: int):
 async def get_dashboard_sc():
     """Dashboard completo de Santa Catarina"""
     try:
-        async with httpx.AsyncClient() as client:
-            # Buscar dados básicos em paralelo
-            municipios_task = client.get(SC_DATA_SOURCES["municipios"])
-            populacao_task = client.get(SC_DATA_SOURCES["populacao"])
-            
-            municipios_response, populacao_response = await asyncio.gather(
-                municipios_task, populacao_task, return_exceptions=True
-            )
-        
+        # Buscar dados básicos em paralelo (servidos do cache quando possível)
+        municipios, tabela_populacao = await asyncio.gather(
+            cliente_ibge.obter_json(SC_DATA_SOURCES["municipios"]),
+            tabelas_ibge.obter(SC_DATA_SOURCES["populacao"]),
+            return_exceptions=True
+        )
+
         dashboard_data = {
             "resumo": {
                 "estado": "Santa Catarina",
@@ -207,31 +223,25 @@ async def get_dashboard_sc():
             "estatisticas": {},
             "fonte": "IBGE - Instituto Brasileiro de Geografia e Estatística"
         }
-        
+
         # Processar dados dos municípios
-        if hasattr(municipios_response, 'json'):
-            municipios = municipios_response.json()
+        if not isinstance(municipios, Exception):
             dashboard_data["resumo"]["total_municipios"] = len(municipios)
             dashboard_data["top_municipios"] = [
-                {"nome": m["nome"], "id": m["id"]} 
+                {"nome": m["nome"], "id": m["id"]}
                 for m in municipios[:10]
             ]
-        
-        # Processar dados de população
-        if hasattr(populacao_response, 'json'):
-            pop_data = populacao_response.json()
-            total_pop = 0
-            for item in pop_data:
-                for resultado in item.get("resultados", []):
-                    for serie in resultado.get("series", []):
-                        serie_data = serie.get("serie", {})
-                        # Pegar o ano mais recente
-                        if "2020" in serie_data and serie_data["2020"].isdigit():
-                            total_pop += int(serie_data["2020"])
-            
-            dashboard_data["resumo"]["populacao_total"] = total_pop
-        
+
+        # Total estadual do ano mais recente, já somado na construção da tabela
+        if not isinstance(tabela_populacao, Exception):
+            dashboard_data["resumo"]["populacao_total"] = tabela_populacao.total(2020) or 0
+
         return dashboard_data
-        
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
+
+@router.get("/cache")
+async def get_cache_ibge():
+    """Estatísticas do cache de respostas do IBGE e das tabelas normalizadas"""
+    return dict(cliente_ibge.estatisticas(), normalizacao=tabelas_ibge.estatisticas())
@@ -0,0 +1,164 @@
+"""
+Armazenamento de Artefatos
+Documentos grandes das análises (resultados, gráficos e relatório) gravados
+uma única vez em disco, endereçados pelo SHA-256 do conteúdo e comprimidos
+com zstd; a análise guarda no banco só a referência e um resumo
+"""
+
+import hashlib
+import os
+import tempfile
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import orjson
+import pyarrow as pa
+
+from app.utils.serializacao import dumps
+
+ARTEFATOS_DIR = os.getenv("ARTEFATOS_DIR", "artefatos_analises")
+
+# Codec dos artefatos: zstd ou none
+ARTEFATOS_COMPRESSAO = os.getenv("ARTEFATOS_COMPRESSAO", "zstd")
+ARTEFATOS_NIVEL_ZSTD = int(os.getenv("ARTEFATOS_NIVEL_ZSTD", "3"))
+
+# Documentos maiores que isto (em JSON) saem das colunas da análise
+ARTEFATOS_LIMIAR_BYTES = int(os.getenv("ARTEFATOS_LIMIAR_BYTES", str(256 * 1024)))
+
+# Entradas de `resultados` até este tamanho continuam no resumo guardado no banco
+ARTEFATOS_RESUMO_MAX_BYTES = int(os.getenv("ARTEFATOS_RESUMO_MAX_BYTES", "2048"))
+
+COMPRESSOES_ARTEFATO = ("zstd", "none")
+
+TAMANHO_BLOCO = 1024 * 1024
+
+
+class ArtefatoIndisponivel(FileNotFoundError):
+    """Arquivo do artefato não encontrado no disco"""
+
+
+class ArmazenamentoArtefatos:
+    """
+    Artefatos imutáveis em `<diretorio>/<2 primeiros dígitos do hash>/<hash>.json[.zst]`.
+    O hash é do conteúdo descomprimido: gravar o mesmo documento de novo
+    (ex.: um resultado vindo do cache de análises) não cria outro arquivo.
+    """
+
+    def __init__(
+        self,
+        diretorio: str = ARTEFATOS_DIR,
+        compressao: str = ARTEFATOS_COMPRESSAO,
+        nivel: int = ARTEFATOS_NIVEL_ZSTD
+    ):
+        if compressao not in COMPRESSOES_ARTEFATO:
+            raise ValueError(f"Compressão de artefatos deve ser uma de: {', '.join(COMPRESSOES_ARTEFATO)}")
+        self.diretorio = diretorio
+        self.compressao = compressao
+        self.nivel = nivel
+
+    def caminho(self, referencia: Dict[str, Any]) -> str:
+        extensao = ".json.zst" if referencia["compressao"] == "zstd" else ".json"
+        return os.path.join(self.diretorio, referencia["hash"][:2], referencia["hash"] + extensao)
+
+    def gravar(self, conteudo: bytes) -> Dict[str, Any]:
+        """Grava `conteudo` (se ainda não existir) e devolve a referência a ser guardada no banco"""
+        referencia = {
+            "hash": hashlib.sha256(conteudo).hexdigest(),
+            "bytes": len(conteudo),
+            "compressao": self.compressao
+        }
+        caminho = self.caminho(referencia)
+        if not os.path.exists(caminho):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            if self.compressao == "zstd":
+                conteudo = pa.Codec("zstd", compression_level=self.nivel).compress(conteudo, asbytes=True)
+            # Temporário no mesmo diretório e rename: leitores nunca veem um arquivo pela metade
+            descritor, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho), suffix=".tmp")
+            try:
+                with os.fdopen(descritor, "wb") as arquivo:
+                    arquivo.write(conteudo)
+                os.replace(temporario, caminho)
+            except Exception:
+                os.remove(temporario)
+                raise
+        referencia["bytes_armazenados"] = os.path.getsize(caminho)
+        return referencia
+
+    def gravar_documento(self, documento: Dict[str, Any]) -> Dict[str, Any]:
+        return self.gravar(dumps(documento))
+
+    def existe(self, referencia: Dict[str, Any]) -> bool:
+        return os.path.exists(self.caminho(referencia))
+
+    def remover(self, referencia: Dict[str, Any]):
+        """Apaga o arquivo do artefato; quem chama garante que nenhuma análise ainda o referencia"""
+        try:
+            os.remove(self.caminho(referencia))
+        except FileNotFoundError:
+            pass
+
+    def ler(self, referencia: Dict[str, Any], inicio: int = 0, fim: Optional[int] = None) -> Iterator[bytes]:
+        """
+        Bytes descomprimidos de `inicio` até `fim` (exclusivo), em blocos.
+        Em artefatos comprimidos, o trecho anterior a `inicio` é descomprimido e descartado.
+        """
+        fim = referencia["bytes"] if fim is None else min(fim, referencia["bytes"])
+        try:
+            if referencia["compressao"] == "zstd":
+                fluxo = pa.input_stream(self.caminho(referencia), compression="zstd")
+            else:
+                fluxo = open(self.caminho(referencia), "rb")
+        except FileNotFoundError:
+            raise ArtefatoIndisponivel(f"Artefato {referencia['hash']} não encontrado")
+        with fluxo:
+            if referencia["compressao"] == "zstd":
+                pular = inicio
+                while pular > 0:
+                    descartados = len(fluxo.read(min(pular, TAMANHO_BLOCO)))
+                    if not descartados:
+                        return
+                    pular -= descartados
+            else:
+                fluxo.seek(inicio)
+            restante = fim - inicio
+            while restante > 0:
+                bloco = fluxo.read(min(restante, TAMANHO_BLOCO))
+                if not bloco:
+                    return
+                restante -= len(bloco)
+                yield bloco
+
+    def ler_documento(self, referencia: Dict[str, Any]) -> Dict[str, Any]:
+        return orjson.loads(b"".join(self.ler(referencia)))
+
+
+def resumir(resultados: Optional[Dict[str, Any]], max_bytes: int = ARTEFATOS_RESUMO_MAX_BYTES) -> Dict[str, Any]:
+    """Entradas pequenas de `resultados`; as demais ficam só no artefato e são listadas em "omitidos" """
+    resumo, omitidos = {}, []
+    for chave, valor in (resultados or {}).items():
+        if len(dumps(valor)) <= max_bytes:
+            resumo[chave] = valor
+        else:
+            omitidos.append(chave)
+    if omitidos:
+        resumo["omitidos"] = omitidos
+    return resumo
+
+
+def separar_documento(
+    documento: Dict[str, Any],
+    limiar_bytes: int = ARTEFATOS_LIMIAR_BYTES
+) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """
+    Decide onde guardar o documento {resultados, graficos, relatorio} de uma
+    análise. Abaixo do limiar, devolve-o inteiro e sem referência; acima,
+    grava o artefato e devolve o resumo (sem gráficos nem relatório) e a referência.
+    """
+    conteudo = dumps(documento)
+    if len(conteudo) <= limiar_bytes:
+        return documento, None
+    referencia = armazenamento_artefatos.gravar(conteudo)
+    return {"resultados": resumir(documento.get("resultados")), "graficos": None, "relatorio": None}, referencia
+
+
+# Instância compartilhada pela aplicação e pelos processos do executor de tarefas
+armazenamento_artefatos = ArmazenamentoArtefatos()
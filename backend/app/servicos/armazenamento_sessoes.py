@@ -0,0 +1,488 @@
+"""
+Armazenamento de Sessões de Dados
+Cada sessão é gravada em um arquivo colunar Arrow IPC comprimido no disco,
+com textos de baixa cardinalidade em dicionário; apenas os metadados ficam
+em memória. Seguro para vários workers do uvicorn.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from app.servicos.formato_colunar import exportar_lotes
+from app.servicos.tipos_colunas import TIPO_TEXTO_ARROW
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos
+    fcntl = None
+
+# Diretório e limites do armazenamento
+SESSOES_DIR = os.getenv("SESSOES_DIR", "dados_sessoes")
+SESSOES_TTL_SEGUNDOS = int(os.getenv("SESSOES_TTL_SEGUNDOS", str(24 * 3600)))
+SESSOES_LIMITE_BYTES = int(os.getenv("SESSOES_LIMITE_BYTES", str(5 * 1024 ** 3)))
+
+# Codec dos lotes gravados: none (leitura sem cópia pelo memory-map), lz4 ou
+# zstd (arquivos menores, mas cada leitura descomprime para buffers novos)
+SESSOES_COMPRESSAO = os.getenv("SESSOES_COMPRESSAO", "none")
+
+# Textos com até esta fração de valores distintos no primeiro bloco são gravados como dicionário
+FRACAO_DISTINTOS_DICIONARIO = 0.5
+
+TIPO_DICIONARIO = pa.dictionary(pa.int32(), pa.string())
+
+# dtypes otimizados da ingestão que são aplicados ainda no Arrow
+TIPOS_NUMERICOS_ARROW = {
+    "int8": pa.int8(),
+    "int16": pa.int16(),
+    "int32": pa.int32(),
+    "int64": pa.int64(),
+    "float32": pa.float32(),
+    "float64": pa.float64()
+}
+
+EXTENSAO_DADOS = ".arrow"
+EXTENSAO_METADADOS = ".json"
+
+
+class SessaoNaoEncontrada(KeyError):
+    """Sessão inexistente, expirada ou removida"""
+
+
+def _unificar_tipos(atual: pa.DataType, novo: pa.DataType) -> pa.DataType:
+    """Tipo que comporta valores dos dois blocos"""
+    if atual.equals(novo):
+        return atual
+    if pa.types.is_null(atual):
+        return novo
+    if pa.types.is_null(novo):
+        return atual
+    numericos = (pa.types.is_integer, pa.types.is_floating)
+    if any(f(atual) for f in numericos) and any(f(novo) for f in numericos):
+        if pa.types.is_integer(atual) and pa.types.is_integer(novo):
+            return pa.int64()
+        return pa.float64()
+    return pa.string()
+
+
+def _esquema_logico(esquema: pa.Schema) -> pa.Schema:
+    """Esquema com as colunas em dicionário de volta ao tipo dos valores"""
+    return pa.schema([
+        pa.field(campo.name, campo.type.value_type) if pa.types.is_dictionary(campo.type) else campo
+        for campo in esquema
+    ])
+
+
+def _decodificar(tabela: pa.Table) -> pa.Table:
+    if not any(pa.types.is_dictionary(campo.type) for campo in tabela.schema):
+        return tabela
+    return tabela.cast(_esquema_logico(tabela.schema))
+
+
+def _para_pandas(tabela: pa.Table, tipos: Optional[Dict[str, str]]) -> pd.DataFrame:
+    """
+    Converte para pandas já nos dtypes otimizados da ingestão: números são
+    reduzidos no Arrow e dicionários viram `category` sem passar por texto
+    """
+    if not tipos:
+        return _decodificar(tabela).to_pandas(split_blocks=True)
+    colunas = []
+    for campo, coluna in zip(tabela.schema, tabela.columns):
+        tipo = tipos.get(campo.name)
+        if tipo == "category":
+            if not pa.types.is_dictionary(campo.type):
+                coluna = pc.dictionary_encode(coluna)
+        else:
+            if pa.types.is_dictionary(campo.type):
+                coluna = coluna.cast(campo.type.value_type)
+            if tipo in TIPOS_NUMERICOS_ARROW and (pa.types.is_integer(coluna.type) or pa.types.is_floating(coluna.type)):
+                coluna = coluna.cast(TIPOS_NUMERICOS_ARROW[tipo])
+        colunas.append(coluna)
+    textos_arrow = {pa.string(): pd.StringDtype("pyarrow")}.get if TIPO_TEXTO_ARROW in tipos.values() else None
+    return pa.Table.from_arrays(colunas, names=tabela.column_names).to_pandas(
+        split_blocks=True,
+        types_mapper=textos_arrow
+    )
+
+
+def _baixa_cardinalidade(coluna: pa.ChunkedArray) -> bool:
+    validos = len(coluna) - coluna.null_count
+    return validos == 0 or len(pc.unique(coluna.drop_null())) <= FRACAO_DISTINTOS_DICIONARIO * validos
+
+
+def _tabela_do_bloco(bloco: pd.DataFrame) -> pa.Table:
+    """Converte um bloco para Arrow normalizando textos para `string`"""
+    tabela = pa.Table.from_pandas(bloco, preserve_index=False)
+    campos = [
+        pa.field(campo.name, pa.string()) if pa.types.is_large_string(campo.type) else campo
+        for campo in tabela.schema
+    ]
+    return tabela.cast(pa.schema(campos))
+
+
+class EscritorSessao:
+    """
+    Grava os blocos de um upload em um arquivo Arrow IPC temporário.
+
+    O esquema vem do primeiro bloco; se um bloco posterior exigir um tipo mais
+    amplo (ex.: inteiro que ganhou valores nulos ou texto), os lotes já gravados
+    são reescritos com o esquema promovido.
+
+    Textos de baixa cardinalidade no primeiro bloco são gravados como índices
+    de um dicionário que só cresce: cada lote grava apenas os valores novos
+    (delta), como exige o formato de arquivo IPC.
+    """
+
+    def __init__(self, armazenamento: "ArmazenamentoSessoes", session_id: str):
+        self.armazenamento = armazenamento
+        self.session_id = session_id
+        self.caminho_temp = f"{armazenamento.caminho_dados(session_id)}.tmp-{os.getpid()}"
+        self.esquema: Optional[pa.Schema] = None
+        self._fisico: Optional[pa.Schema] = None
+        self._sink = None
+        self._writer = None
+        self._codificadas: Set[str] = set()
+        self._dicionarios: Dict[str, pa.Array] = {}
+
+    def escrever(self, bloco: pd.DataFrame):
+        tabela = _tabela_do_bloco(bloco)
+        if self.esquema is None:
+            self._codificadas = {
+                campo.name for campo, coluna in zip(tabela.schema, tabela.columns)
+                if pa.types.is_string(campo.type) and _baixa_cardinalidade(coluna)
+            }
+            self._abrir(tabela.schema)
+        elif not tabela.schema.equals(self.esquema):
+            esquema = pa.schema([
+                pa.field(campo.name, _unificar_tipos(campo.type, tabela.schema.field(campo.name).type))
+                for campo in self.esquema
+            ])
+            if not esquema.equals(self.esquema):
+                self._promover(esquema)
+            tabela = tabela.select(self.esquema.names).cast(self.esquema)
+        self._gravar(tabela)
+
+    def _esquema_fisico(self) -> pa.Schema:
+        return pa.schema([
+            pa.field(campo.name, TIPO_DICIONARIO)
+            if campo.name in self._codificadas and pa.types.is_string(campo.type) else campo
+            for campo in self.esquema
+        ])
+
+    def _gravar(self, tabela: pa.Table):
+        """Grava uma tabela no esquema lógico, codificando os textos em dicionário"""
+        colunas = []
+        for campo, coluna in zip(self._fisico, tabela.columns):
+            if pa.types.is_dictionary(campo.type):
+                conhecidos = self._dicionarios.get(campo.name, pa.array([], type=pa.string()))
+                distintos = pc.unique(coluna.drop_null())
+                novos = distintos.filter(pc.invert(pc.is_in(distintos, value_set=conhecidos)))
+                conhecidos = pa.concat_arrays([conhecidos, novos])
+                self._dicionarios[campo.name] = conhecidos
+                indices = pc.index_in(coluna, value_set=conhecidos).combine_chunks()
+                coluna = pa.DictionaryArray.from_arrays(indices, conhecidos)
+            colunas.append(coluna)
+        self._writer.write_table(pa.Table.from_arrays(colunas, schema=self._fisico))
+
+    def _abrir(self, esquema: pa.Schema):
+        self.esquema = esquema
+        self._fisico = self._esquema_fisico()
+        self._dicionarios = {}
+        compressao = None if SESSOES_COMPRESSAO == "none" else SESSOES_COMPRESSAO
+        self._sink = pa.OSFile(self.caminho_temp, "wb")
+        self._writer = pa.ipc.new_file(
+            self._sink,
+            self._fisico,
+            options=pa.ipc.IpcWriteOptions(compression=compressao, emit_dictionary_deltas=True)
+        )
+
+    def _fechar(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._sink.close()
+            self._writer = None
+            self._sink = None
+
+    def _promover(self, esquema: pa.Schema):
+        """Reescreve os lotes já gravados com um esquema mais amplo"""
+        self._fechar()
+        anterior = f"{self.caminho_temp}.old"
+        os.replace(self.caminho_temp, anterior)
+        try:
+            with pa.memory_map(anterior, "r") as origem:
+                leitor = pa.ipc.open_file(origem)
+                self._abrir(esquema)
+                for i in range(leitor.num_record_batches):
+                    lote = _decodificar(pa.Table.from_batches([leitor.get_batch(i)]))
+                    self._gravar(lote.cast(esquema))
+        finally:
+            os.remove(anterior)
+
+    def finalizar(self):
+        """Fecha o arquivo; o registro da sessão é feito por `ArmazenamentoSessoes.publicar`"""
+        if self.esquema is None:
+            self._abrir(pa.schema([]))
+        self._fechar()
+
+    def abortar(self):
+        self._fechar()
+        if os.path.exists(self.caminho_temp):
+            os.remove(self.caminho_temp)
+
+    def tipos(self) -> pd.Series:
+        """dtypes que o pandas terá ao ler a sessão"""
+        return self.esquema.empty_table().to_pandas().dtypes
+
+
+class ArmazenamentoSessoes:
+    """
+    Sessões de dados em arquivos Arrow IPC com expiração (TTL), remoção das
+    menos usadas (LRU) e limite total de bytes.
+
+    O estado vive no disco: `<id>.arrow` com os dados e `<id>.json` com os
+    metadados. O último acesso é o mtime do `.arrow`, de modo que todos os
+    processos enxergam a mesma ordem LRU. Mutações do diretório usam `flock`.
+    """
+
+    def __init__(
+        self,
+        diretorio: str = SESSOES_DIR,
+        ttl_segundos: int = SESSOES_TTL_SEGUNDOS,
+        limite_bytes: int = SESSOES_LIMITE_BYTES
+    ):
+        self.diretorio = diretorio
+        self.ttl_segundos = ttl_segundos
+        self.limite_bytes = limite_bytes
+        self._metadados: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        os.makedirs(diretorio, exist_ok=True)
+
+    def caminho_dados(self, session_id: str) -> str:
+        return os.path.join(self.diretorio, f"{session_id}{EXTENSAO_DADOS}")
+
+    def caminho_metadados(self, session_id: str) -> str:
+        return os.path.join(self.diretorio, f"{session_id}{EXTENSAO_METADADOS}")
+
+    @contextmanager
+    def _trava(self):
+        """Exclusão mútua entre threads e entre processos"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.diretorio, ".lock"), "a") as arquivo_trava:
+                fcntl.flock(arquivo_trava, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(arquivo_trava, fcntl.LOCK_UN)
+
+    # Escrita
+
+    def criar_escritor(self, session_id: str) -> EscritorSessao:
+        return EscritorSessao(self, session_id)
+
+    def publicar(self, escritor: EscritorSessao, metadados: Dict[str, Any]):
+        """Torna a sessão visível para todos os workers e aplica os limites"""
+        session_id = escritor.session_id
+        metadados = dict(metadados, session_id=session_id)
+        metadados["bytes"] = os.path.getsize(escritor.caminho_temp)
+
+        caminho_meta = self.caminho_metadados(session_id)
+        temp_meta = f"{caminho_meta}.tmp-{os.getpid()}"
+        with open(temp_meta, "w", encoding="utf-8") as arquivo:
+            json.dump(metadados, arquivo, default=str)
+
+        with self._trava():
+            os.replace(escritor.caminho_temp, self.caminho_dados(session_id))
+            os.replace(temp_meta, caminho_meta)
+            self._aplicar_limites(preservar=session_id)
+
+    def salvar(self, session_id: str, df: pd.DataFrame, metadados: Dict[str, Any]):
+        """Grava um DataFrame completo como sessão"""
+        escritor = self.criar_escritor(session_id)
+        try:
+            escritor.escrever(df)
+            escritor.finalizar()
+        except Exception:
+            escritor.abortar()
+            raise
+        self.publicar(escritor, metadados)
+
+    # Leitura
+
+    def existe(self, session_id: str) -> bool:
+        return os.path.exists(self.caminho_dados(session_id)) and not self._expirada(session_id)
+
+    def metadados(self, session_id: str) -> Dict[str, Any]:
+        """Metadados da sessão, lidos do disco apenas quando mudam"""
+        caminho = self.caminho_metadados(session_id)
+        try:
+            versao = os.stat(caminho).st_mtime_ns
+        except FileNotFoundError:
+            self._metadados.pop(session_id, None)
+            raise SessaoNaoEncontrada(session_id)
+
+        em_cache = self._metadados.get(session_id)
+        if em_cache and em_cache[0] == versao:
+            return em_cache[1]
+
+        with open(caminho, encoding="utf-8") as arquivo:
+            metadados = json.load(arquivo)
+        self._metadados[session_id] = (versao, metadados)
+        return metadados
+
+    def esquema(self, session_id: str) -> pa.Schema:
+        """Esquema Arrow da sessão (textos como string), sem ler os dados"""
+        with pa.memory_map(self._caminho_existente(session_id), "r") as origem:
+            return _esquema_logico(pa.ipc.open_file(origem).schema)
+
+    def colunas_numericas(self, session_id: str) -> List[str]:
+        return [
+            campo.name for campo in self.esquema(session_id)
+            if pa.types.is_integer(campo.type) or pa.types.is_floating(campo.type)
+        ]
+
+    @staticmethod
+    def _leitor(origem: pa.MemoryMappedFile, colunas: Optional[List[str]]) -> pa.ipc.RecordBatchFileReader:
+        """Leitor que lê (e descomprime) apenas os buffers de `colunas`"""
+        if colunas is None:
+            return pa.ipc.open_file(origem)
+        esquema = pa.ipc.open_file(origem).schema
+        opcoes = pa.ipc.IpcReadOptions(included_fields=[esquema.get_field_index(coluna) for coluna in colunas])
+        return pa.ipc.open_file(origem, options=opcoes)
+
+    def abrir(self, session_id: str, colunas: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Lê a sessão via memory-map, materializando apenas `colunas`; as
+        demais não são lidas do disco. As colunas chegam nos dtypes
+        otimizados na ingestão (metadado `dtypes`). Sem compressão (o
+        padrão), colunas numéricas sem nulos e sem redução de tipo são
+        convertidas sem cópia.
+        """
+        caminho = self._caminho_existente(session_id)
+        tipos = self.metadados(session_id).get("dtypes")
+        with pa.memory_map(caminho, "r") as origem:
+            tabela = self._leitor(origem, colunas).read_all()
+            if colunas is not None:
+                tabela = tabela.select(colunas)
+            df = _para_pandas(tabela, tipos)
+        self._registrar_acesso(caminho)
+        return df
+
+    def iterar_blocos(self, session_id: str, colunas: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """Percorre a sessão lote a lote, com memória limitada ao tamanho de um lote"""
+        caminho = self._caminho_existente(session_id)
+        tipos = self.metadados(session_id).get("dtypes")
+        with pa.memory_map(caminho, "r") as origem:
+            leitor = self._leitor(origem, colunas)
+            for i in range(leitor.num_record_batches):
+                lote = pa.Table.from_batches([leitor.get_batch(i)])
+                if colunas is not None:
+                    lote = lote.select(colunas)
+                yield _para_pandas(lote, tipos)
+        self._registrar_acesso(caminho)
+
+    def exportar(self, session_id: str, formato: str, destino: str):
+        """Grava a sessão em `destino` como parquet, feather/arrow ou csv, lote a lote"""
+        caminho = self._caminho_existente(session_id)
+        with pa.memory_map(caminho, "r") as origem:
+            leitor = pa.ipc.open_file(origem)
+
+            def lotes():
+                for i in range(leitor.num_record_batches):
+                    yield from _decodificar(pa.Table.from_batches([leitor.get_batch(i)])).to_batches()
+
+            exportar_lotes(_esquema_logico(leitor.schema), lotes(), formato, destino)
+        self._registrar_acesso(caminho)
+
+    def listar(self) -> List[Dict[str, Any]]:
+        sessoes = []
+        for nome in sorted(os.listdir(self.diretorio)):
+            if not nome.endswith(EXTENSAO_DADOS):
+                continue
+            session_id = nome[:-len(EXTENSAO_DADOS)]
+            if self._expirada(session_id):
+                continue
+            try:
+                sessoes.append(self.metadados(session_id))
+            except SessaoNaoEncontrada:
+                continue
+        return sessoes
+
+    # Remoção
+
+    def remover(self, session_id: str):
+        with self._trava():
+            if not os.path.exists(self.caminho_dados(session_id)):
+                raise SessaoNaoEncontrada(session_id)
+            self._remover_arquivos(session_id)
+
+    def _remover_arquivos(self, session_id: str):
+        for caminho in (self.caminho_dados(session_id), self.caminho_metadados(session_id)):
+            try:
+                os.remove(caminho)
+            except FileNotFoundError:
+                pass
+        self._metadados.pop(session_id, None)
+
+    def _aplicar_limites(self, preservar: Optional[str] = None):
+        """Remove sessões expiradas e, acima do limite de bytes, as menos usadas"""
+        agora = time.time()
+        sessoes = []
+        for nome in os.listdir(self.diretorio):
+            if not nome.endswith(EXTENSAO_DADOS):
+                continue
+            session_id = nome[:-len(EXTENSAO_DADOS)]
+            try:
+                info = os.stat(os.path.join(self.diretorio, nome))
+                criada = os.stat(self.caminho_metadados(session_id)).st_mtime
+            except FileNotFoundError:
+                continue
+            if agora - criada > self.ttl_segundos and session_id != preservar:
+                self._remover_arquivos(session_id)
+                continue
+            sessoes.append((info.st_mtime, info.st_size, session_id))
+
+        total = sum(tamanho for _, tamanho, _ in sessoes)
+        for _, tamanho, session_id in sorted(sessoes):
+            if total <= self.limite_bytes:
+                break
+            if session_id == preservar:
+                continue
+            self._remover_arquivos(session_id)
+            total -= tamanho
+
+    # Auxiliares
+
+    def _caminho_existente(self, session_id: str) -> str:
+        caminho = self.caminho_dados(session_id)
+        if not os.path.exists(caminho) or self._expirada(session_id):
+            raise SessaoNaoEncontrada(session_id)
+        return caminho
+
+    def _expirada(self, session_id: str) -> bool:
+        try:
+            criada = os.stat(self.caminho_metadados(session_id)).st_mtime
+        except FileNotFoundError:
+            return True
+        return time.time() - criada > self.ttl_segundos
+
+    @staticmethod
+    def _registrar_acesso(caminho: str):
+        """Atualiza o mtime do arquivo de dados, usado como marca de LRU"""
+        try:
+            os.utime(caminho)
+        except FileNotFoundError:
+            pass
+
+
+# Instância compartilhada pela aplicação
+armazenamento_sessoes = ArmazenamentoSessoes()
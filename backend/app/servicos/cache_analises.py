@@ -0,0 +1,150 @@
+"""
+Cache de Resultados de Análises
+Memoriza resultados por (impressão digital do conteúdo, tipo de análise, parâmetros)
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, BinaryIO, Dict, Optional, Tuple
+
+from app.utils.serializacao import dumps
+
+# Número máximo de resultados mantidos em memória
+CACHE_ANALISES_MAX_ITENS = int(os.getenv("CACHE_ANALISES_MAX_ITENS", "256"))
+
+# Memória máxima (estimada pelo tamanho do JSON) ocupada pelos resultados
+CACHE_ANALISES_LIMITE_BYTES = int(os.getenv("CACHE_ANALISES_LIMITE_BYTES", str(256 * 1024 ** 2)))
+
+TAMANHO_LEITURA_HASH = 1024 * 1024
+
+# Arquivos cujas impressões digitais ficam memorizadas (uma versão por arquivo)
+MAX_IMPRESSOES_ARQUIVOS = 4096
+
+
+def impressao_digital(arquivo: BinaryIO) -> str:
+    """Hash do conteúdo de um arquivo aberto, lido em blocos; volta o cursor ao início"""
+    arquivo.seek(0)
+    h = hashlib.blake2b(digest_size=16)
+    for bloco in iter(lambda: arquivo.read(TAMANHO_LEITURA_HASH), b""):
+        h.update(bloco)
+    arquivo.seek(0)
+    return h.hexdigest()
+
+
+# Caminho -> ((tamanho, mtime), impressão), em ordem de uso
+_impressoes_arquivos: "OrderedDict[str, Tuple[Tuple[int, int], str]]" = OrderedDict()
+_impressoes_lock = threading.Lock()
+
+
+def impressao_digital_arquivo(caminho: str) -> str:
+    """
+    Hash do conteúdo de um arquivo em disco. O cálculo é refeito apenas
+    quando tamanho ou mtime mudam; a nova versão substitui a anterior.
+    """
+    info = os.stat(caminho)
+    caminho = os.path.abspath(caminho)
+    versao = (info.st_size, info.st_mtime_ns)
+    with _impressoes_lock:
+        em_cache = _impressoes_arquivos.get(caminho)
+        if em_cache is not None and em_cache[0] == versao:
+            _impressoes_arquivos.move_to_end(caminho)
+            return em_cache[1]
+
+    with open(caminho, "rb") as arquivo:
+        valor = impressao_digital(arquivo)
+
+    with _impressoes_lock:
+        _impressoes_arquivos[caminho] = (versao, valor)
+        _impressoes_arquivos.move_to_end(caminho)
+        while len(_impressoes_arquivos) > MAX_IMPRESSOES_ARQUIVOS:
+            _impressoes_arquivos.popitem(last=False)
+    return valor
+
+
+class CacheAnalises:
+    """
+    Cache LRU de resultados de análises, limitado em itens e em bytes (o
+    tamanho do resultado serializado), com contadores de acertos e falhas.
+    Resultados maiores que o limite de bytes não são memorizados.
+    """
+
+    def __init__(self, max_itens: int = CACHE_ANALISES_MAX_ITENS, limite_bytes: int = CACHE_ANALISES_LIMITE_BYTES):
+        self.max_itens = max_itens
+        self.limite_bytes = limite_bytes
+        self.acertos = 0
+        self.falhas = 0
+        self.remocoes = 0
+        self._bytes = 0
+        self._itens: "OrderedDict[Tuple[str, str, str], Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _chave(impressao: str, tipo: str, parametros: Optional[Dict[str, Any]]) -> Tuple[str, str, str]:
+        return impressao, tipo, json.dumps(parametros or {}, sort_keys=True, default=str)
+
+    def obter(self, impressao: str, tipo: str, parametros: Optional[Dict[str, Any]] = None) -> Optional[Any]:
+        """Resultado memorizado ou None"""
+        chave = self._chave(impressao, tipo, parametros)
+        with self._lock:
+            if chave not in self._itens:
+                self.falhas += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return self._itens[chave][0]
+
+    def guardar(self, impressao: str, tipo: str, parametros: Optional[Dict[str, Any]], valor: Any):
+        chave = self._chave(impressao, tipo, parametros)
+        tamanho = len(dumps(valor))
+        with self._lock:
+            self._descartar(chave)
+            if tamanho > self.limite_bytes:
+                return
+            self._itens[chave] = (valor, tamanho)
+            self._bytes += tamanho
+            while len(self._itens) > self.max_itens or self._bytes > self.limite_bytes:
+                self._descartar(next(iter(self._itens)))
+                self.remocoes += 1
+
+    def remover(self, impressao: str, tipo: str, parametros: Optional[Dict[str, Any]] = None):
+        with self._lock:
+            self._descartar(self._chave(impressao, tipo, parametros))
+
+    def _descartar(self, chave: Tuple[str, str, str]):
+        item = self._itens.pop(chave, None)
+        if item is not None:
+            self._bytes -= item[1]
+
+    def invalidar(self, impressao: str) -> int:
+        """Remove todos os resultados de um conteúdo; retorna quantos foram removidos"""
+        with self._lock:
+            chaves = [chave for chave in self._itens if chave[0] == impressao]
+            for chave in chaves:
+                self._descartar(chave)
+            return len(chaves)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+            self._bytes = 0
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            consultas = self.acertos + self.falhas
+            return {
+                "itens": len(self._itens),
+                "max_itens": self.max_itens,
+                "bytes": self._bytes,
+                "limite_bytes": self.limite_bytes,
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "remocoes": self.remocoes,
+                "taxa_acerto": self.acertos / consultas if consultas else 0.0
+            }
+
+
+# Instância compartilhada pela aplicação
+cache_analises = CacheAnalises()
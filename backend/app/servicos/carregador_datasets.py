@@ -0,0 +1,180 @@
+"""
+Carregador de Datasets
+Ponto único de leitura de datasets cadastrados: projeção de colunas no
+leitor, tipos otimizados guardados em Dataset.colunas_info e cache LRU das
+colunas já carregadas no processo
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.modelos.dataset import Dataset
+from app.servicos.formato_colunar import carregar_dataset, remover_canonicos
+from app.servicos.tipos_colunas import aplicar_tipos, inferir_tipos
+
+# Memória máxima ocupada pelas colunas em cache, por processo
+DATASETS_CACHE_MAX_BYTES = int(os.getenv("DATASETS_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+
+def versao_arquivo(caminho: str) -> Tuple[int, int]:
+    """(tamanho, mtime em ns): muda sempre que o arquivo é regravado"""
+    info = os.stat(caminho)
+    return info.st_size, info.st_mtime_ns
+
+
+def tipos_registrados(dataset: Dataset, versao: Tuple[int, int]) -> Optional[Dict[str, str]]:
+    """Tipos guardados em `colunas_info`, se foram inferidos desta versão do arquivo"""
+    info = dataset.colunas_info or {}
+    if info.get("tipos") and tuple(info.get("versao_tipos") or ()) == versao:
+        return info["tipos"]
+    return None
+
+
+def registrar_tipos(db: Session, dataset: Dataset, tipos: Dict[str, str], versao: Tuple[int, int]):
+    """Persiste os tipos inferidos (reatribui o JSON para o SQLAlchemy detectar a mudança)"""
+    dataset.colunas_info = {**(dataset.colunas_info or {}), "tipos": tipos, "versao_tipos": list(versao)}
+    db.commit()
+
+
+class _Entrada:
+    """Colunas carregadas de uma versão do arquivo de um dataset"""
+
+    def __init__(self, versao: Tuple[int, int], ordem: List[str]):
+        self.versao = versao
+        self.ordem = ordem
+        self.colunas: Dict[str, pd.Series] = {}
+        self.bytes = 0
+
+    def adicionar(self, df: pd.DataFrame):
+        for coluna in df.columns:
+            if coluna not in self.colunas:
+                self.colunas[coluna] = df[coluna]
+                self.bytes += int(df[coluna].memory_usage(index=False, deep=True))
+
+
+class CarregadorDatasets:
+    """
+    Carrega datasets por `dataset_id` lendo do disco apenas as colunas que
+    ainda não estão em memória. A primeira leitura de um arquivo infere os
+    tipos otimizados de todas as colunas e os grava no banco; as seguintes
+    (inclusive em outros processos) os reutilizam.
+    """
+
+    def __init__(self, max_bytes: int = DATASETS_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.acertos = 0
+        self.falhas = 0
+        self.remocoes = 0
+        self._itens: "OrderedDict[int, _Entrada]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def carregar(self, db: Session, dataset: Dataset, colunas: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        DataFrame com `colunas` (todas se None, na ordem do arquivo).
+        Colunas inexistentes são ignoradas; quem chama valida o resultado.
+        """
+        versao = versao_arquivo(dataset.caminho_arquivo)
+        tipos = tipos_registrados(dataset, versao)
+        faltantes = colunas
+
+        with self._lock:
+            entrada = self._itens.get(dataset.id)
+            if entrada is not None and entrada.versao != versao:
+                self._remover(dataset.id)
+                entrada = None
+            if entrada is not None:
+                self._itens.move_to_end(dataset.id)
+                pedidas = entrada.ordem if colunas is None else [c for c in colunas if c in entrada.ordem]
+                faltantes = [coluna for coluna in pedidas if coluna not in entrada.colunas]
+                if not faltantes:
+                    self.acertos += 1
+                    return self._montar(entrada, pedidas)
+            self.falhas += 1
+
+        if tipos is None:
+            # Sem tipos registrados: lê o arquivo inteiro uma vez para inferi-los
+            df = carregar_dataset(dataset.id, dataset.caminho_arquivo, dataset.tipo_arquivo)
+            tipos = inferir_tipos(df)
+            df = aplicar_tipos(df, tipos)
+            registrar_tipos(db, dataset, tipos, versao)
+        else:
+            df = carregar_dataset(dataset.id, dataset.caminho_arquivo, dataset.tipo_arquivo, faltantes, tipos)
+
+        with self._lock:
+            entrada = self._itens.get(dataset.id)
+            if entrada is None or entrada.versao != versao:
+                self._remover(dataset.id)
+                entrada = _Entrada(versao, list(tipos))
+                self._itens[dataset.id] = entrada
+            antes = entrada.bytes
+            entrada.adicionar(df)
+            self._bytes += entrada.bytes - antes
+            pedidas = entrada.ordem if colunas is None else [c for c in colunas if c in entrada.colunas]
+            resultado = self._montar(entrada, pedidas)
+            self._liberar()
+        return resultado
+
+    def carregar_por_id(self, db: Session, dataset_id: int, colunas: Optional[List[str]] = None) -> pd.DataFrame:
+        dataset = db.query(Dataset).filter(Dataset.id == dataset_id).first()
+        if dataset is None:
+            raise ValueError(f"Dataset {dataset_id} não encontrado")
+        return self.carregar(db, dataset, colunas)
+
+    @staticmethod
+    def _montar(entrada: _Entrada, colunas: List[str]) -> pd.DataFrame:
+        # Cópia: quem chama pode alterar o DataFrame sem afetar o cache
+        return pd.DataFrame({coluna: entrada.colunas[coluna] for coluna in colunas}, copy=True)
+
+    def _remover(self, dataset_id: int):
+        entrada = self._itens.pop(dataset_id, None)
+        if entrada is not None:
+            self._bytes -= entrada.bytes
+            self.remocoes += 1
+
+    def _liberar(self):
+        """Remove os datasets menos usados até caber no limite (um sozinho acima dele também sai)"""
+        while self._itens and self._bytes > self.max_bytes:
+            self._remover(next(iter(self._itens)))
+
+    def invalidar(self, dataset_id: int):
+        with self._lock:
+            self._remover(dataset_id)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+            self._bytes = 0
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            consultas = self.acertos + self.falhas
+            return {
+                "datasets": len(self._itens),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "remocoes": self.remocoes,
+                "taxa_acerto": self.acertos / consultas if consultas else 0.0
+            }
+
+
+# Instância do processo (cada worker do executor de tarefas tem a sua)
+carregador_datasets = CarregadorDatasets()
+
+
+@event.listens_for(Dataset, "after_delete")
+def _descartar_copias_do_dataset(mapper, conexao, dataset: Dataset):
+    """
+    Dataset removido pela sessão do ORM: a cópia canônica e as colunas em
+    cache saem junto (DELETEs em massa via query não disparam o evento)
+    """
+    remover_canonicos(dataset.id)
+    carregador_datasets.invalidar(dataset.id)
@@ -0,0 +1,193 @@
+"""
+Cliente HTTP do IBGE
+Conexões compartilhadas e cache de respostas com revalidação condicional
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+try:
+    import h2  # noqa: F401  (instalado com httpx[http2])
+    HTTP2_DISPONIVEL = True
+except ImportError:
+    HTTP2_DISPONIVEL = False
+
+logger = logging.getLogger(__name__)
+
+# Endereço da API de serviços de dados (pode apontar para um servidor local em testes)
+IBGE_BASE_URL = os.getenv("IBGE_BASE_URL", "https://servicodados.ibge.gov.br").rstrip("/")
+
+# Tempo em que uma resposta é servida sem consultar o IBGE, e janela adicional
+# em que a resposta vencida ainda é servida enquanto é revalidada em segundo plano
+IBGE_CACHE_TTL_SEGUNDOS = float(os.getenv("IBGE_CACHE_TTL_SEGUNDOS", "3600"))
+IBGE_CACHE_JANELA_OBSOLETA_SEGUNDOS = float(os.getenv("IBGE_CACHE_JANELA_OBSOLETA_SEGUNDOS", "86400"))
+
+IBGE_TIMEOUT_SEGUNDOS = float(os.getenv("IBGE_TIMEOUT_SEGUNDOS", "30"))
+IBGE_MAX_CONEXOES = int(os.getenv("IBGE_MAX_CONEXOES", "20"))
+IBGE_HTTP2 = os.getenv("IBGE_HTTP2", "true").lower() == "true"
+
+
+class ErroFonteDados(RuntimeError):
+    """O IBGE não respondeu ou respondeu com erro e não há cópia em cache"""
+
+
+class EntradaCache:
+    """Resposta já interpretada e os validadores para revalidá-la"""
+
+    def __init__(self, dados: Any, etag: Optional[str], ultima_modificacao: Optional[str]):
+        self.dados = dados
+        self.etag = etag
+        self.ultima_modificacao = ultima_modificacao
+        self.obtida_em = time.monotonic()
+
+    @property
+    def idade(self) -> float:
+        return time.monotonic() - self.obtida_em
+
+
+class ClienteIBGE:
+    """
+    Cliente assíncrono com pool de conexões, compartilhado pela aplicação.
+
+    Respostas JSON ficam em cache por URL. Dentro do TTL são servidas sem
+    acesso à rede; depois dele, e dentro da janela obsoleta, a cópia antiga é
+    servida enquanto uma revalidação (If-None-Match / If-Modified-Since) roda
+    em segundo plano. Requisições simultâneas pela mesma URL compartilham uma
+    única busca, então o IBGE recebe no máximo uma consulta por URL e por TTL.
+    """
+
+    def __init__(
+        self,
+        ttl: float = IBGE_CACHE_TTL_SEGUNDOS,
+        janela_obsoleta: float = IBGE_CACHE_JANELA_OBSOLETA_SEGUNDOS,
+        timeout: float = IBGE_TIMEOUT_SEGUNDOS,
+        max_conexoes: int = IBGE_MAX_CONEXOES,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.ttl = ttl
+        self.janela_obsoleta = janela_obsoleta
+        self.timeout = timeout
+        self.max_conexoes = max_conexoes
+        self.transport = transport
+        self.acertos = 0
+        self.revalidacoes = 0
+        self.downloads = 0
+        self.erros = 0
+        self._cliente: Optional[httpx.AsyncClient] = None
+        self._entradas: Dict[str, EntradaCache] = {}
+        self._em_andamento: Dict[str, asyncio.Task] = {}
+
+    def _obter_cliente(self) -> httpx.AsyncClient:
+        if self._cliente is None or self._cliente.is_closed:
+            self._cliente = httpx.AsyncClient(
+                http2=IBGE_HTTP2 and HTTP2_DISPONIVEL and self.transport is None,
+                timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 10.0)),
+                limits=httpx.Limits(
+                    max_connections=self.max_conexoes,
+                    max_keepalive_connections=self.max_conexoes
+                ),
+                transport=self.transport,
+                follow_redirects=True
+            )
+        return self._cliente
+
+    async def iniciar(self):
+        self._obter_cliente()
+
+    async def fechar(self):
+        for tarefa in list(self._em_andamento.values()):
+            tarefa.cancel()
+        if self._cliente is not None:
+            await self._cliente.aclose()
+            self._cliente = None
+
+    async def obter_json(self, url: str) -> Any:
+        """
+        JSON da URL, do cache sempre que possível. O objeto devolvido é
+        compartilhado entre requisições e não deve ser modificado.
+        """
+        entrada = self._entradas.get(url)
+        if entrada is not None:
+            if entrada.idade < self.ttl:
+                self.acertos += 1
+                return entrada.dados
+            if entrada.idade < self.ttl + self.janela_obsoleta:
+                self.acertos += 1
+                self._buscar_uma_vez(url)
+                return entrada.dados
+
+        return await asyncio.shield(self._buscar_uma_vez(url))
+
+    def _buscar_uma_vez(self, url: str) -> asyncio.Task:
+        """Tarefa de busca da URL, reaproveitando a que já estiver em andamento"""
+        tarefa = self._em_andamento.get(url)
+        if tarefa is None:
+            tarefa = asyncio.get_running_loop().create_task(self._buscar(url))
+            self._em_andamento[url] = tarefa
+            tarefa.add_done_callback(lambda _: self._em_andamento.pop(url, None))
+            # Revalidações em segundo plano podem falhar sem ninguém aguardando
+            tarefa.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return tarefa
+
+    async def _buscar(self, url: str) -> Any:
+        entrada = self._entradas.get(url)
+        cabecalhos = {}
+        if entrada is not None:
+            if entrada.etag:
+                cabecalhos["If-None-Match"] = entrada.etag
+            if entrada.ultima_modificacao:
+                cabecalhos["If-Modified-Since"] = entrada.ultima_modificacao
+
+        try:
+            resposta = await self._obter_cliente().get(url, headers=cabecalhos)
+            if resposta.status_code == 304 and entrada is not None:
+                self.revalidacoes += 1
+                entrada.obtida_em = time.monotonic()
+                return entrada.dados
+            resposta.raise_for_status()
+            # Os agregados do IBGE têm alguns MB; interpretar fora do event loop
+            dados = await asyncio.to_thread(json.loads, resposta.content)
+        except (httpx.HTTPError, ValueError) as e:
+            self.erros += 1
+            logger.warning(f"Falha ao consultar {url}: {e}")
+            if entrada is not None:
+                # Melhor servir a última cópia conhecida do que falhar
+                return entrada.dados
+            raise ErroFonteDados(f"Erro ao acessar dados do IBGE: {e}") from e
+
+        self.downloads += 1
+        self._entradas[url] = EntradaCache(
+            dados,
+            resposta.headers.get("ETag"),
+            resposta.headers.get("Last-Modified")
+        )
+        return dados
+
+    def invalidar(self, url: Optional[str] = None):
+        if url is None:
+            self._entradas.clear()
+        else:
+            self._entradas.pop(url, None)
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            "urls_em_cache": len(self._entradas),
+            "ttl_segundos": self.ttl,
+            "janela_obsoleta_segundos": self.janela_obsoleta,
+            "http2": IBGE_HTTP2 and HTTP2_DISPONIVEL and self.transport is None,
+            "acertos": self.acertos,
+            "revalidacoes": self.revalidacoes,
+            "downloads": self.downloads,
+            "erros": self.erros,
+            "buscas_em_andamento": len(self._em_andamento)
+        }
+
+
+# Instância compartilhada pela aplicação
+cliente_ibge = ClienteIBGE()
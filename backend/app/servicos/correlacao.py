@@ -0,0 +1,356 @@
+"""
+Motor de Correlação
+Matriz de correlação calculada uma única vez com produtos de matrizes (BLAS)
+e extração vetorizada dos pares mais fortes
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.stats import rankdata
+
+METODOS_CORRELACAO = ("pearson", "spearman", "kendall")
+
+# Acima deste número de colunas a matriz é calculada em blocos e gravada em disco
+CORRELACAO_LIMITE_COLUNAS_DENSA = int(os.getenv("CORRELACAO_LIMITE_COLUNAS_DENSA", "2000"))
+CORRELACAO_TAMANHO_BLOCO = int(os.getenv("CORRELACAO_TAMANHO_BLOCO", "1024"))
+
+# Máximo de pares fortes guardados no banco no modo em blocos
+CORRELACAO_MAX_PARES = int(os.getenv("CORRELACAO_MAX_PARES", "10000"))
+
+# Matrizes em disco: uma por análise, removidas com ela ou sem leituras há CORRELACAO_TTL_SEGUNDOS
+CORRELACAO_DIR = os.getenv("CORRELACAO_DIR", "artefatos_correlacao")
+CORRELACAO_TTL_SEGUNDOS = int(os.getenv("CORRELACAO_TTL_SEGUNDOS", str(7 * 24 * 3600)))
+
+
+def _padronizar(X: np.ndarray) -> np.ndarray:
+    """Colunas centralizadas com norma 1: a correlação vira um produto escalar"""
+    X = X - X.mean(axis=0)
+    normas = np.sqrt(np.einsum("ij,ij->j", X, X))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return X / normas
+
+
+def _pearson_completo(X: np.ndarray) -> np.ndarray:
+    """Pearson sem valores ausentes: um único X^T X sobre colunas padronizadas"""
+    X = _padronizar(X)
+    return X.T @ X
+
+
+def _preparar_pareado(X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Dados centralizados e zerados nos ausentes, e a máscara de presença"""
+    presente = ~np.isnan(X)
+    # Centralizar pela média de cada coluna reduz o cancelamento numérico
+    X = np.where(presente, X - np.nanmean(X, axis=0), 0).astype(X.dtype, copy=False)
+    return X, presente.astype(X.dtype)
+
+
+def _pearson_pareado_bloco(X_i: np.ndarray, M_i: np.ndarray, X_j: np.ndarray, M_j: np.ndarray) -> np.ndarray:
+    """
+    Pearson com exclusão pareada de ausentes (mesmo resultado de DataFrame.corr)
+    entre as colunas de X_i e as de X_j: somas, somas de quadrados e
+    contagens de cada par vêm de produtos entre os dados zerados nos
+    ausentes e as máscaras de presença
+    """
+    n = M_i.T @ M_j
+    soma_i = X_i.T @ M_j               # soma_i[a, b] = Σ x_a nas linhas em que x_b existe
+    soma_j = M_i.T @ X_j
+    quadrados_i = (X_i * X_i).T @ M_j
+    quadrados_j = M_i.T @ (X_j * X_j)
+    produto = X_i.T @ X_j
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = produto - soma_i * soma_j / n
+        var_i = quadrados_i - soma_i * soma_i / n
+        var_j = quadrados_j - soma_j * soma_j / n
+        corr = cov / np.sqrt(var_i * var_j)
+    corr[n < 2] = np.nan
+    return corr
+
+
+def _pearson_pareado(X: np.ndarray) -> np.ndarray:
+    X, M = _preparar_pareado(X)
+    return _pearson_pareado_bloco(X, M, X, M)
+
+
+def _ajustar_diagonal(bloco: np.ndarray):
+    diagonal = np.diagonal(bloco).copy()
+    np.fill_diagonal(bloco, np.where(np.isnan(diagonal), np.nan, 1.0))
+
+
+def matriz_correlacao(df: pd.DataFrame, metodo: str = "pearson", float32: bool = False) -> pd.DataFrame:
+    """
+    Matriz de correlação das colunas de `df` (todas numéricas).
+
+    Pearson usa BLAS diretamente; Spearman converte as colunas em postos e
+    aplica Pearson. Com ausentes, Spearman e Kendall recorrem ao pandas,
+    que recalcula os postos para cada par. `float32` reduz pela metade a
+    memória e o tempo em datasets largos, com erro da ordem de 1e-6.
+    """
+    if metodo not in METODOS_CORRELACAO:
+        raise ValueError(f"Método de correlação deve ser um de: {', '.join(METODOS_CORRELACAO)}")
+
+    colunas = df.columns
+    X = df.to_numpy(dtype=np.float32 if float32 else np.float64, na_value=np.nan)
+    tem_ausentes = bool(np.isnan(X).any())
+
+    if metodo == "kendall" or (metodo == "spearman" and tem_ausentes):
+        return df.corr(method=metodo)
+
+    if metodo == "spearman":
+        X = rankdata(X, axis=0).astype(X.dtype, copy=False)
+
+    corr = _pearson_pareado(X) if tem_ausentes else _pearson_completo(X)
+    np.clip(corr, -1.0, 1.0, out=corr)
+    _ajustar_diagonal(corr)
+    return pd.DataFrame(corr, index=colunas, columns=colunas)
+
+
+def pares_fortes(
+    matriz: pd.DataFrame,
+    limiar: float = 0.5,
+    top_k: Optional[int] = None
+) -> List[Tuple[str, str, float]]:
+    """
+    Pares (variavel1, variavel2, correlacao) acima do limiar em valor
+    absoluto, do mais forte para o mais fraco; `top_k` limita a quantidade
+    """
+    if top_k is not None and top_k <= 0:
+        return []
+    valores = matriz.to_numpy()
+    linhas, colunas = np.triu_indices(len(valores), k=1)
+    triangulo = valores[linhas, colunas]
+    absolutos = np.abs(triangulo)
+
+    selecionados = np.flatnonzero(absolutos > limiar)   # NaN nunca passa na comparação
+    if top_k is not None and len(selecionados) > top_k:
+        selecionados = selecionados[np.argpartition(-absolutos[selecionados], top_k - 1)[:top_k]]
+    selecionados = selecionados[np.argsort(-absolutos[selecionados], kind="stable")]
+
+    nomes = matriz.columns
+    return [
+        (nomes[i], nomes[j], float(valor))
+        for i, j, valor in zip(
+            linhas[selecionados].tolist(),
+            colunas[selecionados].tolist(),
+            triangulo[selecionados].tolist()
+        )
+    ]
+
+
+def correlacao_em_blocos(
+    df: pd.DataFrame,
+    caminho: str,
+    metodo: str = "pearson",
+    float32: bool = False,
+    limiar: float = 0.5,
+    top_k: Optional[int] = None,
+    tamanho_bloco: int = CORRELACAO_TAMANHO_BLOCO
+) -> Dict[str, Any]:
+    """
+    Calcula a matriz de correlação bloco a bloco e a grava em `caminho` como
+    .npy (lido depois com mmap). Só os blocos do triângulo superior são
+    calculados; cada um é gravado também na posição transposta. Nenhuma
+    matriz densa p x p é mantida em memória.
+
+    Devolve o resumo e os pares acima do limiar (no máximo `top_k`, ou
+    CORRELACAO_MAX_PARES), do mais forte para o mais fraco.
+    """
+    if metodo not in ("pearson", "spearman"):
+        raise ValueError("O modo em blocos suporta apenas os métodos pearson e spearman")
+
+    tipo = np.float32 if float32 else np.float64
+    X = df.to_numpy(dtype=tipo, na_value=np.nan)
+    tem_ausentes = bool(np.isnan(X).any())
+    if metodo == "spearman":
+        if tem_ausentes:
+            raise ValueError("Spearman em blocos requer dados sem valores ausentes")
+        X = rankdata(X, axis=0).astype(tipo, copy=False)
+
+    if tem_ausentes:
+        X, M = _preparar_pareado(X)
+    else:
+        X, M = _padronizar(X), None
+
+    p = X.shape[1]
+    limite_pares = min(top_k, CORRELACAO_MAX_PARES) if top_k is not None else CORRELACAO_MAX_PARES
+    pares_i = np.empty(0, dtype=np.int64)
+    pares_j = np.empty(0, dtype=np.int64)
+    pares_valor = np.empty(0, dtype=tipo)
+    total_acima = 0
+    maior_absoluto = 0.0
+
+    descritor, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho) or ".", suffix=".tmp")
+    os.close(descritor)
+    try:
+        saida = np.lib.format.open_memmap(temporario, mode="w+", dtype=tipo, shape=(p, p))
+        for inicio_i in range(0, p, tamanho_bloco):
+            fim_i = min(inicio_i + tamanho_bloco, p)
+            for inicio_j in range(inicio_i, p, tamanho_bloco):
+                fim_j = min(inicio_j + tamanho_bloco, p)
+                if M is None:
+                    bloco = X[:, inicio_i:fim_i].T @ X[:, inicio_j:fim_j]
+                else:
+                    bloco = _pearson_pareado_bloco(
+                        X[:, inicio_i:fim_i], M[:, inicio_i:fim_i],
+                        X[:, inicio_j:fim_j], M[:, inicio_j:fim_j]
+                    )
+                np.clip(bloco, -1.0, 1.0, out=bloco)
+                if inicio_i == inicio_j:
+                    _ajustar_diagonal(bloco)
+                saida[inicio_i:fim_i, inicio_j:fim_j] = bloco
+                saida[inicio_j:fim_j, inicio_i:fim_i] = bloco.T
+
+                # Pares do bloco acima do limiar, sem repetir a diagonal nem o triângulo inferior
+                absolutos = np.abs(bloco)
+                if inicio_i == inicio_j:
+                    absolutos[np.tril_indices(len(bloco), m=bloco.shape[1])] = np.nan
+                finitos = absolutos[~np.isnan(absolutos)]
+                if len(finitos):
+                    maior_absoluto = max(maior_absoluto, float(finitos.max()))
+                linhas, colunas = np.nonzero(absolutos > limiar)
+                total_acima += len(linhas)
+                pares_i = np.concatenate([pares_i, linhas + inicio_i])
+                pares_j = np.concatenate([pares_j, colunas + inicio_j])
+                pares_valor = np.concatenate([pares_valor, bloco[linhas, colunas]])
+                if len(pares_valor) > limite_pares:
+                    manter = np.argpartition(-np.abs(pares_valor), limite_pares - 1)[:limite_pares]
+                    pares_i, pares_j, pares_valor = pares_i[manter], pares_j[manter], pares_valor[manter]
+        saida.flush()
+        del saida
+        os.replace(temporario, caminho)
+    except Exception:
+        os.remove(temporario)
+        raise
+
+    ordem = np.argsort(-np.abs(pares_valor), kind="stable")
+    nomes = df.columns
+    return {
+        "pares": [
+            (nomes[i], nomes[j], float(valor))
+            for i, j, valor in zip(pares_i[ordem].tolist(), pares_j[ordem].tolist(), pares_valor[ordem].tolist())
+        ],
+        "resumo": {
+            "num_variaveis": p,
+            "pares_acima_limiar": total_acima,
+            "pares_guardados": int(len(ordem)),
+            "maior_correlacao_absoluta": maior_absoluto,
+            "limiar": limiar
+        }
+    }
+
+
+def ler_bloco_correlacao(caminho: str, linha_inicio: int, coluna_inicio: int, tamanho: int) -> np.ndarray:
+    """Lê um bloco da matriz gravada por `correlacao_em_blocos` sem carregar o arquivo"""
+    matriz = np.load(caminho, mmap_mode="r")
+    return np.array(matriz[linha_inicio:linha_inicio + tamanho, coluna_inicio:coluna_inicio + tamanho])
+
+
+class ArmazenamentoMatrizes:
+    """
+    Matrizes do modo em blocos em `<diretorio>/correlacao_<analise_id>.npy`,
+    com os nomes das colunas no .json ao lado. Cada análise tem os seus
+    arquivos: um resultado reaproveitado do cache de análises ganha links
+    físicos para os da análise de origem, e remover uma análise não afeta as
+    demais. O mtime do .npy marca o último uso; matrizes sem leituras há mais
+    de `ttl_segundos` são removidas na gravação seguinte.
+    """
+
+    def __init__(self, diretorio: str = CORRELACAO_DIR, ttl_segundos: int = CORRELACAO_TTL_SEGUNDOS):
+        self.diretorio = diretorio
+        self.ttl_segundos = ttl_segundos
+
+    def caminho(self, analise_id: int) -> str:
+        return os.path.join(self.diretorio, f"correlacao_{analise_id}.npy")
+
+    def caminho_colunas(self, analise_id: int) -> str:
+        return os.path.join(self.diretorio, f"correlacao_{analise_id}.json")
+
+    def gravar(
+        self,
+        analise_id: int,
+        df: pd.DataFrame,
+        metodo: str,
+        float32: bool,
+        limiar: float,
+        top_k: Optional[int]
+    ) -> Dict[str, Any]:
+        """`correlacao_em_blocos` para o arquivo da análise; devolve o cálculo e a descrição da matriz"""
+        os.makedirs(self.diretorio, exist_ok=True)
+        self.remover_expiradas()
+        calculo = correlacao_em_blocos(df, self.caminho(analise_id), metodo, float32, limiar, top_k)
+        with open(self.caminho_colunas(analise_id), "w", encoding="utf-8") as arquivo:
+            json.dump([str(coluna) for coluna in df.columns], arquivo)
+        calculo["matriz"] = {
+            "formato": "npy",
+            "dimensao": [len(df.columns), len(df.columns)],
+            "dtype": "float32" if float32 else "float64"
+        }
+        return calculo
+
+    def existe(self, analise_id: int) -> bool:
+        return os.path.exists(self.caminho(analise_id)) and os.path.exists(self.caminho_colunas(analise_id))
+
+    def vincular(self, origem_id: int, analise_id: int):
+        """Dá à análise os arquivos da matriz de outra (link físico, ou cópia onde não houver links)"""
+        for origem, destino in (
+            (self.caminho_colunas(origem_id), self.caminho_colunas(analise_id)),
+            (self.caminho(origem_id), self.caminho(analise_id))
+        ):
+            try:
+                os.link(origem, destino)
+            except FileExistsError:
+                pass
+            except FileNotFoundError:
+                raise
+            except OSError:
+                shutil.copyfile(origem, destino)
+
+    def ler_bloco(self, analise_id: int, linha_inicio: int, coluna_inicio: int, tamanho: int) -> Tuple[List[str], np.ndarray]:
+        """Nomes das colunas e um bloco da matriz; a leitura renova o prazo de expiração"""
+        with open(self.caminho_colunas(analise_id), encoding="utf-8") as arquivo:
+            nomes = json.load(arquivo)
+        bloco = ler_bloco_correlacao(self.caminho(analise_id), linha_inicio, coluna_inicio, tamanho)
+        try:
+            os.utime(self.caminho(analise_id))
+        except FileNotFoundError:
+            pass
+        return nomes, bloco
+
+    def remover(self, analise_id: int):
+        for caminho in (self.caminho(analise_id), self.caminho_colunas(analise_id)):
+            try:
+                os.remove(caminho)
+            except FileNotFoundError:
+                pass
+
+    def remover_expiradas(self) -> int:
+        """Remove as matrizes sem leituras há mais de `ttl_segundos`; retorna quantas foram removidas"""
+        limite = time.time() - self.ttl_segundos
+        removidas = 0
+        try:
+            nomes = os.listdir(self.diretorio)
+        except FileNotFoundError:
+            return 0
+        for nome in nomes:
+            identificador = nome[len("correlacao_"):-len(".npy")]
+            if not (nome.startswith("correlacao_") and nome.endswith(".npy") and identificador.isdigit()):
+                continue
+            try:
+                if os.stat(os.path.join(self.diretorio, nome)).st_mtime >= limite:
+                    continue
+            except FileNotFoundError:
+                continue
+            self.remover(int(identificador))
+            removidas += 1
+        return removidas
+
+
+# Instância compartilhada pela aplicação e pelos processos do executor de tarefas
+armazenamento_matrizes = ArmazenamentoMatrizes()
@@ -0,0 +1,264 @@
+"""
+Motor de Estatísticas Descritivas
+Todas as colunas numéricas processadas juntas, como um bloco 2-D do NumPy
+"""
+
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+QUANTIS_PADRAO = (0.25, 0.5, 0.75)
+
+# Linhas mantidas na amostra de reservatório usada para os quartis de uploads em blocos
+TAMANHO_AMOSTRA_QUARTIS = int(os.getenv("INGESTAO_AMOSTRA_QUARTIS", "50000"))
+
+# Tamanho das faixas de colunas ordenadas de uma vez em estatisticas_bloco
+ESTATISTICAS_BYTES_FAIXA = int(os.getenv("ESTATISTICAS_BYTES_FAIXA", str(64 * 1024 * 1024)))
+
+
+def _valor(x: float) -> Optional[float]:
+    return None if np.isnan(x) else float(x)
+
+
+def _quantis_ordenados(ordenado: np.ndarray, contagem: np.ndarray, quantis: Sequence[float]) -> np.ndarray:
+    """
+    Quantis com interpolação linear (o padrão de numpy e pandas) de colunas
+    já ordenadas, com os NaN no fim; uma linha por quantil
+    """
+    colunas = np.arange(ordenado.shape[1])
+    ultimo = np.maximum(contagem - 1, 0)
+    resultado = np.empty((len(quantis), ordenado.shape[1]))
+    with np.errstate(invalid="ignore"):
+        for k, q in enumerate(quantis):
+            posicao = q * ultimo
+            abaixo = np.floor(posicao).astype(np.int64)
+            acima = np.minimum(abaixo + 1, ultimo)
+            fracao = posicao - abaixo
+            inferior = ordenado[abaixo, colunas]
+            superior = ordenado[acima, colunas]
+            resultado[k] = inferior + (superior - inferior) * fracao
+    resultado[:, contagem == 0] = np.nan
+    return resultado
+
+
+def estatisticas_bloco(X: np.ndarray, quantis: Sequence[float] = QUANTIS_PADRAO) -> Dict[str, Any]:
+    """
+    Estatísticas exatas de cada coluna de X (linhas x colunas, NaN = ausente)
+    a partir de uma única ordenação: contagem, nulos, soma, média, variância,
+    mínimo, máximo, quantis e valores distintos. Devolve arrays por coluna.
+
+    As colunas são ordenadas em faixas de até ESTATISTICAS_BYTES_FAIXA: além
+    de X, a memória extra é de cerca de duas cópias de uma faixa (a ordenada
+    e os desvios da média), não do bloco inteiro.
+    """
+    n_linhas, n_colunas = X.shape
+    por_faixa = max(1, ESTATISTICAS_BYTES_FAIXA // max(8 * n_linhas, 1))
+    if n_colunas <= por_faixa:
+        return _estatisticas_faixa(X, quantis)
+
+    faixas = [_estatisticas_faixa(X[:, inicio:inicio + por_faixa], quantis) for inicio in range(0, n_colunas, por_faixa)]
+    resultado = {
+        chave: np.concatenate([faixa[chave] for faixa in faixas])
+        for chave in faixas[0] if chave != "quantis"
+    }
+    resultado["quantis"] = {q: np.concatenate([faixa["quantis"][q] for faixa in faixas]) for q in quantis}
+    return resultado
+
+
+def _estatisticas_faixa(X: np.ndarray, quantis: Sequence[float]) -> Dict[str, Any]:
+    n_linhas, n_colunas = X.shape
+    ordenado = np.sort(X, axis=0)
+    contagem = n_linhas - np.isnan(ordenado).sum(axis=0)
+
+    soma = np.nansum(ordenado, axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        media = soma / contagem
+        # Desvios elevados ao quadrado no próprio array: um único temporário do tamanho da faixa
+        desvios = ordenado - media
+        np.square(desvios, out=desvios)
+        m2 = np.nansum(desvios, axis=0)
+        del desvios
+        variancia = np.where(contagem > 1, m2 / (contagem - 1), np.nan)
+
+    colunas = np.arange(n_colunas)
+    minimo = np.where(contagem > 0, ordenado[0] if n_linhas else np.nan, np.nan)
+    maximo = np.where(contagem > 0, ordenado[np.maximum(contagem - 1, 0), colunas] if n_linhas else np.nan, np.nan)
+
+    # Em colunas ordenadas, cada troca de valor entre vizinhos válidos inicia um valor novo
+    if n_linhas > 1:
+        validos = np.arange(n_linhas - 1)[:, None] < (contagem - 1)
+        distintos = ((ordenado[1:] != ordenado[:-1]) & validos).sum(axis=0) + (contagem > 0)
+    else:
+        distintos = (contagem > 0).astype(np.int64)
+
+    return {
+        "contagem": contagem,
+        "nulos": n_linhas - contagem,
+        "soma": soma,
+        "media": media,
+        "m2": m2,
+        "variancia": variancia,
+        "minimo": minimo,
+        "maximo": maximo,
+        "quantis": dict(zip(quantis, _quantis_ordenados(ordenado, contagem, quantis))),
+        "distintos": distintos
+    }
+
+
+def _colunas_numericas(df: pd.DataFrame) -> pd.DataFrame:
+    return df.select_dtypes(include=[np.number])
+
+
+def descrever(df: pd.DataFrame) -> Dict[str, Dict[str, Optional[float]]]:
+    """Equivalente a `df.describe().to_dict()` para as colunas numéricas"""
+    numericas = _colunas_numericas(df)
+    if numericas.columns.empty:
+        return df.describe().to_dict()
+
+    e = estatisticas_bloco(numericas.to_numpy(dtype=np.float64, na_value=np.nan))
+    resultado = {}
+    for i, coluna in enumerate(numericas.columns):
+        resultado[coluna] = {
+            "count": float(e["contagem"][i]),
+            "mean": _valor(e["media"][i]),
+            "std": _valor(np.sqrt(e["variancia"][i])),
+            "min": _valor(e["minimo"][i]),
+            "25%": _valor(e["quantis"][0.25][i]),
+            "50%": _valor(e["quantis"][0.5][i]),
+            "75%": _valor(e["quantis"][0.75][i]),
+            "max": _valor(e["maximo"][i])
+        }
+    return resultado
+
+
+def analise_descritiva(df: pd.DataFrame) -> Dict[str, Any]:
+    """Resumo do dataset e estatísticas por coluna numérica usados pela análise descritiva e pelo relatório"""
+    numericas = _colunas_numericas(df)
+    categoricas = df.select_dtypes(include=["object", "string", "category"])
+    resultados: Dict[str, Any] = {
+        "resumo": {
+            "num_registros": len(df),
+            "num_variaveis": len(df.columns),
+            "variaveis_numericas": len(numericas.columns),
+            "variaveis_categoricas": len(categoricas.columns)
+        },
+        "estatisticas_numericas": {}
+    }
+    if numericas.columns.empty:
+        return resultados
+
+    e = estatisticas_bloco(numericas.to_numpy(dtype=np.float64, na_value=np.nan))
+    for i, coluna in enumerate(numericas.columns):
+        resultados["estatisticas_numericas"][coluna] = {
+            "contagem": int(e["contagem"][i]),
+            "soma": float(e["soma"][i]),
+            "media": _valor(e["media"][i]),
+            "mediana": _valor(e["quantis"][0.5][i]),
+            "desvio_padrao": _valor(np.sqrt(e["variancia"][i])),
+            "minimo": _valor(e["minimo"][i]),
+            "maximo": _valor(e["maximo"][i]),
+            "q1": _valor(e["quantis"][0.25][i]),
+            "q3": _valor(e["quantis"][0.75][i]),
+            "valores_distintos": int(e["distintos"][i]),
+            "valores_nulos": round(float(e["nulos"][i]) / len(df) * 100, 2) if len(df) else 0.0
+        }
+    return resultados
+
+
+class AcumuladorNumerico:
+    """
+    Estatísticas de um conjunto fixo de colunas numéricas recebidas em blocos.
+
+    Contagem, média e variância são combinadas bloco a bloco (Chan et al.)
+    para todas as colunas de uma vez; mínimo e máximo são exatos. Os quartis
+    vêm de uma amostra de reservatório de linhas — exatos enquanto o arquivo
+    couber na amostra. Com `tamanho_amostra=0` (quartis vindos de sketches)
+    a amostragem não é feita e os quartis ficam vazios.
+    """
+
+    def __init__(self, colunas: List[str], tamanho_amostra: int = TAMANHO_AMOSTRA_QUARTIS, semente: int = 42):
+        self.colunas = list(colunas)
+        p = len(self.colunas)
+        self.linhas = 0
+        self.n = np.zeros(p, dtype=np.int64)
+        self.media = np.zeros(p)
+        self.m2 = np.zeros(p)
+        self.minimo = np.full(p, np.inf)
+        self.maximo = np.full(p, -np.inf)
+        self.tamanho_amostra = tamanho_amostra
+        self.amostra = np.empty((0, p))
+        self._rng = np.random.default_rng(semente)
+
+    def atualizar(self, X: np.ndarray):
+        """Incorpora um bloco (linhas x colunas, na ordem de `colunas`; NaN são ignorados)"""
+        if len(X) == 0:
+            return
+        presente = ~np.isnan(X)
+        m = presente.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            media_bloco = np.where(m > 0, np.nansum(X, axis=0) / m, 0.0)
+            m2_bloco = np.nansum((X - media_bloco) ** 2, axis=0)
+            total = self.n + m
+            delta = media_bloco - self.media
+            peso = np.where(total > 0, m / np.maximum(total, 1), 0.0)
+            self.m2 += m2_bloco + delta ** 2 * self.n * peso
+            self.media += delta * peso
+
+        self.minimo = np.fmin(self.minimo, np.fmin.reduce(X, axis=0))
+        self.maximo = np.fmax(self.maximo, np.fmax.reduce(X, axis=0))
+        if self.tamanho_amostra > 0:
+            self._atualizar_amostra(X)
+        self.n = total
+        self.linhas += len(X)
+
+    @property
+    def amostrado(self) -> bool:
+        """Se mais linhas passaram do que cabem na amostra (quartis estimados)"""
+        return 0 < self.tamanho_amostra < self.linhas
+
+    def _atualizar_amostra(self, X: np.ndarray):
+        """Amostragem de reservatório de linhas, vetorizada"""
+        vistos = self.linhas
+        livres = self.tamanho_amostra - len(self.amostra)
+        if livres > 0:
+            entrada = X[:livres]
+            self.amostra = np.concatenate([self.amostra, entrada])
+            vistos += len(entrada)
+            X = X[livres:]
+        if len(X) == 0:
+            return
+
+        # Cada linha na posição global t substitui uma linha da amostra com probabilidade k/t
+        posicoes = vistos + np.arange(1, len(X) + 1)
+        destinos = (self._rng.random(len(X)) * posicoes).astype(np.int64)
+        substituir = destinos < self.tamanho_amostra
+        self.amostra[destinos[substituir]] = X[substituir]
+
+    def resultado(self) -> Dict[str, Dict[str, Any]]:
+        """Estatísticas finais por coluna no formato do resumo de upload"""
+        if len(self.amostra):
+            amostra = estatisticas_bloco(self.amostra)["quantis"]
+        else:
+            amostra = {q: np.full(len(self.colunas), np.nan) for q in QUANTIS_PADRAO}
+
+        resultado = {}
+        for i, coluna in enumerate(self.colunas):
+            if self.n[i] == 0:
+                resultado[coluna] = {
+                    "mean": None, "median": None, "std": None,
+                    "min": None, "max": None,
+                    "quartiles": {0.25: None, 0.5: None, 0.75: None}
+                }
+                continue
+            quartis = {q: _valor(amostra[q][i]) for q in QUANTIS_PADRAO}
+            resultado[coluna] = {
+                "mean": float(self.media[i]),
+                "median": quartis[0.5],
+                "std": float(np.sqrt(self.m2[i] / (self.n[i] - 1))) if self.n[i] > 1 else None,
+                "min": float(self.minimo[i]),
+                "max": float(self.maximo[i]),
+                "quartiles": quartis
+            }
+        return resultado
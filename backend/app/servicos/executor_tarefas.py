@@ -0,0 +1,202 @@
+"""
+Executor de Tarefas Pesadas
+Roda análises e treinamentos em um pool de processos, fora do event loop
+"""
+
+import asyncio
+import inspect
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Set
+
+from app.servicos.progresso import RetransmissorProgresso, canal_progresso, evento_progresso, inicializar_processo
+
+logger = logging.getLogger(__name__)
+
+# Processos do pool e número máximo de tarefas aguardando ou em execução
+TAREFAS_MAX_PROCESSOS = int(os.getenv("TAREFAS_MAX_PROCESSOS", str(os.cpu_count() or 2)))
+TAREFAS_MAX_FILA = int(os.getenv("TAREFAS_MAX_FILA", "100"))
+
+# Execuções simultâneas permitidas por tipo de tarefa
+LIMITES_PADRAO = {
+    "descritiva": 4,
+    "correlacao": 4,
+    "automl": 1
+}
+
+
+def _ler_limites(valor: Optional[str]) -> Dict[str, int]:
+    """Interpreta TAREFAS_LIMITES no formato "automl=2,correlacao=4" """
+    limites = dict(LIMITES_PADRAO)
+    for item in (valor or "").split(","):
+        if "=" in item:
+            tipo, limite = item.split("=", 1)
+            limites[tipo.strip()] = int(limite)
+    return limites
+
+
+async def marcar_analise_com_erro(analise_id: int, erro: BaseException):
+    """Registra no banco a falha de uma tarefa que não chegou a atualizar a análise"""
+    from app.database.conexao import SessionLocalAsync
+    from app.modelos.analise import Analise, StatusAnalise
+
+    mensagem = str(erro) or erro.__class__.__name__
+    async with SessionLocalAsync() as db:
+        analise = await db.get(Analise, analise_id)
+        if analise and analise.status == StatusAnalise.PROCESSANDO:
+            analise.status = StatusAnalise.ERRO
+            analise.resultados = {"erro": mensagem}
+            await db.commit()
+            await canal_progresso.publicar(evento_progresso(analise_id, "erro", None, mensagem=mensagem))
+
+
+async def _chamar(callback: Callable[[Any], Any], valor: Any):
+    """Callbacks podem ser funções comuns ou devolver uma corrotina"""
+    retorno = callback(valor)
+    if inspect.isawaitable(retorno):
+        await retorno
+
+
+def _inicializar_processo(fila):
+    """Inicializador dos processos do pool"""
+    # Registra todos os modelos: as tarefas consultam tabelas relacionadas entre si
+    from app.modelos import usuario, projeto, dataset, analise  # noqa: F401
+    inicializar_processo(fila)
+
+
+class FilaCheia(RuntimeError):
+    """Limite de tarefas pendentes atingido"""
+
+
+class ExecutorTarefas:
+    """
+    Pool de processos com fila limitada e concorrência máxima por tipo de tarefa.
+
+    `submeter` devolve imediatamente; a tarefa aguarda a vaga do seu tipo e
+    então roda em um processo do pool. Funções submetidas devem ser síncronas,
+    importáveis pelo nome e receber apenas argumentos serializáveis com pickle.
+    Callbacks rodam no processo da aplicação, dentro do event loop; os que
+    acessam o banco devem ser corrotinas (ex.: `marcar_analise_com_erro`).
+    """
+
+    def __init__(
+        self,
+        max_processos: int = TAREFAS_MAX_PROCESSOS,
+        max_fila: int = TAREFAS_MAX_FILA,
+        limites: Optional[Dict[str, int]] = None
+    ):
+        self.max_processos = max_processos
+        self.max_fila = max_fila
+        self.limites = limites if limites is not None else _ler_limites(os.getenv("TAREFAS_LIMITES"))
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._semaforos: Dict[str, asyncio.Semaphore] = {}
+        self._pendentes: Dict[str, int] = {}
+        self._em_execucao: Dict[str, int] = {}
+        self._tarefas: Set[asyncio.Task] = set()
+        self._retransmissor: Optional[RetransmissorProgresso] = None
+
+    def _obter_pool(self) -> ProcessPoolExecutor:
+        """Cria o pool na primeira tarefa (dentro do event loop) ou depois de um worker morrer"""
+        if self._pool is None:
+            contexto = multiprocessing.get_context("spawn")
+            if self._retransmissor is not None:
+                self._retransmissor.encerrar()
+            # Eventos de progresso publicados nas tarefas voltam por esta fila
+            self._retransmissor = RetransmissorProgresso(contexto, asyncio.get_running_loop())
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_processos,
+                mp_context=contexto,
+                initializer=_inicializar_processo,
+                initargs=(self._retransmissor.fila,)
+            )
+        return self._pool
+
+    def _semaforo(self, tipo: str) -> asyncio.Semaphore:
+        if tipo not in self._semaforos:
+            self._semaforos[tipo] = asyncio.Semaphore(self.limites.get(tipo, self.max_processos))
+        return self._semaforos[tipo]
+
+    @property
+    def total_pendentes(self) -> int:
+        return sum(self._pendentes.values())
+
+    def fila_cheia(self) -> bool:
+        return self.total_pendentes >= self.max_fila
+
+    def submeter(
+        self,
+        tipo: str,
+        funcao: Callable[..., Any],
+        *args: Any,
+        ao_concluir: Optional[Callable[[Any], Any]] = None,
+        ao_falhar: Optional[Callable[[BaseException], Any]] = None
+    ) -> asyncio.Task:
+        """Agenda `funcao(*args)` no pool; levanta FilaCheia se não houver vaga"""
+        if self.fila_cheia():
+            raise FilaCheia(f"Limite de {self.max_fila} tarefas pendentes atingido")
+
+        self._pendentes[tipo] = self._pendentes.get(tipo, 0) + 1
+        tarefa = asyncio.get_running_loop().create_task(
+            self._executar(tipo, funcao, args, ao_concluir, ao_falhar)
+        )
+        self._tarefas.add(tarefa)
+        tarefa.add_done_callback(self._tarefas.discard)
+        return tarefa
+
+    async def _executar(self, tipo, funcao, args, ao_concluir, ao_falhar):
+        pool = None
+        try:
+            async with self._semaforo(tipo):
+                self._em_execucao[tipo] = self._em_execucao.get(tipo, 0) + 1
+                try:
+                    pool = self._obter_pool()
+                    resultado = await asyncio.get_running_loop().run_in_executor(pool, funcao, *args)
+                finally:
+                    self._em_execucao[tipo] -= 1
+            if ao_concluir is not None:
+                await _chamar(ao_concluir, resultado)
+        except Exception as e:
+            logger.exception(f"Falha na tarefa '{tipo}' ({getattr(funcao, '__name__', funcao)})")
+            if isinstance(e, BrokenProcessPool) and self._pool is pool:
+                # Um worker morreu (ex.: falta de memória); o próximo uso recria o pool
+                pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+            if ao_falhar is not None:
+                await _chamar(ao_falhar, e)
+        finally:
+            self._pendentes[tipo] -= 1
+
+    def encerrar(self):
+        """
+        Encerra o pool (tarefas ainda na fila do pool são canceladas; as em
+        execução terminam) e o retransmissor de progresso. Chamado no
+        desligamento da aplicação; um novo uso recria os dois.
+        """
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+        if self._retransmissor is not None:
+            self._retransmissor.encerrar()
+            self._retransmissor = None
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            "max_processos": self.max_processos,
+            "max_fila": self.max_fila,
+            "pendentes": self.total_pendentes,
+            "por_tipo": {
+                tipo: {
+                    "pendentes": self._pendentes.get(tipo, 0),
+                    "em_execucao": self._em_execucao.get(tipo, 0),
+                    "limite": self.limites.get(tipo, self.max_processos)
+                }
+                for tipo in sorted(set(self.limites) | set(self._pendentes))
+            }
+        }
+
+
+# Instância compartilhada pela aplicação
+executor_tarefas = ExecutorTarefas()
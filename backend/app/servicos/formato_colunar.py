@@ -0,0 +1,225 @@
+"""
+Formato Colunar Canônico
+Leitura de Parquet e Feather/Arrow com projeção de colunas, e conversão única
+de datasets em texto (CSV, JSON, Excel) para Parquet comprimido
+"""
+
+import os
+import shutil
+import tempfile
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+from app.servicos.tipos_colunas import aplicar_tipos
+
+# Codec do Parquet canônico e das exportações
+COMPRESSAO_COLUNAR = os.getenv("COMPRESSAO_COLUNAR", "zstd")
+
+# Cópias canônicas dos datasets em texto: <CANONICOS_DIR>/<dataset_id>/<tamanho>-<mtime_ns>.parquet
+CANONICOS_DIR = os.getenv("CANONICOS_DIR", "datasets_canonicos")
+
+# Extensões lidas sem passar por texto (Feather v2 é um arquivo Arrow IPC)
+EXTENSOES_COLUNARES: Dict[str, str] = {
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".feather": "feather",
+    ".arrow": "feather",
+    ".ipc": "feather"
+}
+
+FORMATOS_EXPORTACAO = ("parquet", "feather", "arrow", "csv")
+
+TIPOS_MIDIA = {
+    "parquet": "application/vnd.apache.parquet",
+    "feather": "application/vnd.apache.arrow.file",
+    "arrow": "application/vnd.apache.arrow.file",
+    "csv": "text/csv"
+}
+
+
+def tipo_colunar(nome_arquivo: str) -> Optional[str]:
+    """'parquet', 'feather' ou None, pela extensão"""
+    return EXTENSOES_COLUNARES.get(os.path.splitext(nome_arquivo.lower())[1])
+
+
+def iterar_colunar(arquivo: Union[str, BinaryIO], tipo: str, linhas_por_bloco: int) -> Iterator[pd.DataFrame]:
+    """Blocos de um arquivo Parquet (por grupos de linhas) ou Feather (por lotes)"""
+    if tipo == "parquet":
+        for lote in pq.ParquetFile(arquivo).iter_batches(batch_size=linhas_por_bloco):
+            yield lote.to_pandas()
+    else:
+        leitor = pa.ipc.open_file(arquivo)
+        for i in range(leitor.num_record_batches):
+            lote = leitor.get_batch(i)
+            for inicio in range(0, max(lote.num_rows, 1), linhas_por_bloco):
+                yield lote.slice(inicio, linhas_por_bloco).to_pandas()
+
+
+def esquema_colunar(caminho: str, tipo: str) -> pa.Schema:
+    if tipo == "parquet":
+        return pq.read_schema(caminho)
+    with pa.memory_map(caminho, "r") as origem:
+        return pa.ipc.open_file(origem).schema
+
+
+def ler_colunar(caminho: str, tipo: str, colunas: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Lê apenas `colunas` do disco (as demais nem são descomprimidas).
+    Colunas inexistentes são ignoradas; quem chama valida o resultado.
+    """
+    if colunas is not None:
+        existentes = set(esquema_colunar(caminho, tipo).names)
+        colunas = [coluna for coluna in colunas if coluna in existentes]
+    if tipo == "parquet":
+        return pq.read_table(caminho, columns=colunas).to_pandas()
+    return feather.read_table(caminho, columns=colunas, memory_map=True).to_pandas()
+
+
+def _ler_texto(
+    caminho: str,
+    tipo: str,
+    colunas: Optional[List[str]] = None,
+    tipos: Optional[Dict[str, str]] = None
+) -> pd.DataFrame:
+    """
+    Lê um dataset em texto; CSV e Excel leem só `colunas`, e o CSV já
+    interpreta cada coluna com o tipo registrado em vez de inferi-lo
+    """
+    if tipo == "csv":
+        tipos_csv = {
+            coluna: t for coluna, t in (tipos or {}).items()
+            if (colunas is None or coluna in colunas) and not t.startswith("datetime")
+        }
+        try:
+            df = pd.read_csv(caminho, usecols=colunas, dtype=tipos_csv or None)
+        except (TypeError, ValueError):
+            # O conteúdo não cabe nos tipos registrados: infere de novo
+            df = pd.read_csv(caminho, usecols=colunas)
+    elif tipo == "excel":
+        df = pd.read_excel(caminho, usecols=colunas)
+    elif tipo == "json":
+        df = pd.read_json(caminho)
+        if colunas is not None:
+            df = df[[coluna for coluna in colunas if coluna in df.columns]]
+    else:
+        raise ValueError(f"Tipo de arquivo não suportado: {tipo}")
+    return aplicar_tipos(df, tipos)
+
+
+def salvar_parquet(tabela: Union[pa.Table, pd.DataFrame], caminho: str):
+    """
+    Grava Parquet comprimido de forma atômica; textos ficam em
+    codificação de dicionário
+    """
+    if isinstance(tabela, pd.DataFrame):
+        tabela = pa.Table.from_pandas(tabela, preserve_index=False)
+    diretorio = os.path.dirname(caminho) or "."
+    descritor, temporario = tempfile.mkstemp(dir=diretorio, suffix=".tmp")
+    os.close(descritor)
+    try:
+        pq.write_table(tabela, temporario, compression=COMPRESSAO_COLUNAR, use_dictionary=True)
+        os.replace(temporario, caminho)
+    except Exception:
+        os.remove(temporario)
+        raise
+
+
+def diretorio_canonico(dataset_id: int) -> str:
+    return os.path.join(CANONICOS_DIR, str(dataset_id))
+
+
+def caminho_canonico(dataset_id: int, versao: Tuple[int, int]) -> str:
+    """Cópia de uma versão (tamanho, mtime em ns) do arquivo do dataset"""
+    return os.path.join(diretorio_canonico(dataset_id), f"{versao[0]}-{versao[1]}.parquet")
+
+
+def garantir_canonico(
+    dataset_id: int,
+    caminho_arquivo: str,
+    tipo_arquivo: str,
+    tipos: Optional[Dict[str, str]] = None
+) -> str:
+    """
+    Caminho da cópia Parquet da versão atual do arquivo do dataset,
+    convertendo o texto apenas na primeira leitura de cada versão; a cópia
+    da versão anterior é removida. Com `tipos`, a cópia já guarda as colunas
+    nos tipos otimizados.
+    """
+    info = os.stat(caminho_arquivo)
+    destino = caminho_canonico(dataset_id, (info.st_size, info.st_mtime_ns))
+    if not os.path.exists(destino):
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        salvar_parquet(_ler_texto(caminho_arquivo, tipo_arquivo, tipos=tipos), destino)
+        for nome in os.listdir(os.path.dirname(destino)):
+            anterior = os.path.join(os.path.dirname(destino), nome)
+            if nome.endswith(".parquet") and anterior != destino:
+                try:
+                    os.remove(anterior)
+                except FileNotFoundError:
+                    pass
+    return destino
+
+
+def remover_canonicos(dataset_id: int):
+    """Apaga as cópias canônicas de um dataset (removido do banco)"""
+    shutil.rmtree(diretorio_canonico(dataset_id), ignore_errors=True)
+
+
+def carregar_dataset(
+    dataset_id: int,
+    caminho_arquivo: str,
+    tipo_arquivo: str,
+    colunas: Optional[List[str]] = None,
+    tipos: Optional[Dict[str, str]] = None
+) -> pd.DataFrame:
+    """
+    Carrega um dataset lendo apenas `colunas` (todas se None). Parquet e
+    Feather são lidos diretamente; CSV, JSON e Excel são convertidos uma vez
+    por versão do arquivo para Parquet em CANONICOS_DIR e as leituras
+    seguintes usam a cópia canônica. `tipos` (coluna -> dtype) é aplicado ao
+    resultado.
+    """
+    if tipo_arquivo in ("parquet", "feather"):
+        return aplicar_tipos(ler_colunar(caminho_arquivo, tipo_arquivo, colunas), tipos)
+    try:
+        canonico = garantir_canonico(dataset_id, caminho_arquivo, tipo_arquivo, tipos)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Colunas com tipos misturados não têm representação colunar: lê o texto
+        existentes = None if colunas is None else _colunas_existentes(caminho_arquivo, tipo_arquivo, colunas)
+        return _ler_texto(caminho_arquivo, tipo_arquivo, existentes, tipos)
+    return aplicar_tipos(ler_colunar(canonico, "parquet", colunas), tipos)
+
+
+def _colunas_existentes(caminho_arquivo: str, tipo_arquivo: str, colunas: List[str]) -> List[str]:
+    """`colunas` que existem no arquivo (usecols falha com nomes desconhecidos)"""
+    if tipo_arquivo == "csv":
+        existentes = set(pd.read_csv(caminho_arquivo, nrows=0).columns)
+    elif tipo_arquivo == "excel":
+        existentes = set(pd.read_excel(caminho_arquivo, nrows=0).columns)
+    else:
+        return colunas
+    return [coluna for coluna in colunas if coluna in existentes]
+
+
+def exportar_lotes(esquema: pa.Schema, lotes: Iterator[pa.RecordBatch], formato: str, caminho: str):
+    """Grava lotes Arrow em `caminho` no formato pedido, sem montar a tabela inteira"""
+    if formato not in FORMATOS_EXPORTACAO:
+        raise ValueError(f"Formato de exportação deve ser um de: {', '.join(FORMATOS_EXPORTACAO)}")
+    if formato == "parquet":
+        with pq.ParquetWriter(caminho, esquema, compression=COMPRESSAO_COLUNAR, use_dictionary=True) as escritor:
+            for lote in lotes:
+                escritor.write_batch(lote)
+    elif formato == "csv":
+        with pa_csv.CSVWriter(caminho, esquema) as escritor:
+            for lote in lotes:
+                escritor.write_batch(lote)
+    else:
+        opcoes = pa.ipc.IpcWriteOptions(compression=COMPRESSAO_COLUNAR)
+        with pa.OSFile(caminho, "wb") as destino, pa.ipc.new_file(destino, esquema, options=opcoes) as escritor:
+            for lote in lotes:
+                escritor.write_batch(lote)
@@ -0,0 +1,206 @@
+"""
+Serviço de Ingestão de Arquivos
+Leitura em blocos de uploads grandes com estatísticas calculadas de forma incremental
+"""
+
+import json
+import os
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.servicos.estatisticas import AcumuladorNumerico
+from app.servicos.formato_colunar import EXTENSOES_COLUNARES, iterar_colunar, tipo_colunar
+from app.servicos.sketches import LIMITES_ERRO, ResumoAproximado
+from app.servicos.tipos_colunas import AcumuladorTipos, aplicar_tipos
+
+# Número de linhas lidas por bloco ao processar CSVs
+LINHAS_POR_BLOCO = int(os.getenv("INGESTAO_LINHAS_POR_BLOCO", "100000"))
+
+FORMATOS_SUPORTADOS = (".csv", ".json", ".xlsx", ".xls") + tuple(EXTENSOES_COLUNARES)
+
+
+class FormatoNaoSuportado(ValueError):
+    """Extensão de arquivo sem leitor disponível"""
+
+
+class AcumuladorResumo:
+    """
+    Monta o bloco `analysis` do upload a partir de blocos de um DataFrame.
+
+    Com `aproximado=True` os quartis e os valores distintos vêm de sketches
+    de tamanho fixo (ver `app.servicos.sketches`) em vez da amostra de
+    reservatório, e as colunas de texto ganham distintos e valores mais
+    frequentes; a memória não cresce com o tamanho do arquivo.
+    """
+
+    def __init__(self, linhas_preview: int = 10, aproximado: bool = False):
+        self.total_linhas = 0
+        self.colunas: List[str] = []
+        self.nulos: Dict[str, int] = {}
+        self.estatisticas: Optional[AcumuladorNumerico] = None
+        self.sketches: Optional[ResumoAproximado] = ResumoAproximado() if aproximado else None
+        self.linhas_preview = linhas_preview
+        self.preview: Optional[pd.DataFrame] = None
+
+    def atualizar(self, bloco: pd.DataFrame):
+        """Incorpora um bloco de linhas"""
+        if not self.colunas:
+            self.colunas = bloco.columns.tolist()
+
+        self.total_linhas += len(bloco)
+        for coluna, nulos in bloco.isnull().sum().items():
+            self.nulos[coluna] = self.nulos.get(coluna, 0) + int(nulos)
+
+        if self.preview is None or len(self.preview) < self.linhas_preview:
+            faltam = self.linhas_preview - (0 if self.preview is None else len(self.preview))
+            parte = bloco.head(faltam)
+            self.preview = parte if self.preview is None else pd.concat([self.preview, parte])
+
+        if self.sketches is not None:
+            self.sketches.atualizar(bloco)
+            return
+
+        # Colunas numéricas do primeiro bloco, processadas juntas como uma matriz;
+        # se alguma deixar de ser numérica, fica com NaN e é descartada no resultado
+        numericas = bloco.select_dtypes(include=[np.number]).columns
+        if self.estatisticas is None:
+            self.estatisticas = AcumuladorNumerico(numericas.tolist())
+        indices = {coluna: i for i, coluna in enumerate(self.estatisticas.colunas)}
+        presentes = [coluna for coluna in numericas if coluna in indices]
+        X = np.full((len(bloco), len(indices)), np.nan)
+        X[:, [indices[coluna] for coluna in presentes]] = bloco[presentes].to_numpy(dtype=np.float64, na_value=np.nan)
+        self.estatisticas.atualizar(X)
+
+    def resultado(self, filename: str, tipos_finais: pd.Series) -> Dict[str, Any]:
+        """
+        Resumo final. `tipos_finais` são os dtypes do dataset completo: uma
+        coluna que virou texto em algum bloco não entra nas estatísticas.
+        """
+        numericas = set(tipos_finais[tipos_finais.map(pd.api.types.is_numeric_dtype)].index)
+        numericas -= set(tipos_finais[tipos_finais.map(pd.api.types.is_bool_dtype)].index)
+        preview = self.preview if self.preview is not None else pd.DataFrame(columns=self.colunas)
+
+        if self.sketches is not None:
+            estatisticas = self.sketches.estatisticas_numericas(numericas)
+        else:
+            estatisticas = {
+                coluna: estatistica
+                for coluna, estatistica in (self.estatisticas.resultado() if self.estatisticas else {}).items()
+                if coluna in numericas
+            }
+
+        resumo = {
+            "filename": filename,
+            "rows": self.total_linhas,
+            "columns": len(self.colunas),
+            "column_names": self.colunas,
+            "data_types": tipos_finais.astype(str).to_dict(),
+            "null_counts": {coluna: self.nulos.get(coluna, 0) for coluna in self.colunas},
+            "preview": preview.to_dict('records'),
+            "statistics": estatisticas
+        }
+        if self.estatisticas is not None and self.estatisticas.amostrado:
+            resumo["quartiles_sampled"] = True
+        if self.sketches is not None:
+            resumo["categorical_statistics"] = self.sketches.estatisticas_categoricas(
+                colunas=set(self.colunas) - numericas
+            )
+            resumo["approximate"] = True
+            resumo["error_bounds"] = LIMITES_ERRO
+        return resumo
+
+
+def ler_blocos(arquivo: BinaryIO, filename: str, linhas_por_bloco: int = LINHAS_POR_BLOCO) -> Iterator[pd.DataFrame]:
+    """
+    Lê o arquivo enviado em blocos de DataFrame sem carregar o conteúdo bruto
+    inteiro em memória. CSV é lido em blocos de `linhas_por_bloco` linhas,
+    Parquet e Feather/Arrow por grupos de linhas, sem passar por texto;
+    JSON e Excel não permitem leitura parcial e geram um único bloco.
+    """
+    nome = filename.lower()
+    colunar = tipo_colunar(nome)
+    if colunar is not None:
+        yield from iterar_colunar(arquivo, colunar, linhas_por_bloco)
+    elif nome.endswith('.csv'):
+        with pd.read_csv(arquivo, chunksize=linhas_por_bloco, encoding='utf-8') as leitor:
+            for bloco in leitor:
+                yield bloco
+    elif nome.endswith('.json'):
+        yield pd.DataFrame(json.load(arquivo))
+    elif nome.endswith(('.xlsx', '.xls')):
+        yield pd.read_excel(arquivo)
+    else:
+        raise FormatoNaoSuportado("Formato de arquivo não suportado. Use CSV, JSON, Excel, Parquet ou Feather/Arrow.")
+
+
+class DestinoMemoria:
+    """Destino padrão dos blocos: concatena tudo em um único DataFrame"""
+
+    def __init__(self):
+        self.blocos: List[pd.DataFrame] = []
+        self.dataframe: Optional[pd.DataFrame] = None
+
+    def escrever(self, bloco: pd.DataFrame):
+        self.blocos.append(bloco)
+
+    def finalizar(self) -> pd.DataFrame:
+        if len(self.blocos) > 1:
+            self.dataframe = pd.concat(self.blocos, ignore_index=True)
+        else:
+            self.dataframe = self.blocos[0] if self.blocos else pd.DataFrame()
+        self.blocos = []
+        return self.dataframe
+
+    def tipos(self) -> pd.Series:
+        return self.dataframe.dtypes
+
+
+def ingerir_arquivo(
+    arquivo: BinaryIO,
+    filename: str,
+    destino=None,
+    linhas_por_bloco: int = LINHAS_POR_BLOCO,
+    aproximado: bool = False
+) -> Dict[str, Any]:
+    """
+    Processa um upload bloco a bloco.
+
+    Cada bloco atualiza o resumo incremental e é entregue a `destino`, um
+    objeto com `escrever(bloco)`, `finalizar()` e `tipos()` (dtypes finais do
+    dataset). Sem destino, os blocos são concatenados em memória.
+    Mediana e quartis vêm de uma amostra de reservatório de
+    TAMANHO_AMOSTRA_QUARTIS linhas: exatos até esse tamanho e estimados
+    acima dele, quando o resumo traz `quartiles_sampled`. `aproximado` troca
+    a amostra por sketches mescláveis com limites de erro documentados e
+    acrescenta distintos e valores mais frequentes das colunas de texto.
+
+    Os blocos também alimentam a escolha do menor dtype de cada coluna: o
+    resumo traz em `data_types` os tipos otimizados e em `memory` os bytes
+    antes e depois da otimização. Retorna {"analysis": resumo, "tipos": dtypes
+    otimizados, "dataframe": retorno de destino.finalizar()}, este já
+    convertido quando for um DataFrame.
+    """
+    destino = destino if destino is not None else DestinoMemoria()
+    acumulador = AcumuladorResumo(aproximado=aproximado)
+    otimizacao = AcumuladorTipos()
+
+    for bloco in ler_blocos(arquivo, filename, linhas_por_bloco):
+        acumulador.atualizar(bloco)
+        otimizacao.atualizar(bloco)
+        destino.escrever(bloco)
+
+    df = destino.finalizar()
+    tipos = otimizacao.tipos()
+    if isinstance(df, pd.DataFrame):
+        df = aplicar_tipos(df, tipos)
+
+    analysis = acumulador.resultado(filename, destino.tipos())
+    analysis["data_types"] = {**analysis["data_types"], **tipos}
+    analysis["memory"] = otimizacao.relatorio()
+    return {
+        "analysis": analysis,
+        "tipos": tipos,
+        "dataframe": df
+    }
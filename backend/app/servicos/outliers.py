@@ -0,0 +1,200 @@
+"""
+Detecção de Outliers
+Limites de todas as colunas calculados de uma vez e máscaras aplicadas por
+broadcasting, em blocos de linhas
+"""
+
+import os
+import warnings
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+
+METODOS_OUTLIERS = ("iqr", "zscore", "mad", "isolation_forest")
+
+# Multiplicador padrão do desvio (IQR, desvio padrão ou MAD) de cada método
+FATORES_PADRAO = {"iqr": 1.5, "zscore": 3.0, "mad": 3.5}
+
+# Linhas avaliadas por vez; limita a memória das máscaras booleanas
+OUTLIERS_LINHAS_POR_BLOCO = int(os.getenv("OUTLIERS_LINHAS_POR_BLOCO", "100000"))
+
+# Índices de linha devolvidos por coluna, no lugar dos valores
+OUTLIERS_AMOSTRA_INDICES = int(os.getenv("OUTLIERS_AMOSTRA_INDICES", "20"))
+
+# Linhas usadas para treinar o IsolationForest (a predição percorre todas)
+OUTLIERS_AMOSTRA_TREINO = int(os.getenv("OUTLIERS_AMOSTRA_TREINO", "100000"))
+
+# Escala que torna o MAD um estimador consistente do desvio padrão na normal
+ESCALA_MAD = 1.4826
+
+
+def limites_outliers(X: np.ndarray, metodo: str = "iqr", fator: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Limites inferior e superior de cada coluna de X (NaN = ausente):
+    iqr: Q1 - f·IQR e Q3 + f·IQR; zscore: média ± f·desvio; mad: mediana ± f·1,4826·MAD.
+    Colunas sem valores têm limites NaN e nunca geram outliers.
+    """
+    if metodo not in FATORES_PADRAO:
+        raise ValueError(f"Método de outliers por coluna deve ser um de: {', '.join(FATORES_PADRAO)}")
+    fator = FATORES_PADRAO[metodo] if fator is None else fator
+    with warnings.catch_warnings(), np.errstate(invalid="ignore"):
+        warnings.simplefilter("ignore", RuntimeWarning)   # colunas inteiramente nulas
+        if metodo == "iqr":
+            q1, q3 = np.nanpercentile(X, [25, 75], axis=0)
+            amplitude = q3 - q1
+            return q1 - fator * amplitude, q3 + fator * amplitude
+        if metodo == "zscore":
+            media = np.nanmean(X, axis=0)
+            desvio = np.nanstd(X, axis=0, ddof=1)
+            return media - fator * desvio, media + fator * desvio
+        if metodo == "mad":
+            mediana = np.nanmedian(X, axis=0)
+            mad = ESCALA_MAD * np.nanmedian(np.abs(X - mediana), axis=0)
+            return mediana - fator * mad, mediana + fator * mad
+
+
+def _primeiros_por_coluna(linhas: np.ndarray, colunas: np.ndarray, faltam: np.ndarray) -> np.ndarray:
+    """Posições dos primeiros `faltam[c]` pares de cada coluna c (pares em ordem de linha)"""
+    ordem = np.argsort(colunas, kind="stable")
+    colunas_ordenadas = colunas[ordem]
+    posto = np.arange(len(ordem)) - np.searchsorted(colunas_ordenadas, colunas_ordenadas, side="left")
+    return ordem[posto < faltam[colunas_ordenadas]]
+
+
+def _resumo_linhas(contagem: int, total: int, indices: np.ndarray) -> Dict[str, Any]:
+    return {
+        "count": int(contagem),
+        "percentage": contagem / total * 100 if total else 0.0,
+        "sample_indices": indices.tolist()
+    }
+
+
+def outliers_por_coluna(
+    X: np.ndarray,
+    inferior: np.ndarray,
+    superior: np.ndarray,
+    linhas_por_bloco: int = OUTLIERS_LINHAS_POR_BLOCO,
+    amostra: int = OUTLIERS_AMOSTRA_INDICES
+) -> Dict[str, Any]:
+    """
+    Conta, bloco a bloco, os valores fora dos limites em todas as colunas de
+    uma vez e guarda os primeiros `amostra` índices de linha de cada coluna
+    """
+    n_linhas, n_colunas = X.shape
+    contagens = np.zeros(n_colunas, dtype=np.int64)
+    linhas_com_outlier = 0
+    amostra_linhas, amostra_colunas = [], []
+    amostra_geral = []
+    faltam = np.full(n_colunas, amostra, dtype=np.int64)
+
+    for inicio in range(0, n_linhas, linhas_por_bloco):
+        bloco = X[inicio:inicio + linhas_por_bloco]
+        with np.errstate(invalid="ignore"):
+            mascara = (bloco < inferior) | (bloco > superior)     # NaN nunca é outlier
+        contagens += mascara.sum(axis=0)
+        por_linha = np.flatnonzero(mascara.any(axis=1))
+        linhas_com_outlier += len(por_linha)
+        if sum(map(len, amostra_geral)) < amostra:
+            amostra_geral.append(inicio + por_linha[:amostra])
+
+        if faltam.any():
+            linhas, colunas = np.nonzero(mascara)
+            manter = _primeiros_por_coluna(linhas, colunas, faltam)
+            amostra_linhas.append(inicio + linhas[manter])
+            amostra_colunas.append(colunas[manter])
+            faltam -= np.bincount(colunas[manter], minlength=n_colunas)
+
+    # Agrupa os índices guardados por coluna com uma única ordenação
+    linhas = np.concatenate(amostra_linhas) if amostra_linhas else np.empty(0, dtype=np.int64)
+    colunas = np.concatenate(amostra_colunas) if amostra_colunas else np.empty(0, dtype=np.int64)
+    ordem = np.lexsort((linhas, colunas))
+    limites = np.searchsorted(colunas[ordem], np.arange(n_colunas + 1))
+    indices = np.split(linhas[ordem], limites[1:-1])
+
+    geral = np.concatenate(amostra_geral)[:amostra] if amostra_geral else np.empty(0, dtype=np.int64)
+    return {
+        "contagens": contagens,
+        "indices": indices,
+        "linhas": _resumo_linhas(linhas_com_outlier, n_linhas, geral)
+    }
+
+
+def outliers_isolation_forest(
+    X: np.ndarray,
+    linhas_por_bloco: int = OUTLIERS_LINHAS_POR_BLOCO,
+    amostra: int = OUTLIERS_AMOSTRA_INDICES,
+    amostra_treino: int = OUTLIERS_AMOSTRA_TREINO,
+    semente: int = 42
+) -> Dict[str, Any]:
+    """
+    Outliers multivariados por linha. O modelo é treinado em uma amostra de
+    linhas e a predição percorre o dataset em blocos; ausentes recebem a
+    mediana da coluna.
+    """
+    n_linhas = len(X)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        medianas = np.nan_to_num(np.nanmedian(X, axis=0))
+
+    def completar(bloco: np.ndarray) -> np.ndarray:
+        return np.where(np.isnan(bloco), medianas, bloco)
+
+    rng = np.random.default_rng(semente)
+    treino = X if n_linhas <= amostra_treino else X[np.sort(rng.choice(n_linhas, amostra_treino, replace=False))]
+    modelo = IsolationForest(random_state=semente, n_jobs=-1).fit(completar(treino))
+
+    contagem = 0
+    indices = []
+    for inicio in range(0, n_linhas, linhas_por_bloco):
+        bloco = completar(X[inicio:inicio + linhas_por_bloco])
+        linhas = np.flatnonzero(modelo.predict(bloco) == -1)
+        contagem += len(linhas)
+        if sum(map(len, indices)) < amostra:
+            indices.append(inicio + linhas[:amostra])
+    amostra_indices = np.concatenate(indices)[:amostra] if indices else np.empty(0, dtype=np.int64)
+    return _resumo_linhas(contagem, n_linhas, amostra_indices)
+
+
+def detectar_outliers(
+    df: pd.DataFrame,
+    metodo: str = "iqr",
+    fator: Optional[float] = None,
+    linhas_por_bloco: int = OUTLIERS_LINHAS_POR_BLOCO,
+    amostra: int = OUTLIERS_AMOSTRA_INDICES
+) -> Dict[str, Any]:
+    """
+    Outliers das colunas numéricas de `df`. Devolve contagens e uma amostra
+    de índices de linha (posições 0..n-1) por coluna, e o total de linhas
+    com algum outlier; o IsolationForest avalia apenas linhas inteiras.
+    """
+    if metodo not in METODOS_OUTLIERS:
+        raise ValueError(f"Método de outliers deve ser um de: {', '.join(METODOS_OUTLIERS)}")
+
+    X = df.to_numpy(dtype=np.float64, na_value=np.nan)
+    resultado: Dict[str, Any] = {"method": metodo, "outliers_by_column": {}}
+    if X.shape[0] == 0 or X.shape[1] == 0:
+        resultado["outlier_rows"] = _resumo_linhas(0, len(X), np.empty(0, dtype=np.int64))
+        return resultado
+
+    if metodo == "isolation_forest":
+        resultado["outlier_rows"] = outliers_isolation_forest(X, linhas_por_bloco, amostra)
+        return resultado
+
+    fator = FATORES_PADRAO[metodo] if fator is None else fator
+    inferior, superior = limites_outliers(X, metodo, fator)
+    contados = outliers_por_coluna(X, inferior, superior, linhas_por_bloco, amostra)
+    n_linhas = len(X)
+    resultado["factor"] = fator
+    for i, coluna in enumerate(df.columns):
+        contagem = int(contados["contagens"][i])
+        resultado["outliers_by_column"][coluna] = {
+            "count": contagem,
+            "percentage": contagem / n_linhas * 100 if n_linhas else 0.0,
+            "lower_bound": None if np.isnan(inferior[i]) else float(inferior[i]),
+            "upper_bound": None if np.isnan(superior[i]) else float(superior[i]),
+            "sample_indices": contados["indices"][i].tolist()
+        }
+    resultado["outlier_rows"] = contados["linhas"]
+    return resultado
@@ -0,0 +1,164 @@
+"""
+Predição em Lote
+Inferência vetorizada em blocos, com saída em NDJSON ou Parquet
+"""
+
+import os
+import tempfile
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.servicos.registro_modelos import PacoteModelo
+from app.utils.serializacao import dumps
+
+# Linhas por lote de inferência
+PREDICAO_LINHAS_POR_LOTE = int(os.getenv("PREDICAO_LINHAS_POR_LOTE", "50000"))
+
+TAMANHO_BLOCO_SAIDA = 1024 * 1024
+
+
+class EntradaInvalida(ValueError):
+    """Dados de entrada incompatíveis com as variáveis do modelo"""
+
+
+def validar_colunas(colunas: List[str], variaveis: List[str]):
+    faltantes = [var for var in variaveis if var not in colunas]
+    if faltantes:
+        raise EntradaInvalida(f"Variáveis obrigatórias ausentes: {', '.join(faltantes)}")
+
+
+def lotes_de_dataframe(df: pd.DataFrame, variaveis: List[str], linhas_por_lote: int = PREDICAO_LINHAS_POR_LOTE) -> Iterator[pd.DataFrame]:
+    validar_colunas(df.columns.tolist(), variaveis)
+    df = df[variaveis]
+    for inicio in range(0, len(df), linhas_por_lote):
+        yield df.iloc[inicio:inicio + linhas_por_lote]
+
+
+def lotes_de_csv(arquivo: Union[str, BinaryIO], variaveis: List[str], linhas_por_lote: int = PREDICAO_LINHAS_POR_LOTE) -> Iterator[pd.DataFrame]:
+    """Lê apenas as colunas do modelo, bloco a bloco"""
+    cabecalho = pd.read_csv(arquivo, nrows=0).columns.tolist()
+    validar_colunas(cabecalho, variaveis)
+    if hasattr(arquivo, "seek"):
+        arquivo.seek(0)
+    with pd.read_csv(arquivo, usecols=variaveis, chunksize=linhas_por_lote) as leitor:
+        for bloco in leitor:
+            yield bloco[variaveis]
+
+
+def lotes_de_parquet(arquivo: Union[str, BinaryIO], variaveis: List[str], linhas_por_lote: int = PREDICAO_LINHAS_POR_LOTE) -> Iterator[pd.DataFrame]:
+    """Lê apenas as colunas do modelo, grupo de linhas a grupo de linhas"""
+    parquet = pq.ParquetFile(arquivo)
+    validar_colunas(parquet.schema_arrow.names, variaveis)
+    for lote in parquet.iter_batches(batch_size=linhas_por_lote, columns=variaveis):
+        yield lote.to_pandas()[variaveis]
+
+
+def _matriz(lote: pd.DataFrame) -> np.ndarray:
+    try:
+        return lote.to_numpy(dtype=np.float64, na_value=np.nan)
+    except (TypeError, ValueError) as e:
+        raise EntradaInvalida(f"Valores não numéricos nas variáveis preditoras: {e}")
+
+
+def prever_lote(pacote: PacoteModelo, lote: pd.DataFrame, inicio: int) -> Dict[str, Any]:
+    """
+    Prediz um lote inteiro com uma chamada ao modelo. Linhas com valores
+    ausentes não são enviadas ao modelo e recebem predição nula.
+    """
+    X = _matriz(lote)
+    validas = ~np.isnan(X).any(axis=1)
+    X_validas = X[validas]
+    if pacote.scaler is not None and len(X_validas):
+        X_validas = pacote.scaler.transform(X_validas)
+
+    # Tipo fixo por modelo (classes do classificador ou float) para o esquema não variar entre lotes
+    classes_modelo = getattr(pacote.modelo, "classes_", None)
+    predicoes = np.zeros(len(X), dtype=classes_modelo.dtype if classes_modelo is not None else np.float64)
+    probabilidades = None
+    classes = None
+    if len(X_validas):
+        predicoes[validas] = pacote.modelo.predict(X_validas)
+    if hasattr(pacote.modelo, "predict_proba"):
+        classes = [str(classe) for classe in pacote.modelo.classes_]
+        probabilidades = np.full((len(X), len(classes)), np.nan)
+        if len(X_validas):
+            probabilidades[validas] = pacote.modelo.predict_proba(X_validas)
+
+    return {
+        "indices": np.arange(inicio, inicio + len(X)),
+        "predicoes": predicoes,
+        "validas": validas,
+        "probabilidades": probabilidades,
+        "classes": classes
+    }
+
+
+def _lotes_previstos(pacote: PacoteModelo, lotes: Iterator[pd.DataFrame]) -> Iterator[Dict[str, Any]]:
+    inicio = 0
+    for lote in lotes:
+        yield prever_lote(pacote, lote, inicio)
+        inicio += len(lote)
+
+
+def gerar_ndjson(pacote: PacoteModelo, lotes: Iterator[pd.DataFrame]) -> Iterator[bytes]:
+    """Uma linha JSON por registro: índice, predição e probabilidades por classe"""
+    for resultado in _lotes_previstos(pacote, lotes):
+        linhas = []
+        probabilidades = resultado["probabilidades"]
+        validas = resultado["validas"].tolist()
+        for i, (indice, predicao) in enumerate(zip(resultado["indices"].tolist(), resultado["predicoes"].tolist())):
+            registro = {"indice": indice, "predicao": predicao if validas[i] else None}
+            if probabilidades is not None:
+                registro["probabilidades"] = (
+                    dict(zip(resultado["classes"], probabilidades[i].tolist())) if validas[i] else None
+                )
+            linhas.append(dumps(registro))
+        yield b"\n".join(linhas) + b"\n"
+
+
+def gerar_parquet(pacote: PacoteModelo, lotes: Iterator[pd.DataFrame]) -> Iterator[bytes]:
+    """
+    Grava as predições em um Parquet temporário (colunas indice, predicao e
+    prob_<classe>) e transmite o arquivo em blocos
+    """
+    with tempfile.TemporaryFile() as temporario:
+        escritor: Optional[pq.ParquetWriter] = None
+        for resultado in _lotes_previstos(pacote, lotes):
+            colunas = {
+                "indice": pa.array(resultado["indices"]),
+                "predicao": pa.array(resultado["predicoes"], mask=~resultado["validas"])
+            }
+            if resultado["probabilidades"] is not None:
+                for j, classe in enumerate(resultado["classes"]):
+                    colunas[f"prob_{classe}"] = pa.array(resultado["probabilidades"][:, j], from_pandas=True)
+            tabela = pa.table(colunas)
+            if escritor is None:
+                escritor = pq.ParquetWriter(temporario, tabela.schema)
+            escritor.write_table(tabela)
+        if escritor is not None:
+            escritor.close()
+
+        temporario.seek(0)
+        for bloco in iter(lambda: temporario.read(TAMANHO_BLOCO_SAIDA), b""):
+            yield bloco
+
+
+def validar_primeiro_lote(lotes: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+    """
+    Lê e valida o primeiro lote antes de começar a resposta, para que erros
+    de entrada virem HTTP 400 em vez de interromper o stream
+    """
+    primeiro = next(lotes, None)
+    if primeiro is None or primeiro.empty:
+        raise EntradaInvalida("Nenhum registro para prever")
+    _matriz(primeiro)
+
+    def _todos():
+        yield primeiro
+        yield from lotes
+
+    return _todos()
@@ -0,0 +1,234 @@
+"""
+Progresso de Tarefas
+Eventos de progresso das análises (etapa, percentual e, no fim, a referência
+ao resultado), publicados pelas tarefas nos processos do executor e
+entregues aos clientes conectados por server-sent events
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Set, Tuple
+
+import orjson
+
+try:
+    from redis import asyncio as redis_asyncio
+    REDIS_DISPONIVEL = True
+except ImportError:
+    REDIS_DISPONIVEL = False
+
+logger = logging.getLogger(__name__)
+
+# Canal dos eventos: local (no processo da aplicação) ou redis (compartilhado
+# entre vários workers do servidor, via REDIS_URL)
+PROGRESSO_CANAL = os.getenv("PROGRESSO_CANAL", "local")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Por quanto tempo o último evento de uma análise é entregue a quem se conecta depois
+PROGRESSO_RETENCAO_SEGUNDOS = float(os.getenv("PROGRESSO_RETENCAO_SEGUNDOS", "300"))
+
+# Eventos guardados por cliente; num cliente lento, os mais antigos são descartados
+PROGRESSO_MAX_PENDENTES = int(os.getenv("PROGRESSO_MAX_PENDENTES", "100"))
+
+# Etapas das tarefas, na ordem, e os estados que encerram o acompanhamento
+ETAPAS = ("carregar", "calcular", "visualizar", "relatorio")
+ETAPAS_FINAIS = ("concluida", "erro")
+
+
+def evento_progresso(analise_id: int, etapa: str, percentual: Optional[float], **extras: Any) -> Dict[str, Any]:
+    return {
+        "analise_id": analise_id,
+        "etapa": etapa,
+        "percentual": percentual,
+        "momento": time.time(),
+        **extras
+    }
+
+
+def _entregar(fila: asyncio.Queue, evento: Dict[str, Any]):
+    if fila.full():
+        fila.get_nowait()
+    fila.put_nowait(evento)
+
+
+class Assinatura:
+    """Eventos de uma análise recebidos por um cliente"""
+
+    def __init__(self, fila: asyncio.Queue):
+        self.fila = fila
+
+    async def proximo(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Próximo evento, ou None se nenhum chegar em `timeout` segundos"""
+        try:
+            return await asyncio.wait_for(self.fila.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class CanalProgressoLocal:
+    """
+    Publicação e assinatura no event loop do processo da aplicação. O
+    último evento de cada análise fica guardado por `retencao` segundos
+    e é o primeiro entregue a cada nova assinatura.
+    """
+
+    def __init__(self, retencao: float = PROGRESSO_RETENCAO_SEGUNDOS, max_pendentes: int = PROGRESSO_MAX_PENDENTES):
+        self.retencao = retencao
+        self.max_pendentes = max_pendentes
+        self._assinantes: Dict[int, Set[asyncio.Queue]] = {}
+        self._ultimos: Dict[int, Tuple[float, Dict[str, Any]]] = {}
+
+    async def publicar(self, evento: Dict[str, Any]):
+        agora = time.monotonic()
+        self._ultimos[evento["analise_id"]] = (agora, evento)
+        for analise_id, (momento, _) in list(self._ultimos.items()):
+            if agora - momento > self.retencao:
+                del self._ultimos[analise_id]
+        for fila in self._assinantes.get(evento["analise_id"], ()):
+            _entregar(fila, evento)
+
+    @asynccontextmanager
+    async def assinar(self, analise_id: int) -> AsyncIterator[Assinatura]:
+        fila: asyncio.Queue = asyncio.Queue(self.max_pendentes)
+        ultimo = self._ultimos.get(analise_id)
+        if ultimo is not None and time.monotonic() - ultimo[0] <= self.retencao:
+            fila.put_nowait(ultimo[1])
+        self._assinantes.setdefault(analise_id, set()).add(fila)
+        try:
+            yield Assinatura(fila)
+        finally:
+            assinantes = self._assinantes.get(analise_id)
+            assinantes.discard(fila)
+            if not assinantes:
+                del self._assinantes[analise_id]
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            "canal": "local",
+            "analises_acompanhadas": len(self._assinantes),
+            "assinaturas": sum(len(filas) for filas in self._assinantes.values())
+        }
+
+
+class CanalProgressoRedis:
+    """
+    Mesmo contrato do canal local sobre o pub/sub do Redis: o último evento
+    de cada análise fica em `progresso:<id>` (com expiração) e é publicado
+    no canal de mesmo nome, visível a todos os workers do servidor
+    """
+
+    def __init__(self, url: str = REDIS_URL, retencao: float = PROGRESSO_RETENCAO_SEGUNDOS, max_pendentes: int = PROGRESSO_MAX_PENDENTES):
+        self.retencao = retencao
+        self.max_pendentes = max_pendentes
+        self._redis = redis_asyncio.from_url(url)
+        self._assinaturas = 0
+
+    async def publicar(self, evento: Dict[str, Any]):
+        chave = f"progresso:{evento['analise_id']}"
+        dados = orjson.dumps(evento)
+        await self._redis.set(chave, dados, ex=max(int(self.retencao), 1))
+        await self._redis.publish(chave, dados)
+
+    @asynccontextmanager
+    async def assinar(self, analise_id: int) -> AsyncIterator[Assinatura]:
+        chave = f"progresso:{analise_id}"
+        fila: asyncio.Queue = asyncio.Queue(self.max_pendentes)
+        pubsub = self._redis.pubsub()
+        # Assina antes de ler o último evento: nada publicado entre os dois se perde
+        await pubsub.subscribe(chave)
+        ultimo = await self._redis.get(chave)
+        if ultimo is not None:
+            fila.put_nowait(orjson.loads(ultimo))
+
+        async def ouvir():
+            async for mensagem in pubsub.listen():
+                if mensagem["type"] == "message":
+                    _entregar(fila, orjson.loads(mensagem["data"]))
+
+        ouvinte = asyncio.create_task(ouvir())
+        self._assinaturas += 1
+        try:
+            yield Assinatura(fila)
+        finally:
+            self._assinaturas -= 1
+            ouvinte.cancel()
+            await pubsub.unsubscribe(chave)
+            await pubsub.close()
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {"canal": "redis", "assinaturas": self._assinaturas}
+
+
+def criar_canal(tipo: str = PROGRESSO_CANAL):
+    if tipo == "redis":
+        if REDIS_DISPONIVEL:
+            return CanalProgressoRedis()
+        logger.warning("PROGRESSO_CANAL=redis, mas o pacote redis não está instalado; usando o canal local")
+    return CanalProgressoLocal()
+
+
+# Canal do processo da aplicação
+canal_progresso = criar_canal()
+
+# Nos processos do executor: fila para o processo da aplicação (ver RetransmissorProgresso)
+_fila_processo = None
+
+# No processo da aplicação: event loop do canal, para publicações vindas de outras threads
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def inicializar_processo(fila):
+    """Inicializador dos processos do executor: eventos publicados neles seguem por `fila`"""
+    global _fila_processo
+    _fila_processo = fila
+
+
+def _agendar(evento: Dict[str, Any], loop: asyncio.AbstractEventLoop):
+    """Publica no event loop `loop` a partir de outra thread"""
+    def verificar(futuro):
+        if not futuro.cancelled() and futuro.exception() is not None:
+            logger.warning(f"Falha ao publicar progresso da análise {evento['analise_id']}: {futuro.exception()}")
+
+    asyncio.run_coroutine_threadsafe(canal_progresso.publicar(evento), loop).add_done_callback(verificar)
+
+
+def publicar_progresso(analise_id: int, etapa: str, percentual: Optional[float] = None, **extras: Any):
+    """
+    Publica um evento a partir de código síncrono: de um processo do
+    executor (pela fila) ou de uma thread do processo da aplicação. Fora
+    desses contextos (ex.: scripts) o evento é descartado.
+    """
+    evento = evento_progresso(analise_id, etapa, percentual, **extras)
+    if _fila_processo is not None:
+        _fila_processo.put(evento)
+    elif _loop is not None and not _loop.is_closed():
+        _agendar(evento, _loop)
+
+
+class RetransmissorProgresso:
+    """
+    Fila compartilhada com os processos do executor e thread que repassa os
+    eventos recebidos por ela ao canal, no event loop da aplicação
+    """
+
+    def __init__(self, contexto, loop: asyncio.AbstractEventLoop):
+        global _loop
+        _loop = loop
+        self.loop = loop
+        self.fila = contexto.Queue()
+        self._thread = threading.Thread(target=self._repassar, name="retransmissor-progresso", daemon=True)
+        self._thread.start()
+
+    def _repassar(self):
+        while True:
+            evento = self.fila.get()
+            if evento is None or self.loop.is_closed():
+                return
+            _agendar(evento, self.loop)
+
+    def encerrar(self):
+        self.fila.put(None)
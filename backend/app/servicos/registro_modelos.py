@@ -0,0 +1,189 @@
+"""
+Registro de Modelos Treinados
+Mantém em memória os modelos já desserializados para servir predições
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import joblib
+
+logger = logging.getLogger(__name__)
+
+# Memória máxima (estimada pelo tamanho dos arquivos) ocupada pelos modelos carregados
+REGISTRO_MODELOS_LIMITE_BYTES = int(os.getenv("REGISTRO_MODELOS_LIMITE_BYTES", str(1024 ** 3)))
+
+# Quantos dos modelos mais usados carregar na inicialização (0 = nenhum)
+REGISTRO_MODELOS_PRECARREGAR = int(os.getenv("REGISTRO_MODELOS_PRECARREGAR", "0"))
+
+ARQUIVO_USO = "uso_modelos.json"
+
+
+def salvar_artefato_atomico(objeto: Any, caminho: str, compressao: int = 0):
+    """
+    Serializa com joblib em um arquivo temporário no mesmo diretório e o
+    renomeia para `caminho`: leitores nunca veem um arquivo pela metade.
+    Sem compressão, o arquivo pode ser aberto com `mmap_mode`.
+    """
+    descritor, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho) or ".", suffix=".tmp")
+    os.close(descritor)
+    try:
+        joblib.dump(objeto, temporario, compress=compressao)
+        os.replace(temporario, caminho)
+    except Exception:
+        os.remove(temporario)
+        raise
+
+
+class ModeloIndisponivel(FileNotFoundError):
+    """Arquivo do modelo não encontrado no disco"""
+
+
+class PacoteModelo:
+    """Modelo, scaler e ordem das variáveis prontos para predição"""
+
+    def __init__(self, modelo_id: int, modelo, scaler, variaveis: List[str], versao: Tuple, tamanho_bytes: int):
+        self.modelo_id = modelo_id
+        self.modelo = modelo
+        self.scaler = scaler
+        self.variaveis = list(variaveis)
+        self.versao = versao
+        self.tamanho_bytes = tamanho_bytes
+
+
+class RegistroModelos:
+    """
+    Cache LRU de modelos desserializados, limitado em bytes.
+
+    Uma entrada é recarregada quando o mtime do arquivo do modelo ou do scaler
+    muda. O número de acessos por modelo é persistido em `uso_modelos.json`
+    para permitir pré-carregar os mais usados na próxima inicialização.
+    """
+
+    def __init__(self, diretorio: str, limite_bytes: int = REGISTRO_MODELOS_LIMITE_BYTES):
+        self.diretorio = diretorio
+        self.limite_bytes = limite_bytes
+        self.acertos = 0
+        self.falhas = 0
+        self._pacotes: "OrderedDict[int, PacoteModelo]" = OrderedDict()
+        self._uso: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def caminhos(self, modelo_id: int) -> Tuple[str, str]:
+        return (
+            os.path.join(self.diretorio, f"modelo_{modelo_id}.joblib"),
+            os.path.join(self.diretorio, f"scaler_{modelo_id}.joblib")
+        )
+
+    def _versao(self, modelo_id: int) -> Tuple[Tuple[int, int], Optional[Tuple[int, int]]]:
+        caminho_modelo, caminho_scaler = self.caminhos(modelo_id)
+        try:
+            info = os.stat(caminho_modelo)
+        except FileNotFoundError:
+            raise ModeloIndisponivel(caminho_modelo)
+        try:
+            info_scaler = os.stat(caminho_scaler)
+            versao_scaler = (info_scaler.st_mtime_ns, info_scaler.st_size)
+        except FileNotFoundError:
+            versao_scaler = None
+        return (info.st_mtime_ns, info.st_size), versao_scaler
+
+    def obter(self, modelo_id: int, variaveis: List[str], mmap: bool = False) -> PacoteModelo:
+        """
+        Pacote do modelo, carregando do disco apenas se ausente ou desatualizado.
+        Com `mmap`, os arrays do modelo são mapeados do arquivo em vez de copiados.
+        """
+        versao = self._versao(modelo_id)
+        with self._lock:
+            self._uso[modelo_id] += 1
+            pacote = self._pacotes.get(modelo_id)
+            if pacote is not None and pacote.versao == versao and pacote.variaveis == list(variaveis):
+                self._pacotes.move_to_end(modelo_id)
+                self.acertos += 1
+                return pacote
+            self.falhas += 1
+
+        pacote = self._carregar(modelo_id, variaveis, versao, mmap)
+        with self._lock:
+            self._pacotes[modelo_id] = pacote
+            self._pacotes.move_to_end(modelo_id)
+            self._aplicar_limite()
+        return pacote
+
+    def _carregar(self, modelo_id: int, variaveis: List[str], versao, mmap: bool = False) -> PacoteModelo:
+        caminho_modelo, caminho_scaler = self.caminhos(modelo_id)
+        modelo = joblib.load(caminho_modelo, mmap_mode="r" if mmap else None)
+        scaler = joblib.load(caminho_scaler) if versao[1] is not None else None
+
+        # O scaler foi ajustado com um DataFrame, mas as predições usam arrays
+        # já ordenados por `variaveis`; sem os nomes o sklearn não emite avisos
+        if scaler is not None and hasattr(scaler, "feature_names_in_"):
+            del scaler.feature_names_in_
+
+        # Arrays de modelos mapeados ficam no cache de páginas do sistema, não no heap
+        tamanho = versao[1][1] if versao[1] is not None else 0
+        if not mmap:
+            tamanho += versao[0][1]
+        return PacoteModelo(modelo_id, modelo, scaler, variaveis, versao, tamanho)
+
+    def _aplicar_limite(self):
+        """Remove os menos usados recentemente até caber no limite (mantém sempre o último)"""
+        total = sum(p.tamanho_bytes for p in self._pacotes.values())
+        while total > self.limite_bytes and len(self._pacotes) > 1:
+            _, removido = self._pacotes.popitem(last=False)
+            total -= removido.tamanho_bytes
+
+    def invalidar(self, modelo_id: int):
+        with self._lock:
+            self._pacotes.pop(modelo_id, None)
+
+    # Uso e pré-carregamento
+
+    def mais_usados(self, quantidade: int) -> List[int]:
+        """Modelos mais acessados, somando o histórico salvo em disco"""
+        uso = self._ler_uso()
+        uso.update(self._uso)
+        return [modelo_id for modelo_id, _ in uso.most_common(quantidade)]
+
+    def precarregar(self, modelos: Iterable[Tuple[int, List[str], bool]]):
+        """Carrega (modelo_id, variaveis, mmap) ignorando modelos cujos arquivos não existem mais"""
+        for modelo_id, variaveis, mmap in modelos:
+            try:
+                self.obter(modelo_id, variaveis, mmap)
+                self._uso[modelo_id] -= 1
+            except Exception as e:
+                logger.warning(f"Não foi possível pré-carregar o modelo {modelo_id}: {e}")
+
+    def salvar_uso(self):
+        """Acumula os acessos desta execução no arquivo de uso"""
+        with self._lock:
+            uso = self._ler_uso()
+            uso.update(+self._uso)
+            self._uso.clear()
+        caminho = os.path.join(self.diretorio, ARQUIVO_USO)
+        temporario = f"{caminho}.tmp-{os.getpid()}"
+        with open(temporario, "w", encoding="utf-8") as arquivo:
+            json.dump({str(k): v for k, v in uso.items()}, arquivo)
+        os.replace(temporario, caminho)
+
+    def _ler_uso(self) -> Counter:
+        try:
+            with open(os.path.join(self.diretorio, ARQUIVO_USO), encoding="utf-8") as arquivo:
+                return Counter({int(k): v for k, v in json.load(arquivo).items()})
+        except (FileNotFoundError, ValueError):
+            return Counter()
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "modelos_carregados": list(self._pacotes),
+                "bytes": sum(p.tamanho_bytes for p in self._pacotes.values()),
+                "limite_bytes": self.limite_bytes,
+                "acertos": self.acertos,
+                "falhas": self.falhas
+            }
@@ -0,0 +1,260 @@
+"""
+Tabelas de Indicadores do IBGE
+Achata os agregados (resultados -> series -> localidade -> serie) uma única vez
+em tabelas indexadas por (municipio_id, ano)
+"""
+
+import asyncio
+import base64
+import csv
+import io
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.servicos.cliente_ibge import ClienteIBGE, ErroFonteDados, cliente_ibge
+
+logger = logging.getLogger(__name__)
+
+# Intervalo entre atualizações das tabelas em segundo plano (0 = desativado)
+IBGE_ATUALIZACAO_SEGUNDOS = float(os.getenv("IBGE_ATUALIZACAO_SEGUNDOS", "600"))
+
+# Registros materializados por vez ao transmitir uma série completa
+LINHAS_POR_BLOCO_STREAM = 1000
+
+
+class CursorInvalido(ValueError):
+    """Cursor de paginação malformado"""
+
+
+def codificar_cursor(chave: int) -> str:
+    return base64.urlsafe_b64encode(str(chave).encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> int:
+    try:
+        return int(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise CursorInvalido("Cursor de paginação inválido")
+
+
+def normalizar_agregado(payload: List[Dict[str, Any]]) -> pd.DataFrame:
+    """
+    Converte a resposta de /api/v3/agregados em um DataFrame com índice
+    (municipio_id, ano) e colunas municipio_nome e valor. Valores sem dado
+    ("...", "-", "X") viram NaN. Cada URL consulta uma única variável.
+    """
+    ids, nomes, anos, valores = [], [], [], []
+    for item in payload:
+        for resultado in item.get("resultados", []):
+            for serie in resultado.get("series", []):
+                localidade = serie.get("localidade", {})
+                pontos = serie.get("serie", {})
+                ids.extend([localidade.get("id")] * len(pontos))
+                nomes.extend([localidade.get("nome")] * len(pontos))
+                anos.extend(pontos.keys())
+                valores.extend(pontos.values())
+
+    dados = pd.DataFrame({
+        "municipio_id": pd.to_numeric(pd.Series(ids, dtype=object)).astype(np.int64),
+        "ano": pd.to_numeric(pd.Series(anos, dtype=object)).astype(np.int64),
+        "municipio_nome": pd.Series(nomes, dtype="category"),
+        "valor": pd.to_numeric(pd.Series(valores, dtype=object), errors="coerce")
+    })
+    return dados.set_index(["municipio_id", "ano"]).sort_index()
+
+
+def valor_json(valor: float) -> Optional[Any]:
+    """NaN vira None e valores inteiros voltam a ser int"""
+    if valor != valor:
+        return None
+    return int(valor) if float(valor).is_integer() else float(valor)
+
+
+class TabelaIndicador:
+    """
+    Série de um indicador por município e ano, com as linhas de cada
+    município localizadas por dicionário e os totais estaduais pré-calculados
+    """
+
+    def __init__(self, dados: pd.DataFrame):
+        self.dados = dados
+        self.atualizada_em = datetime.now()
+
+        # Linhas ordenadas por município: cada um ocupa um intervalo contíguo
+        codigos = dados.index.get_level_values("municipio_id").to_numpy()
+        inicios = np.flatnonzero(np.r_[True, codigos[1:] != codigos[:-1]]) if len(codigos) else np.array([], dtype=int)
+        fins = np.r_[inicios[1:], len(codigos)]
+        self._posicoes: Dict[int, Tuple[int, int]] = dict(
+            zip(codigos[inicios].tolist(), zip(inicios.tolist(), fins.tolist()))
+        )
+        self.nomes: Dict[int, str] = dict(zip(
+            codigos[inicios].tolist(),
+            dados["municipio_nome"].to_numpy()[inicios].tolist()
+        ))
+        self._anos = dados.index.get_level_values("ano").to_numpy()
+        self._valores = dados["valor"].to_numpy()
+        self._codigos = codigos
+        # Chave ordenável (municipio_id, ano) usada pelos cursores de paginação
+        self._chaves = codigos * 10000 + self._anos
+        self.totais_por_ano: pd.Series = dados["valor"].groupby(level="ano").sum(min_count=1)
+        self.anos: List[int] = self.totais_por_ano.index.tolist()
+
+    @classmethod
+    def de_payload(cls, payload: List[Dict[str, Any]]) -> "TabelaIndicador":
+        return cls(normalizar_agregado(payload))
+
+    @property
+    def municipios(self) -> List[int]:
+        return list(self._posicoes)
+
+    def linhas_municipio(self, municipio_id: int) -> pd.DataFrame:
+        inicio, fim = self._posicoes.get(municipio_id, (0, 0))
+        return self.dados.iloc[inicio:fim]
+
+    def serie_municipio(self, municipio_id: int) -> Dict[str, Any]:
+        """{ano: valor} do município; vazio se o município não existir"""
+        inicio, fim = self._posicoes.get(municipio_id, (0, 0))
+        return {
+            str(ano): valor_json(valor)
+            for ano, valor in zip(self._anos[inicio:fim].tolist(), self._valores[inicio:fim].tolist())
+        }
+
+    def selecionar(self, municipio_id: Optional[int] = None, ano: Optional[int] = None) -> np.ndarray:
+        """
+        Posições (em ordem de municipio_id, ano) das linhas com valor que
+        atendem aos filtros. O filtro por município restringe a busca ao
+        intervalo do município antes de qualquer comparação.
+        """
+        inicio, fim = (0, len(self._valores)) if municipio_id is None else self._posicoes.get(municipio_id, (0, 0))
+        mascara = ~np.isnan(self._valores[inicio:fim])
+        if ano is not None:
+            mascara &= self._anos[inicio:fim] == ano
+        return inicio + np.flatnonzero(mascara)
+
+    def apos_cursor(self, posicoes: np.ndarray, cursor: Optional[str]) -> np.ndarray:
+        """Posições cuja chave é posterior à do cursor"""
+        if not cursor:
+            return posicoes
+        chave = decodificar_cursor(cursor)
+        return posicoes[np.searchsorted(self._chaves[posicoes], chave, side="right"):]
+
+    def cursor_de(self, posicao: int) -> str:
+        return codificar_cursor(int(self._chaves[posicao]))
+
+    def registros(self, posicoes: np.ndarray, campo_valor: str) -> List[Dict[str, Any]]:
+        """Materializa apenas as linhas pedidas"""
+        codigos = self._codigos[posicoes].tolist()
+        anos = self._anos[posicoes].tolist()
+        valores = self._valores[posicoes].tolist()
+        return [
+            {
+                "municipio_id": str(codigo),
+                "municipio_nome": self.nomes.get(codigo),
+                "ano": str(ano),
+                campo_valor: valor_json(valor)
+            }
+            for codigo, ano, valor in zip(codigos, anos, valores)
+        ]
+
+    def gerar_ndjson(self, posicoes: np.ndarray, campo_valor: str) -> Iterator[bytes]:
+        for inicio in range(0, len(posicoes), LINHAS_POR_BLOCO_STREAM):
+            bloco = self.registros(posicoes[inicio:inicio + LINHAS_POR_BLOCO_STREAM], campo_valor)
+            yield "".join(json.dumps(registro, ensure_ascii=False) + "\n" for registro in bloco).encode("utf-8")
+
+    def gerar_csv(self, posicoes: np.ndarray, campo_valor: str) -> Iterator[bytes]:
+        campos = ["municipio_id", "municipio_nome", "ano", campo_valor]
+        for inicio in range(0, max(len(posicoes), 1), LINHAS_POR_BLOCO_STREAM):
+            saida = io.StringIO()
+            escritor = csv.DictWriter(saida, fieldnames=campos)
+            if inicio == 0:
+                escritor.writeheader()
+            escritor.writerows(self.registros(posicoes[inicio:inicio + LINHAS_POR_BLOCO_STREAM], campo_valor))
+            yield saida.getvalue().encode("utf-8")
+
+    def total(self, ano: int) -> Optional[Any]:
+        if ano not in self.totais_por_ano.index:
+            return None
+        return valor_json(self.totais_por_ano.loc[ano])
+
+
+class TabelasIBGE:
+    """
+    Tabelas normalizadas por URL. Uma tabela é reconstruída apenas quando o
+    cliente devolve um payload novo; a atualização periódica em segundo
+    plano mantém as tabelas prontas antes que alguma requisição precise delas.
+    """
+
+    def __init__(self, cliente: ClienteIBGE = cliente_ibge, intervalo: float = IBGE_ATUALIZACAO_SEGUNDOS):
+        self.cliente = cliente
+        self.intervalo = intervalo
+        self.reconstrucoes = 0
+        self._tabelas: Dict[str, Tuple[Any, TabelaIndicador]] = {}
+        self._travas: Dict[str, asyncio.Lock] = {}
+        self._atualizacao: Optional[asyncio.Task] = None
+
+    async def obter(self, url: str) -> TabelaIndicador:
+        payload = await self.cliente.obter_json(url)
+        atual = self._tabelas.get(url)
+        if atual is not None and atual[0] is payload:
+            return atual[1]
+
+        async with self._travas.setdefault(url, asyncio.Lock()):
+            atual = self._tabelas.get(url)
+            if atual is not None and atual[0] is payload:
+                return atual[1]
+            tabela = await asyncio.to_thread(TabelaIndicador.de_payload, payload)
+            # Guardar o payload mantém a comparação por identidade válida
+            self._tabelas[url] = (payload, tabela)
+            self.reconstrucoes += 1
+            return tabela
+
+    def iniciar_atualizacao(self, urls: Iterable[str]):
+        if self.intervalo > 0 and self._atualizacao is None:
+            self._atualizacao = asyncio.get_running_loop().create_task(
+                self._atualizar_periodicamente(list(urls))
+            )
+
+    async def parar_atualizacao(self):
+        if self._atualizacao is not None:
+            self._atualizacao.cancel()
+            try:
+                await self._atualizacao
+            except asyncio.CancelledError:
+                pass
+            self._atualizacao = None
+
+    async def _atualizar_periodicamente(self, urls: List[str]):
+        while True:
+            for url in urls:
+                try:
+                    await self.obter(url)
+                except ErroFonteDados as e:
+                    logger.warning(f"Atualização da tabela {url} falhou: {e}")
+                except Exception:
+                    logger.exception(f"Erro ao normalizar {url}")
+            await asyncio.sleep(self.intervalo)
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            "tabelas": {
+                url: {
+                    "linhas": len(tabela.dados),
+                    "municipios": len(tabela.municipios),
+                    "anos": tabela.anos,
+                    "atualizada_em": tabela.atualizada_em.isoformat()
+                }
+                for url, (_, tabela) in self._tabelas.items()
+            },
+            "reconstrucoes": self.reconstrucoes,
+            "atualizacao_segundos": self.intervalo
+        }
+
+
+# Instância compartilhada pela aplicação
+tabelas_ibge = TabelasIBGE()
@@ -0,0 +1,235 @@
+"""
+Tipos de Colunas
+Escolha do menor dtype que representa cada coluna sem perda: inteiros e
+reais reduzidos, textos repetitivos como categoria e os demais textos em
+strings Arrow; a decisão pode ser acumulada bloco a bloco durante a ingestão
+"""
+
+import math
+import os
+from typing import Any, Dict, Optional, Set
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Textos com no máximo esta fração de valores distintos viram `category`
+FRACAO_CATEGORIA = float(os.getenv("FRACAO_CATEGORIA", "0.5"))
+
+# Acima deste número de valores distintos um texto não vira categoria
+# (e a ingestão deixa de guardá-los)
+MAX_CATEGORIAS = int(os.getenv("MAX_CATEGORIAS", "65536"))
+
+# Textos de alta cardinalidade em dtype object passam a strings Arrow
+TEXTO_ARROW = os.getenv("TEXTO_ARROW", "true").lower() == "true"
+
+TIPO_TEXTO_ARROW = "string[pyarrow]"
+
+TIPOS_INTEIROS = (np.int8, np.int16, np.int32, np.int64)
+
+
+def _menor_inteiro(minimo: float, maximo: float) -> str:
+    for tipo in TIPOS_INTEIROS:
+        limites = np.iinfo(tipo)
+        if limites.min <= minimo and maximo <= limites.max:
+            return np.dtype(tipo).name
+    return "int64"
+
+
+def _float32_exato(valores: np.ndarray) -> bool:
+    """Todos os valores voltam idênticos depois de passar por float32"""
+    with np.errstate(over="ignore", invalid="ignore"):
+        return bool(np.array_equal(valores.astype(np.float32).astype(np.float64), valores, equal_nan=True))
+
+
+def _cabe_no_tipo(serie: pd.Series, tipo: str) -> bool:
+    """
+    Os valores de uma coluna numérica passam para o dtype numérico `tipo`
+    sem estouro nem arredondamento (o astype do numpy faria os dois em
+    silêncio). Textos e dtypes não numéricos ficam a cargo do astype.
+    """
+    if not pd.api.types.is_numeric_dtype(serie.dtype) or pd.api.types.is_bool_dtype(serie.dtype):
+        return True
+    try:
+        destino = np.dtype(tipo)
+    except TypeError:
+        return True
+    if destino.kind in "iu":
+        valores = serie.dropna()
+        if valores.empty:
+            return True
+        if pd.api.types.is_float_dtype(valores.dtype) and not np.array_equal(valores, np.trunc(valores)):
+            return False
+        limites = np.iinfo(destino)
+        return limites.min <= valores.min() and valores.max() <= limites.max
+    if destino == np.float32:
+        return _float32_exato(serie.to_numpy(dtype=np.float64, na_value=np.nan))
+    return True
+
+
+class _PerfilColuna:
+    """O que os blocos já vistos dizem sobre uma coluna"""
+
+    def __init__(self, dtype: str):
+        self.dtype = dtype
+        self.numerica = True
+        self.inteira = True
+        self.texto = True
+        self.outros = False
+        self.minimo = math.inf
+        self.maximo = -math.inf
+        self.float32_exato = True
+        self.distintos: Optional[Set[str]] = set()
+        self.bytes_texto = 0
+        self.nulos = 0
+        self.validos = 0
+        self.bytes_antes = 0
+
+    def atualizar(self, serie: pd.Series):
+        self.bytes_antes += int(serie.memory_usage(index=False, deep=True))
+        nulos = int(serie.isna().sum())
+        self.nulos += nulos
+        self.validos += len(serie) - nulos
+        if nulos == len(serie):
+            # Bloco sem valores (lido como float pelo pandas): não diz nada sobre o tipo
+            return
+
+        dtype = serie.dtype
+        if pd.api.types.is_bool_dtype(dtype) or not (
+            pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_string_dtype(dtype)
+        ) or isinstance(dtype, pd.CategoricalDtype):
+            self.outros = True
+            return
+
+        if pd.api.types.is_numeric_dtype(dtype):
+            self.texto = False
+            self.inteira &= pd.api.types.is_integer_dtype(dtype)
+            valores = serie.to_numpy(dtype=np.float64, na_value=np.nan)
+            self.minimo = min(self.minimo, float(np.nanmin(valores)))
+            self.maximo = max(self.maximo, float(np.nanmax(valores)))
+            if self.float32_exato:
+                self.float32_exato = _float32_exato(valores)
+            return
+
+        self.numerica = False
+        validos = serie.dropna()
+        if pd.api.types.infer_dtype(validos, skipna=False) != "string":
+            self.texto = False
+            return
+        textos = pa.array(validos, type=pa.string())
+        self.bytes_texto += int(pc.sum(pc.binary_length(textos)).as_py() or 0)
+        if self.distintos is not None:
+            self.distintos.update(pc.unique(textos).to_pylist())
+            if len(self.distintos) > MAX_CATEGORIAS:
+                self.distintos = None
+
+    def tipo(self, linhas: int, fracao_categoria: float) -> str:
+        if self.outros or not self.validos:
+            return self.dtype
+        if not self.numerica and not self.texto:
+            # Números e textos misturados entre blocos
+            return "object"
+        if self.numerica:
+            if self.inteira and not self.nulos:
+                return _menor_inteiro(self.minimo, self.maximo)
+            return "float32" if self.float32_exato else "float64"
+        if (
+            self.distintos is not None and linhas and len(self.distintos) <= fracao_categoria * linhas
+            and self.bytes_depois("category", linhas) < self.bytes_antes
+        ):
+            return "category"
+        if TEXTO_ARROW and self.dtype == "object":
+            return TIPO_TEXTO_ARROW
+        return self.dtype
+
+    def bytes_depois(self, tipo: str, linhas: int) -> int:
+        """Memória da coluna no tipo escolhido, calculada sem convertê-la"""
+        if tipo in (self.dtype, "object"):
+            return self.bytes_antes
+        if tipo == "category":
+            # Códigos com o menor inteiro que indexa as categorias, como faz o pandas
+            codigos = np.dtype(_menor_inteiro(-1, len(self.distintos)))
+            categorias = pd.Index(sorted(self.distintos), dtype=object).memory_usage(deep=True)
+            return linhas * codigos.itemsize + int(categorias)
+        if tipo == TIPO_TEXTO_ARROW:
+            # Dados UTF-8, deslocamentos de 32 bits e bitmap de nulos
+            return self.bytes_texto + 4 * (linhas + 1) + (math.ceil(linhas / 8) if self.nulos else 0)
+        return linhas * np.dtype(tipo).itemsize
+
+
+class AcumuladorTipos:
+    """
+    Acumula, bloco a bloco, mínimos e máximos, exatidão em float32 e
+    valores distintos dos textos, para escolher no final o menor dtype de
+    cada coluna e estimar a memória antes e depois da conversão
+    """
+
+    def __init__(self, fracao_categoria: float = FRACAO_CATEGORIA):
+        self.fracao_categoria = fracao_categoria
+        self.linhas = 0
+        self.perfis: Dict[str, _PerfilColuna] = {}
+
+    def atualizar(self, bloco: pd.DataFrame):
+        self.linhas += len(bloco)
+        for coluna in bloco.columns:
+            perfil = self.perfis.get(coluna)
+            if perfil is None:
+                perfil = self.perfis[coluna] = _PerfilColuna(str(bloco[coluna].dtype))
+            perfil.atualizar(bloco[coluna])
+
+    def tipos(self) -> Dict[str, str]:
+        """Dtype otimizado de cada coluna, na ordem em que apareceram"""
+        return {coluna: perfil.tipo(self.linhas, self.fracao_categoria) for coluna, perfil in self.perfis.items()}
+
+    def relatorio(self) -> Dict[str, Any]:
+        """Bytes em memória com os dtypes padrão do pandas e com os otimizados"""
+        antes = depois = 0
+        convertidas = {}
+        for coluna, tipo in self.tipos().items():
+            perfil = self.perfis[coluna]
+            antes += perfil.bytes_antes
+            depois += perfil.bytes_depois(tipo, self.linhas)
+            if tipo != perfil.dtype:
+                convertidas[coluna] = {"from": perfil.dtype, "to": tipo}
+        return {
+            "bytes_before": antes,
+            "bytes_after": depois,
+            "reduction": 1 - depois / antes if antes else 0.0,
+            "converted_columns": convertidas
+        }
+
+
+def inferir_tipos(df: pd.DataFrame, fracao_categoria: float = FRACAO_CATEGORIA) -> Dict[str, str]:
+    """
+    Dtype otimizado de cada coluna, na ordem do DataFrame. Inteiros e
+    reais só são reduzidos quando os valores cabem no tipo menor.
+    """
+    acumulador = AcumuladorTipos(fracao_categoria)
+    acumulador.atualizar(df)
+    return acumulador.tipos()
+
+
+def aplicar_tipos(df: pd.DataFrame, tipos: Optional[Dict[str, str]]) -> pd.DataFrame:
+    """
+    Converte as colunas de `df` presentes em `tipos`. Uma coluna cujo
+    conteúdo não cabe mais no tipo registrado (inteiros fora dos limites ou
+    com parte fracionária, reais que float32 arredondaria) é mantida como está.
+    """
+    if not tipos:
+        return df
+    convertidas = {}
+    for coluna in df.columns:
+        tipo = tipos.get(coluna)
+        if tipo is None or str(df[coluna].dtype) == tipo or not _cabe_no_tipo(df[coluna], tipo):
+            continue
+        try:
+            convertidas[coluna] = df[coluna].astype(tipo)
+        except (TypeError, ValueError, OverflowError):
+            continue
+    if not convertidas:
+        return df
+    df = df.copy(deep=False)
+    for coluna, serie in convertidas.items():
+        df[coluna] = serie
+    return df
@@ -0,0 +1,125 @@
+"""
+Serialização de Respostas
+JSON via orjson, com DataFrames e arrays NumPy codificados diretamente, e
+respostas tabulares em Arrow IPC ou Parquet negociadas pelo cliente
+"""
+
+import io
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import orjson
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
+# NumPy nativo e chaves não textuais (ex.: quartis {0.25: ...}); NaN e infinito viram null
+OPCOES_ORJSON = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+TIPO_JSON = "application/json"
+TIPO_ARROW = "application/vnd.apache.arrow.stream"
+TIPO_PARQUET = "application/vnd.apache.parquet"
+
+FORMATOS_TABELA = {"json": TIPO_JSON, "arrow": TIPO_ARROW, "parquet": TIPO_PARQUET}
+
+
+def _lista(serie: pd.Series) -> List[Any]:
+    if pd.api.types.is_datetime64_any_dtype(serie.dtype):
+        # datetime nativo é codificado pelo orjson sem passar por `_padrao`
+        valores = np.array(serie.dt.to_pydatetime(), dtype=object)
+        valores[serie.isna().to_numpy()] = None
+        return valores.tolist()
+    return serie.tolist()
+
+
+def registros(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Equivalente a `df.to_dict('records')` com uma única conversão por coluna"""
+    nomes = df.columns.tolist()
+    colunas = [_lista(df.iloc[:, i]) for i in range(len(nomes))]
+    return [dict(zip(nomes, linha)) for linha in zip(*colunas)]
+
+
+def _padrao(obj: Any) -> Any:
+    """Tipos que o orjson não codifica sozinho"""
+    if obj is pd.NaT or obj is pd.NA:
+        return None
+    if isinstance(obj, pd.DataFrame):
+        return registros(obj)
+    if isinstance(obj, (pd.Series, pd.Index, np.ndarray)):
+        # Arrays não contíguos ou de dtype object chegam aqui
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, timedelta):
+        return obj.total_seconds()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Tipo {type(obj).__name__} não é serializável em JSON")
+
+
+def dumps(conteudo: Any) -> bytes:
+    return orjson.dumps(conteudo, default=_padrao, option=OPCOES_ORJSON)
+
+
+class RespostaORJSON(JSONResponse):
+    """
+    Resposta JSON codificada com orjson. Usada como classe padrão da
+    aplicação; endpoints com resultados grandes devolvem uma instância
+    diretamente para não passar pelo `jsonable_encoder`.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def negociar_formato(request: Request, formato: Optional[str] = None) -> str:
+    """
+    Formato de uma resposta tabular: o parâmetro `formato`, se informado,
+    senão o cabeçalho Accept (Arrow IPC ou Parquet); JSON por padrão
+    """
+    if formato:
+        if formato not in FORMATOS_TABELA:
+            raise ValueError(f"Formato deve ser um de: {', '.join(FORMATOS_TABELA)}")
+        return formato
+    aceitos = request.headers.get("accept", "")
+    for nome in ("arrow", "parquet"):
+        if FORMATOS_TABELA[nome] in aceitos:
+            return nome
+    return "json"
+
+
+def tabela_arrow(df: pd.DataFrame) -> pa.Table:
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def resposta_tabela(
+    df: pd.DataFrame,
+    formato: str,
+    envelope: Optional[Dict[str, Any]] = None,
+    nome_arquivo: str = "dados"
+) -> Response:
+    """
+    Em JSON devolve `envelope` (que normalmente contém o próprio `df`) sem
+    passar pelo `jsonable_encoder`; em Arrow ou Parquet devolve só a tabela,
+    com os tipos preservados
+    """
+    if formato == "arrow":
+        tabela = tabela_arrow(df)
+        saida = pa.BufferOutputStream()
+        with pa.ipc.new_stream(saida, tabela.schema) as escritor:
+            escritor.write_table(tabela)
+        return Response(saida.getvalue().to_pybytes(), media_type=TIPO_ARROW)
+    if formato == "parquet":
+        saida = io.BytesIO()
+        pq.write_table(tabela_arrow(df), saida, compression="zstd")
+        return Response(
+            saida.getvalue(),
+            media_type=TIPO_PARQUET,
+            headers={"Content-Disposition": f'attachment; filename="{nome_arquivo}.parquet"'}
+        )
+    return RespostaORJSON(envelope if envelope is not None else df)
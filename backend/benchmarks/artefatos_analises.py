@@ -0,0 +1,121 @@
+"""
+Benchmark do armazenamento de artefatos
+
+Cria um SQLite com análises de correlação concluídas cujos documentos
+(matriz, gráficos e relatório) ficam nas colunas JSON, como antes. Mede o
+tamanho do banco e o tempo de carregar as análises de um projeto pelo ORM;
+depois move os documentos para o armazenamento de artefatos com
+`externalizar_documentos_grandes`, roda VACUUM e mede de novo, junto com a
+leitura de um artefato inteiro.
+
+Uso (a partir de backend/):
+    python -m benchmarks.artefatos_analises [analises] [variaveis]
+"""
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+def tamanho_diretorio(diretorio: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(raiz, nome))
+        for raiz, _, nomes in os.walk(diretorio)
+        for nome in nomes
+    )
+
+
+def main():
+    analises = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    variaveis = int(sys.argv[2]) if len(sys.argv) > 2 else 400
+
+    # A engine e o armazenamento leem as variáveis de ambiente na importação
+    diretorio = tempfile.mkdtemp(prefix="bench_artefatos_")
+    caminho = os.path.join(diretorio, "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{caminho}"
+    os.environ["ARTEFATOS_DIR"] = os.path.join(diretorio, "artefatos")
+    try:
+        from sqlalchemy import select
+
+        from app.database.conexao import Base, SessionLocal, engine, externalizar_documentos_grandes
+        from app.modelos import usuario, projeto, dataset  # noqa: F401 (registra as tabelas)
+        from app.modelos.analise import Analise, StatusAnalise, TipoAnalise
+        from app.servicos.armazenamento_artefatos import armazenamento_artefatos
+
+        Base.metadata.create_all(engine)
+        gerador = np.random.default_rng(0)
+        nomes = [f"v{i}" for i in range(variaveis)]
+        db = SessionLocal()
+        db.add(usuario.Usuario(id=1, nome="bench", email="bench@local", senha_hash="x"))
+        db.add(projeto.Projeto(id=1, nome="bench", usuario_id=1))
+        db.add(dataset.Dataset(id=1, nome="bench", arquivo_original="b.csv", caminho_arquivo="b.csv", tipo_arquivo="csv", projeto_id=1))
+        for i in range(analises):
+            matriz = np.corrcoef(gerador.random((variaveis, 50))).round(6)
+            db.add(Analise(
+                nome=f"Correlação {i}",
+                tipo=TipoAnalise.CORRELACAO,
+                status=StatusAnalise.CONCLUIDA,
+                resultados={
+                    "matriz_correlacao": {a: dict(zip(nomes, linha)) for a, linha in zip(nomes, matriz.tolist())},
+                    "correlacoes_fortes": [],
+                    "metodo": "pearson",
+                    "num_variaveis": variaveis
+                },
+                graficos={"heatmap": {"z": matriz.tolist(), "x": nomes, "y": nomes}},
+                relatorio="# Relatório\n" + "Linha do relatório. " * 2000,
+                projeto_id=1,
+                dataset_id=1
+            ))
+        db.commit()
+        db.close()
+
+        def carregar_projeto() -> float:
+            inicio = time.perf_counter()
+            db = SessionLocal()
+            db.execute(select(Analise).where(Analise.projeto_id == 1)).scalars().all()
+            db.close()
+            return (time.perf_counter() - inicio) * 1000
+
+        def vacuum():
+            engine.dispose()
+            conexao = sqlite3.connect(caminho)
+            conexao.execute("VACUUM")
+            conexao.close()
+
+        vacuum()
+        antes_banco = os.path.getsize(caminho)
+        antes_consulta = min(carregar_projeto() for _ in range(3))
+
+        inicio = time.perf_counter()
+        externalizar_documentos_grandes()
+        migracao = time.perf_counter() - inicio
+        vacuum()
+
+        depois_banco = os.path.getsize(caminho)
+        depois_consulta = min(carregar_projeto() for _ in range(3))
+        db = SessionLocal()
+        referencia = db.execute(select(Analise.artefato).limit(1)).scalar()
+        db.close()
+        inicio = time.perf_counter()
+        armazenamento_artefatos.ler_documento(referencia)
+        leitura = (time.perf_counter() - inicio) * 1000
+
+        print(f"{analises} análises de correlação com {variaveis} variáveis")
+        print(f"  banco                      antes {antes_banco / 2**20:8.1f} MiB   depois {depois_banco / 2**20:8.1f} MiB")
+        print(f"  análises de um projeto     antes {antes_consulta:8.1f} ms    depois {depois_consulta:8.1f} ms")
+        print(
+            f"  artefatos ({referencia['compressao']}): {tamanho_diretorio(os.environ['ARTEFATOS_DIR']) / 2**20:.1f} MiB, "
+            f"{referencia['bytes'] / 2**20:.1f} MiB por documento, leitura de um em {leitura:.0f} ms; "
+            f"migração em {migracao:.1f} s"
+        )
+    finally:
+        shutil.rmtree(diretorio)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Benchmark de carga: sessão síncrona x assíncrona nas rotas
+
+Dispara requisições simultâneas a POST /api/automl/treinar enquanto outro
+processo segura o lock de escrita de um SQLite por alguns segundos (como uma
+tarefa gravando resultados grandes), e mede em paralelo a latência de uma
+rota que não usa o banco. Compara a rota atual (AsyncSession via
+`obter_db_async`) com a mesma rota escrita como antes, com a Session
+síncrona de `obter_db` dentro de `async def`: nessa versão a espera pelo
+lock trava o event loop e todas as outras requisições do worker. Com mais
+requisições que conexões no pool (15 no SQLite), a que espera uma conexão
+trava o loop, que as demais precisariam para devolvê-las: cada uma falha
+depois do timeout do pool (30 s).
+
+Uso (a partir de backend/):
+    python -m benchmarks.carga_sessao_async [requisicoes] [segundos_de_bloqueio]
+"""
+
+import asyncio
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+def treino_vazio(*args):
+    """Substitui o treinamento: aqui só interessa o caminho da requisição"""
+    return None
+
+
+def bloquear_banco(caminho: str, segundos: float, bloqueado, liberado):
+    """Segura o lock de escrita do banco por `segundos`"""
+    conexao = sqlite3.connect(caminho, isolation_level=None)
+    conexao.execute("BEGIN IMMEDIATE")
+    conexao.execute("UPDATE datasets SET num_linhas = num_linhas + 1")
+    bloqueado.set()
+    time.sleep(segundos)
+    conexao.execute("COMMIT")
+    conexao.close()
+    liberado.set()
+
+
+def montar_app():
+    from fastapi import Depends, FastAPI
+    from sqlalchemy.orm import Session
+
+    from app.database.conexao import obter_db
+    from app.modelos.analise import Analise, StatusAnalise, TipoAnalise
+    from app.modelos.dataset import Dataset
+    from app.rotas import automl
+    from app.servicos.executor_tarefas import executor_tarefas
+
+    automl.executar_automl = treino_vazio
+
+    app = FastAPI()
+    app.include_router(automl.router, prefix="/api/automl")
+
+    @app.post("/sincrono/treinar")
+    async def treinar_com_sessao_sincrona(solicitacao: automl.SolicitacaoAutoML, db: Session = Depends(obter_db)):
+        """A rota de treinamento como era antes da sessão assíncrona"""
+        dataset = db.query(Dataset).filter(Dataset.id == solicitacao.dataset_id).first()
+        analise = Analise(
+            nome=f"AutoML {solicitacao.tipo_problema.title()} - {dataset.nome}",
+            tipo=TipoAnalise.CLASSIFICACAO,
+            status=StatusAnalise.PROCESSANDO,
+            parametros=solicitacao.dict(),
+            projeto_id=dataset.projeto_id,
+            dataset_id=dataset.id
+        )
+        db.add(analise)
+        db.commit()
+        db.refresh(analise)
+        executor_tarefas.submeter("automl", treino_vazio, analise.id)
+        return {"analise_id": analise.id}
+
+    @app.get("/saude")
+    async def saude():
+        return {"status": "ok"}
+
+    return app
+
+
+def preparar_banco(caminho: str):
+    from app.database.conexao import Base, engine
+    from app.modelos import usuario, projeto, dataset, analise  # noqa: F401 (registra as tabelas)
+
+    Base.metadata.create_all(engine)
+    conexao = sqlite3.connect(caminho)
+    conexao.execute("INSERT INTO usuarios (id, nome, email, senha_hash) VALUES (1, 'bench', 'bench@local', 'x')")
+    conexao.execute("INSERT INTO projetos (id, nome, usuario_id) VALUES (1, 'bench', 1)")
+    conexao.execute(
+        "INSERT INTO datasets (id, nome, arquivo_original, caminho_arquivo, tipo_arquivo, num_linhas, projeto_id) "
+        "VALUES (1, 'bench', 'bench.csv', 'bench.csv', 'csv', 0, 1)"
+    )
+    conexao.commit()
+    conexao.close()
+
+
+async def medir(cliente, rota: str, caminho: str, requisicoes: int, segundos: float):
+    corpo = {"dataset_id": 1, "variavel_alvo": "y", "tipo_problema": "classificacao"}
+    contexto = multiprocessing.get_context("spawn")
+    bloqueado, liberado = contexto.Event(), contexto.Event()
+    bloqueador = contexto.Process(target=bloquear_banco, args=(caminho, segundos, bloqueado, liberado))
+    bloqueador.start()
+    await asyncio.get_running_loop().run_in_executor(None, bloqueado.wait)
+
+    respostas_saude = []
+    parar = asyncio.Event()
+
+    async def sondar():
+        # A cada 10 ms; com o event loop travado, nem a consulta nem a espera avançam
+        while not parar.is_set():
+            resposta = await cliente.get("/saude")
+            resposta.raise_for_status()
+            respostas_saude.append(time.perf_counter())
+            await asyncio.sleep(0.01)
+
+    async def gravar():
+        inicio = time.perf_counter()
+        resposta = await cliente.post(rota, json=corpo)
+        return time.perf_counter() - inicio, resposta.is_success
+
+    inicio = time.perf_counter()
+    sonda = asyncio.create_task(sondar())
+    gravacoes = await asyncio.gather(*(gravar() for _ in range(requisicoes)))
+    duracao = time.perf_counter() - inicio
+    parar.set()
+    await sonda
+    bloqueador.join()
+
+    intervalos = np.diff([inicio, *respostas_saude]) * 1000
+    return {
+        "duracao_s": duracao,
+        "gravacao_p50_ms": float(np.percentile([latencia for latencia, _ in gravacoes], 50) * 1000),
+        "falhas": sum(not ok for _, ok in gravacoes),
+        "saude_respostas": len(respostas_saude),
+        "saude_intervalo_max_ms": float(intervalos.max())
+    }
+
+
+async def executar(caminho: str, requisicoes: int, segundos: float):
+    import httpx
+
+    from app.servicos.executor_tarefas import executor_tarefas
+
+    executor_tarefas.max_fila = max(executor_tarefas.max_fila, 2 * requisicoes)
+    # Erros das rotas viram respostas 500, contadas como falhas
+    transporte = httpx.ASGITransport(app=montar_app(), raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench", timeout=120) as cliente:
+        # Aquece o pool de processos antes de medir
+        await cliente.post("/sincrono/treinar", json={"dataset_id": 1, "variavel_alvo": "y", "tipo_problema": "classificacao"})
+        await asyncio.gather(*list(executor_tarefas._tarefas))
+
+        for nome, rota in (("Session síncrona", "/sincrono/treinar"), ("AsyncSession", "/api/automl/treinar")):
+            r = await medir(cliente, rota, caminho, requisicoes, segundos)
+            await asyncio.gather(*list(executor_tarefas._tarefas))
+            print(
+                f"  {nome:16s} {requisicoes} gravações em {r['duracao_s']:5.2f} s (p50 {r['gravacao_p50_ms']:7.1f} ms, "
+                f"falhas {r['falhas']:3d})  "
+                f"rota sem banco: {r['saude_respostas']:4d} respostas, "
+                f"maior intervalo sem resposta {r['saude_intervalo_max_ms']:8.1f} ms"
+            )
+    executor_tarefas._obter_pool().shutdown()
+
+
+def main():
+    requisicoes = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    segundos = float(sys.argv[2]) if len(sys.argv) > 2 else 2.0
+
+    # A engine lê DATABASE_URL na importação; modelos_treinados/ é criado no diretório atual
+    diretorio = tempfile.mkdtemp(prefix="bench_sessao_")
+    caminho = os.path.join(diretorio, "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{caminho}"
+    original = os.getcwd()
+    os.chdir(diretorio)
+    try:
+        preparar_banco(caminho)
+        print(f"{requisicoes} treinamentos simultâneos com o banco bloqueado por {segundos:.1f} s")
+        asyncio.run(executar(caminho, requisicoes, segundos))
+    finally:
+        os.chdir(original)
+        shutil.rmtree(diretorio)
+
+
+if __name__ == "__main__":
+    main()
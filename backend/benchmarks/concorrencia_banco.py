@@ -0,0 +1,146 @@
+"""
+Benchmark de concorrência no banco
+
+Simula N análises simultâneas, cada uma em seu processo (como no executor de
+tarefas), gravando atualizações de status e resultados parciais na tabela
+`analises` de um SQLite, enquanto um processo consulta o status em laço
+(como o endpoint /status). Compara a engine padrão do SQLAlchemy com
+`criar_engine` (WAL, synchronous=NORMAL, busy_timeout, cache e mmap).
+
+Uso (a partir de backend/):
+    python -m benchmarks.concorrencia_banco [tarefas] [atualizacoes_por_tarefa]
+"""
+
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import create_engine, func, insert, select, update
+from sqlalchemy.exc import OperationalError
+
+from app.database.conexao import Base, criar_engine
+
+
+def obter_engine(url: str, otimizada: bool):
+    if otimizada:
+        return criar_engine(url)
+    return create_engine(url, connect_args={"check_same_thread": False})
+
+
+def tabela_analises():
+    from app.modelos import usuario, projeto, dataset, analise  # noqa: F401 (registra as tabelas)
+    return analise.Analise.__table__
+
+
+def preparar_banco(url: str, tarefas: int):
+    analises = tabela_analises()
+    engine = obter_engine(url, otimizada=False)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conexao:
+        conexao.execute(insert(analises), [
+            {"id": i, "nome": f"Análise {i}", "tipo": "DESCRITIVA", "status": "PENDENTE", "projeto_id": 1, "dataset_id": 1}
+            for i in range(1, tarefas + 1)
+        ])
+    engine.dispose()
+
+
+def tarefa(url: str, otimizada: bool, analise_id: int, atualizacoes: int, barreira, fila):
+    """Uma análise: grava o progresso `atualizacoes` vezes, cada uma em sua transação"""
+    engine = obter_engine(url, otimizada)
+    analises = tabela_analises()
+    parcial = {"estatisticas": {f"c{i}": {"media": i * 0.5, "desvio": 1.0} for i in range(50)}}
+    latencias, falhas = [], 0
+    barreira.wait()
+    for passo in range(atualizacoes):
+        inicio = time.perf_counter()
+        try:
+            with engine.begin() as conexao:
+                conexao.execute(
+                    update(analises)
+                    .where(analises.c.id == analise_id)
+                    .values(status="PROCESSANDO", resultados=dict(parcial, progresso=passo), tempo_execucao=passo)
+                )
+        except OperationalError:
+            # "database is locked": a atualização de status se perde
+            falhas += 1
+        latencias.append(time.perf_counter() - inicio)
+    engine.dispose()
+    fila.put((latencias, falhas, 0))
+
+
+def leitor(url: str, otimizada: bool, barreira, parar, fila):
+    """Consulta de status em laço, concorrendo com as gravações"""
+    engine = obter_engine(url, otimizada)
+    analises = tabela_analises()
+    consultas, falhas = 0, 0
+    barreira.wait()
+    while not parar.is_set():
+        try:
+            with engine.connect() as conexao:
+                conexao.execute(select(func.count()).select_from(analises).where(analises.c.status == "PROCESSANDO")).scalar()
+            consultas += 1
+        except OperationalError:
+            falhas += 1
+    engine.dispose()
+    fila.put(([], falhas, consultas))
+
+
+def executar(otimizada: bool, tarefas: int, atualizacoes: int):
+    diretorio = tempfile.mkdtemp(prefix="bench_banco_")
+    url = f"sqlite:///{os.path.join(diretorio, 'bench.db')}"
+    preparar_banco(url, tarefas)
+
+    contexto = multiprocessing.get_context("spawn")
+    barreira = contexto.Barrier(tarefas + 2)
+    parar = contexto.Event()
+    fila = contexto.Queue()
+    processos = [
+        contexto.Process(target=tarefa, args=(url, otimizada, i, atualizacoes, barreira, fila))
+        for i in range(1, tarefas + 1)
+    ]
+    processos.append(contexto.Process(target=leitor, args=(url, otimizada, barreira, parar, fila)))
+    for processo in processos:
+        processo.start()
+
+    barreira.wait()
+    inicio = time.perf_counter()
+    resultados = [fila.get() for _ in range(tarefas)]
+    duracao = time.perf_counter() - inicio
+    parar.set()
+    resultados.append(fila.get())
+    for processo in processos:
+        processo.join()
+    shutil.rmtree(diretorio)
+
+    latencias = np.concatenate([np.asarray(r[0]) for r in resultados if r[0]])
+    falhas = sum(r[1] for r in resultados)
+    consultas = sum(r[2] for r in resultados)
+    gravadas = tarefas * atualizacoes - falhas
+    return {
+        "atualizacoes_s": gravadas / duracao,
+        "p50_ms": float(np.percentile(latencias, 50) * 1000),
+        "p99_ms": float(np.percentile(latencias, 99) * 1000),
+        "falhas": falhas,
+        "consultas_s": consultas / duracao
+    }
+
+
+def main():
+    tarefas = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    atualizacoes = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    print(f"{tarefas} análises simultâneas x {atualizacoes} atualizações de status")
+    for nome, otimizada in (("engine padrão", False), ("criar_engine", True)):
+        r = executar(otimizada, tarefas, atualizacoes)
+        print(
+            f"  {nome:14s} {r['atualizacoes_s']:8.0f} atualizações/s  "
+            f"p50 {r['p50_ms']:6.1f} ms  p99 {r['p99_ms']:7.1f} ms  "
+            f"falhas {r['falhas']:4d}  consultas de status {r['consultas_s']:7.0f}/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Benchmark da listagem de modelos e da consulta de status
+
+Cria um SQLite com muitas análises concluídas (modelos de AutoML com
+resultados, gráficos e relatório volumosos, misturados a análises
+descritivas) no esquema anterior: sem a coluna `acuracia` e sem os índices
+de `analises`. Mede a listagem e a consulta de status como eram (linhas
+inteiras, acurácia lida do JSON), aplica `migrar_analises` e mede de novo
+com `listar_modelos` e a consulta de status com `load_only`.
+
+Uso (a partir de backend/):
+    python -m benchmarks.listagem_analises [modelos] [outras_analises]
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+def preparar_banco(caminho: str, modelos: int, outras: int):
+    from app.database.conexao import Base, engine
+    from app.modelos import usuario, projeto, dataset, analise  # noqa: F401 (registra as tabelas)
+
+    Base.metadata.create_all(engine)
+    gerador = np.random.default_rng(0)
+    conexao = sqlite3.connect(caminho)
+    conexao.execute("INSERT INTO usuarios (id, nome, email, senha_hash) VALUES (1, 'bench', 'bench@local', 'x')")
+    conexao.executemany("INSERT INTO projetos (id, nome, usuario_id) VALUES (?, ?, 1)", [(i, f"p{i}") for i in range(1, 21)])
+    conexao.execute(
+        "INSERT INTO datasets (id, nome, arquivo_original, caminho_arquivo, tipo_arquivo, projeto_id) "
+        "VALUES (1, 'bench', 'bench.csv', 'bench.csv', 'csv', 1)"
+    )
+
+    def resultados_automl(acuracia):
+        algoritmos = {
+            nome: {
+                "metricas": {"accuracy": float(acuracia), "precision": 0.8, "recall": 0.7, "f1_score": 0.75},
+                "cv_score_medio": 0.8,
+                "cv_score_std": 0.01,
+                "score_principal": float(acuracia)
+            }
+            for nome in ("random_forest", "logistic_regression", "svm")
+        }
+        return {
+            "algoritmos_testados": algoritmos,
+            "melhor_modelo": {"nome": "random_forest", "metricas": algoritmos["random_forest"]},
+            "variaveis_utilizadas": [f"x{i}" for i in range(200)],
+            "importancias": {f"x{i}": float(v) for i, v in enumerate(gerador.random(200))},
+            "tipo_problema": "classificacao"
+        }
+
+    graficos = json.dumps({"curva_roc": gerador.random((2, 500)).round(4).tolist()})
+    relatorio = "# Relatório\n" + "Texto do relatório. " * 500
+    linhas = []
+    for i in range(1, modelos + outras + 1):
+        if i <= modelos:
+            tipo, resultados = "CLASSIFICACAO", json.dumps(resultados_automl(gerador.random()))
+        else:
+            tipo, resultados = "DESCRITIVA", json.dumps({"resumo": {"linhas": i}})
+        status = "CONCLUIDA" if gerador.random() < 0.9 else "PROCESSANDO"
+        linhas.append((i, f"Análise {i}", tipo, status, resultados, graficos, relatorio, 5, int(gerador.integers(1, 21)), 1))
+    conexao.executemany(
+        "INSERT INTO analises (id, nome, tipo, status, resultados, graficos, relatorio, tempo_execucao, projeto_id, dataset_id) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        linhas
+    )
+    # Esquema anterior: sem a coluna desnormalizada e sem os índices novos
+    for (indice,) in conexao.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'analises' AND name != 'ix_analises_id'"
+    ).fetchall():
+        conexao.execute(f"DROP INDEX {indice}")
+    conexao.execute("ALTER TABLE analises DROP COLUMN acuracia")
+    conexao.commit()
+    conexao.execute("VACUUM")
+    conexao.close()
+
+
+def medir(funcao, repeticoes: int) -> float:
+    """Mediana em ms de `repeticoes` execuções de uma corrotina"""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        asyncio.run(funcao())
+        tempos.append(time.perf_counter() - inicio)
+    return float(np.median(tempos) * 1000)
+
+
+def main():
+    modelos = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    outras = int(sys.argv[2]) if len(sys.argv) > 2 else 40000
+
+    # A engine lê DATABASE_URL na importação; modelos_treinados/ é criado no diretório atual
+    diretorio = tempfile.mkdtemp(prefix="bench_listagem_")
+    caminho = os.path.join(diretorio, "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{caminho}"
+    original = os.getcwd()
+    os.chdir(diretorio)
+    try:
+        preparar_banco(caminho, modelos, outras)
+
+        from sqlalchemy import select
+        from sqlalchemy.orm import load_only
+
+        from app.database.conexao import SessionLocalAsync, engine_async, migrar_analises
+        from app.modelos.analise import Analise, StatusAnalise, TipoAnalise
+        from app.rotas.automl import listar_modelos
+
+        colunas_status = (
+            Analise.id, Analise.nome, Analise.tipo, Analise.status,
+            Analise.data_criacao, Analise.data_conclusao, Analise.tempo_execucao
+        )
+        ids_status = np.random.default_rng(1).integers(1, modelos + outras + 1, 200).tolist()
+
+        # Esquema anterior: todas as colunas, menos a acuracia que ainda não existe
+        colunas_anteriores = [coluna for coluna in Analise.__table__.c if coluna.key != "acuracia"]
+
+        async def listagem_anterior():
+            async with SessionLocalAsync() as db:
+                linhas = (await db.execute(select(*colunas_anteriores).where(
+                    Analise.tipo.in_([TipoAnalise.CLASSIFICACAO, TipoAnalise.REGRESSAO]),
+                    Analise.status == StatusAnalise.CONCLUIDA,
+                    Analise.projeto_id == 7
+                ))).all()
+                return [linha.resultados.get("melhor_modelo", {}).get("metricas", {}).get("accuracy") for linha in linhas]
+
+        async def listagem_atual():
+            async with SessionLocalAsync() as db:
+                return await listar_modelos(projeto_id=7, db=db)
+
+        async def listagem_completa():
+            async with SessionLocalAsync() as db:
+                return await listar_modelos(projeto_id=None, db=db)
+
+        async def status(opcoes):
+            for analise_id in ids_status:
+                async with SessionLocalAsync() as db:
+                    if opcoes is None:
+                        (await db.execute(select(*colunas_anteriores).where(Analise.id == analise_id))).one()
+                    else:
+                        await db.get(Analise, analise_id, options=opcoes)
+            await engine_async.dispose()
+
+        async def com_descarte(funcao):
+            try:
+                return await funcao()
+            finally:
+                await engine_async.dispose()
+
+        print(f"{modelos} modelos e {outras} outras análises ({os.path.getsize(caminho) / 2**20:.0f} MiB)")
+        antes_projeto = medir(lambda: com_descarte(listagem_anterior), 5)
+        antes_status = medir(lambda: status(None), 3) / len(ids_status)
+
+        inicio = time.perf_counter()
+        migrar_analises()
+        migracao = time.perf_counter() - inicio
+
+        depois_projeto = medir(lambda: com_descarte(listagem_atual), 5)
+        depois_todos = medir(lambda: com_descarte(listagem_completa), 5)
+        depois_status = medir(lambda: status([load_only(*colunas_status)]), 3) / len(ids_status)
+        listados = asyncio.run(com_descarte(listagem_completa))
+
+        print(f"  migração (coluna acuracia + índices): {migracao:.2f} s")
+        print(f"  listagem de um projeto   antes {antes_projeto:8.1f} ms   depois {depois_projeto:8.1f} ms")
+        print(f"  listagem de todos                          depois {depois_todos:8.1f} ms ({len(listados)} modelos)")
+        print(f"  consulta de status       antes {antes_status:8.2f} ms   depois {depois_status:8.2f} ms")
+        print(f"  modelos com acurácia preenchida: {sum(m['acuracia'] is not None for m in listados)}")
+    finally:
+        os.chdir(original)
+        shutil.rmtree(diretorio)
+
+
+if __name__ == "__main__":
+    main()
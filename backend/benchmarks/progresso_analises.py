@@ -0,0 +1,131 @@
+"""
+Benchmark do acompanhamento de progresso
+
+Simula uma tarefa que avança por etapas e termina gravando a conclusão no
+banco. Com N clientes consultando o status a cada `intervalo` segundos (o
+acompanhamento por polling), mede as consultas feitas ao banco e o atraso
+entre a conclusão e sua percepção; depois repete com N assinaturas do
+canal de progresso, como as do fluxo de server-sent events.
+
+Uso (a partir de backend/):
+    python -m benchmarks.progresso_analises [clientes] [intervalo]
+"""
+
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ETAPAS_SIMULADAS = 20
+DURACAO_ETAPA = 0.1
+
+
+def main():
+    clientes = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    intervalo = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+
+    # A engine lê DATABASE_URL na importação
+    diretorio = tempfile.mkdtemp(prefix="bench_progresso_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(diretorio, 'bench.db')}"
+    try:
+        from sqlalchemy.orm import load_only
+
+        from app.database.conexao import Base, SessionLocal, SessionLocalAsync, engine, engine_async
+        from app.modelos import usuario, projeto, dataset  # noqa: F401 (registra as tabelas)
+        from app.modelos.analise import Analise, StatusAnalise, TipoAnalise
+        from app.servicos.progresso import CanalProgressoLocal, evento_progresso
+
+        Base.metadata.create_all(engine)
+        db = SessionLocal()
+        db.add(usuario.Usuario(id=1, nome="bench", email="bench@local", senha_hash="x"))
+        db.add(projeto.Projeto(id=1, nome="bench", usuario_id=1))
+        db.add(dataset.Dataset(id=1, nome="bench", arquivo_original="b.csv", caminho_arquivo="b.csv", tipo_arquivo="csv", projeto_id=1))
+        db.commit()
+        db.close()
+
+        async def nova_analise() -> int:
+            async with SessionLocalAsync() as db:
+                analise = Analise(nome="bench", tipo=TipoAnalise.DESCRITIVA, status=StatusAnalise.PROCESSANDO, projeto_id=1, dataset_id=1)
+                db.add(analise)
+                await db.commit()
+                return analise.id
+
+        async def tarefa(analise_id: int, canal) -> float:
+            for etapa in range(ETAPAS_SIMULADAS):
+                await asyncio.sleep(DURACAO_ETAPA)
+                if canal is not None:
+                    await canal.publicar(evento_progresso(analise_id, "calcular", 100 * etapa / ETAPAS_SIMULADAS))
+            async with SessionLocalAsync() as db:
+                analise = await db.get(Analise, analise_id)
+                analise.status = StatusAnalise.CONCLUIDA
+                await db.commit()
+            concluida = time.perf_counter()
+            if canal is not None:
+                await canal.publicar(evento_progresso(analise_id, "concluida", 100))
+            return concluida
+
+        async def polling():
+            analise_id = await nova_analise()
+            consultas = 0
+
+            async def cliente() -> float:
+                nonlocal consultas
+                # Clientes chegam em momentos diferentes do intervalo
+                await asyncio.sleep(np.random.uniform(0, intervalo))
+                while True:
+                    async with SessionLocalAsync() as db:
+                        analise = await db.get(Analise, analise_id, options=[load_only(Analise.id, Analise.status)])
+                        consultas += 1
+                        if analise.status == StatusAnalise.CONCLUIDA:
+                            return time.perf_counter()
+                    await asyncio.sleep(intervalo)
+
+            concluida, *percebidas = await asyncio.gather(tarefa(analise_id, None), *(cliente() for _ in range(clientes)))
+            await engine_async.dispose()
+            return consultas, 0, np.array(percebidas) - concluida
+
+        async def assinaturas():
+            analise_id = await nova_analise()
+            canal = CanalProgressoLocal()
+            recebidos = 0
+            prontos = asyncio.Event()
+            conectados = 0
+
+            async def cliente() -> float:
+                nonlocal recebidos, conectados
+                async with canal.assinar(analise_id) as assinatura:
+                    conectados += 1
+                    if conectados == clientes:
+                        prontos.set()
+                    while True:
+                        evento = await assinatura.proximo(60)
+                        recebidos += 1
+                        if evento["etapa"] == "concluida":
+                            return time.perf_counter()
+
+            async def tarefa_apos_conexoes():
+                await prontos.wait()
+                return await tarefa(analise_id, canal)
+
+            concluida, *percebidas = await asyncio.gather(tarefa_apos_conexoes(), *(cliente() for _ in range(clientes)))
+            await engine_async.dispose()
+            return 0, recebidos, np.array(percebidas) - concluida
+
+        duracao = ETAPAS_SIMULADAS * DURACAO_ETAPA
+        print(f"{clientes} clientes acompanhando uma tarefa de {duracao:.1f} s ({ETAPAS_SIMULADAS} etapas)")
+        for nome, funcao in ((f"polling a cada {intervalo:g} s", polling), ("canal de progresso", assinaturas)):
+            consultas, eventos, atrasos = asyncio.run(funcao())
+            print(
+                f"  {nome:22s} consultas ao banco {consultas:6d}   eventos entregues {eventos:6d}   "
+                f"atraso da conclusão p50 {np.median(atrasos) * 1000:7.1f} ms, máx {atrasos.max() * 1000:7.1f} ms"
+            )
+    finally:
+        shutil.rmtree(diretorio)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,12 @@ DataScience Pro - Backend Principal
 Sistema completo de análise de dados com FastAPI
 """
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, FileResponse
+from starlette.background import BackgroundTask
+from fastapi.concurrency import run_in_threadpool
 import uvicorn
 import pandas as pd
 import numpy as np
@@ -15,9 +17,25 @@ import io
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 import logging
+import os
+import tempfile
+import uuid
 
 # Importar rotas
 from app.rotas.santa_catarina_completo import router as santa_catarina_router
+from app.rotas.analise import router as analise_router
+from app.rotas.automl import router as automl_router
+from app.servicos.ingestao import ingerir_arquivo, FormatoNaoSuportado
+from app.servicos.armazenamento_sessoes import armazenamento_sessoes, SessaoNaoEncontrada
+from app.database.conexao import inicializar_database
+from app.servicos.executor_tarefas import executor_tarefas
+from app.servicos.cache_analises import cache_analises, impressao_digital
+from app.servicos.correlacao import matriz_correlacao, pares_fortes
+from app.servicos.estatisticas import descrever
+from app.servicos.sketches import LIMITES_ERRO, ResumoAproximado
+from app.servicos.outliers import detectar_outliers, METODOS_OUTLIERS
+from app.servicos.formato_colunar import FORMATOS_EXPORTACAO, TIPOS_MIDIA
+from app.utils.serializacao import RespostaORJSON
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -29,7 +47,8 @@ app = FastAPI(
     description="API completa para análise de dados científicos",
     version="3.0.0",
     docs_url="/api/docs",
-    redoc_url="/api/redoc"
+    redoc_url="/api/redoc",
+    default_response_class=RespostaORJSON
 )
 
 # Configurar CORS
@@ -43,9 +62,50 @@ app.add_middleware(
 
 # Registrar rotas
 app.include_router(santa_catarina_router, prefix="/api/santa-catarina", tags=["Santa Catarina"])
+app.include_router(analise_router, prefix="/api/analise", tags=["Análise"])
+app.include_router(automl_router, prefix="/api/automl", tags=["AutoML"])
 
-# Variável global para armazenar dados carregados
-dados_sessao = {}
+@app.on_event("startup")
+async def preparar_banco():
+    """Cria as tabelas e migra as existentes (colunas e índices novos de `analises`)"""
+    await inicializar_database()
+
+@app.on_event("shutdown")
+async def encerrar_tarefas():
+    """Encerra o pool de processos das análises e o retransmissor de progresso"""
+    await run_in_threadpool(executor_tarefas.encerrar)
+
+def ingerir_para_sessao(arquivo, filename: str, session_id: str, aproximado: bool = False) -> Dict[str, Any]:
+    """
+    Grava o upload bloco a bloco no armazenamento de sessões e devolve o
+    resumo; os dtypes otimizados ficam nos metadados e valem ao abrir a sessão
+    """
+    impressao = impressao_digital(arquivo)
+    escritor = armazenamento_sessoes.criar_escritor(session_id)
+    try:
+        ingestao = ingerir_arquivo(arquivo, filename, destino=escritor, aproximado=aproximado)
+    except Exception:
+        escritor.abortar()
+        raise
+    
+    analysis = ingestao["analysis"]
+    armazenamento_sessoes.publicar(escritor, {
+        "analysis": analysis,
+        "dtypes": ingestao["tipos"],
+        "filename": analysis["filename"],
+        "rows": analysis["rows"],
+        "columns": analysis["columns"],
+        "fingerprint": impressao,
+        "uploaded_at": datetime.now().isoformat()
+    })
+    return analysis
+
+def resumo_aproximado_sessao(session_id: str, colunas: List[str]) -> ResumoAproximado:
+    """Percorre a sessão lote a lote alimentando os sketches, sem carregá-la inteira"""
+    resumo = ResumoAproximado()
+    for bloco in armazenamento_sessoes.iterar_blocos(session_id, colunas):
+        resumo.atualizar(bloco)
+    return resumo
 
 @app.get("/")
 async def root():
@@ -57,6 +117,7 @@ async def root():
         "endpoints": {
             "upload": "/api/upload",
             "analyze": "/api/analyze",
+            "export": "/api/sessions/{session_id}/export",
             "docs": "/api/docs",
             "health": "/api/health"
         }
@@ -72,146 +133,159 @@ async def health_check():
     }
 
 @app.post("/api/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(file: UploadFile = File(...), approximate: bool = False):
     """
     Upload e processamento de arquivos de dados
-    Suporta CSV, JSON, Excel
+    Suporta CSV, JSON, Excel. Com `approximate=true` quartis, distintos e
+    valores mais frequentes vêm de sketches de memória constante, com os
+    limites de erro descritos em `error_bounds`. `data_types` traz os dtypes
+    otimizados com que a sessão é aberta e `memory` os bytes antes e depois.
     """
     try:
         logger.info(f"Recebendo arquivo: {file.filename}")
         
-        # Ler conteúdo do arquivo
-        content = await file.read()
+        session_id = f"data_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
         
-        # Processar baseado no tipo de arquivo
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(io.StringIO(content.decode('utf-8')))
-        elif file.filename.endswith('.json'):
-            data = json.loads(content.decode('utf-8'))
-            df = pd.DataFrame(data)
-        elif file.filename.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(io.BytesIO(content))
-        else:
-            raise HTTPException(
-                status_code=400, 
-                detail="Formato de arquivo não suportado. Use CSV, JSON ou Excel."
+        # Ler o arquivo em blocos direto do upload e gravar a sessão em disco
+        try:
+            analysis = await run_in_threadpool(
+                ingerir_para_sessao, file.file, file.filename, session_id, approximate
             )
-        
-        # Análise básica dos dados
-        analysis = {
-            "filename": file.filename,
-            "rows": len(df),
-            "columns": len(df.columns),
-            "column_names": df.columns.tolist(),
-            "data_types": df.dtypes.astype(str).to_dict(),
-            "null_counts": df.isnull().sum().to_dict(),
-            "preview": df.head(10).to_dict('records'),
-            "statistics": {}
-        }
-        
-        # Estatísticas para colunas numéricas
-        numeric_columns = df.select_dtypes(include=[np.number]).columns
-        for col in numeric_columns:
-            analysis["statistics"][col] = {
-                "mean": float(df[col].mean()),
-                "median": float(df[col].median()),
-                "std": float(df[col].std()),
-                "min": float(df[col].min()),
-                "max": float(df[col].max()),
-                "quartiles": df[col].quantile([0.25, 0.5, 0.75]).to_dict()
-            }
-        
-        # Salvar dados na sessão (em produção, usar database)
-        session_id = f"data_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        dados_sessao[session_id] = {
-            "dataframe": df,
-            "analysis": analysis,
-            "uploaded_at": datetime.now().isoformat()
-        }
+        except FormatoNaoSuportado as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         analysis["session_id"] = session_id
         
         logger.info(f"Arquivo processado com sucesso: {file.filename}")
-        return analysis
+        return RespostaORJSON(analysis)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erro ao processar arquivo: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro ao processar arquivo: {str(e)}")
 
 @app.post("/api/analyze/{session_id}")
-async def analyze_data(session_id: str, analysis_type: str = "descriptive"):
+async def analyze_data(
+    session_id: str,
+    analysis_type: str = "descriptive",
+    threshold: float = Query(0.7, ge=0, le=1),
+    top_k: Optional[int] = Query(None, ge=1),
+    use_float32: bool = False,
+    approximate: bool = False,
+    method: str = "iqr",
+    factor: Optional[float] = Query(None, gt=0)
+):
     """
-    Executar análise específica nos dados carregados
+    Executar análise específica nos dados carregados.
+    Para correlation: `threshold` e `top_k` filtram os pares fortes e
+    `use_float32` reduz memória e tempo em datasets muito largos.
+    Para descriptive: `approximate=true` percorre a sessão em lotes com
+    sketches (sem matriz de correlação), com memória constante.
+    Para outliers: `method` (iqr, zscore, mad ou isolation_forest) e
+    `factor`, o multiplicador dos limites (padrão 1.5, 3 e 3.5).
     """
     try:
-        if session_id not in dados_sessao:
+        if not armazenamento_sessoes.existe(session_id):
             raise HTTPException(status_code=404, detail="Sessão não encontrada")
         
-        df = dados_sessao[session_id]["dataframe"]
+        # Resultados são memorizados pelo conteúdo do arquivo, não pela sessão
+        impressao = armazenamento_sessoes.metadados(session_id).get("fingerprint", session_id)
+        parametros = None
+        if analysis_type == "correlation":
+            parametros = {"threshold": threshold, "top_k": top_k, "use_float32": use_float32}
+        elif analysis_type == "descriptive" and approximate:
+            parametros = {"approximate": True}
+        elif analysis_type == "outliers":
+            parametros = {"method": method, "factor": factor}
+        em_cache = cache_analises.obter(impressao, analysis_type, parametros)
+        if em_cache is not None:
+            return RespostaORJSON(dict(em_cache, timestamp=datetime.now().isoformat()))
+        
+        # Ler do disco apenas as colunas que a análise usa
+        colunas_numericas = armazenamento_sessoes.colunas_numericas(session_id)
         
-        if analysis_type == "descriptive":
+        if analysis_type == "descriptive" and approximate:
+            colunas_texto = [
+                campo.name for campo in armazenamento_sessoes.esquema(session_id)
+                if campo.name not in colunas_numericas
+            ]
+            resumo = await run_in_threadpool(
+                resumo_aproximado_sessao, session_id, colunas_numericas + colunas_texto[:5]
+            )
+            result = {
+                "type": "descriptive",
+                "summary": resumo.descrever(),
+                "correlation_matrix": {},
+                "value_counts": {
+                    coluna: estatistica["top_values"]
+                    for coluna, estatistica in resumo.estatisticas_categoricas().items()
+                },
+                "approximate": True,
+                "error_bounds": LIMITES_ERRO
+            }
+
+        elif analysis_type == "descriptive":
+            colunas_texto = [
+                campo.name for campo in armazenamento_sessoes.esquema(session_id)
+                if campo.name not in colunas_numericas
+            ]
+            df = armazenamento_sessoes.abrir(session_id, colunas_numericas + colunas_texto[:5])
+            numeric_df = df[colunas_numericas]
+            
             result = {
                 "type": "descriptive",
-                "summary": df.describe().to_dict(),
-                "correlation_matrix": df.corr().to_dict() if len(df.select_dtypes(include=[np.number]).columns) > 1 else {},
+                "summary": descrever(df),
+                "correlation_matrix": matriz_correlacao(numeric_df).to_dict() if len(colunas_numericas) > 1 else {},
                 "value_counts": {}
             }
             
             # Value counts para colunas categóricas
-            categorical_columns = df.select_dtypes(include=['object']).columns
+            categorical_columns = df.select_dtypes(include=['object', 'string', 'category']).columns
             for col in categorical_columns[:5]:  # Limitar a 5 colunas
                 result["value_counts"][col] = df[col].value_counts().head(10).to_dict()
                 
         elif analysis_type == "correlation":
-            numeric_df = df.select_dtypes(include=[np.number])
+            numeric_df = armazenamento_sessoes.abrir(session_id, colunas_numericas)
             if len(numeric_df.columns) < 2:
                 raise HTTPException(status_code=400, detail="Pelo menos 2 colunas numéricas necessárias")
             
+            # Matriz calculada uma única vez; pares fortes em ordem de força
+            corr_matrix = matriz_correlacao(numeric_df, float32=use_float32)
             result = {
                 "type": "correlation",
-                "correlation_matrix": numeric_df.corr().to_dict(),
-                "strong_correlations": []
+                "correlation_matrix": corr_matrix.to_dict(),
+                "strong_correlations": [
+                    {"var1": var1, "var2": var2, "correlation": valor}
+                    for var1, var2, valor in pares_fortes(corr_matrix, threshold, top_k)
+                ]
             }
-            
-            # Identificar correlações fortes
-            corr_matrix = numeric_df.corr()
-            for i in range(len(corr_matrix.columns)):
-                for j in range(i+1, len(corr_matrix.columns)):
-                    corr_value = corr_matrix.iloc[i, j]
-                    if abs(corr_value) > 0.7:
-                        result["strong_correlations"].append({
-                            "var1": corr_matrix.columns[i],
-                            "var2": corr_matrix.columns[j],
-                            "correlation": float(corr_value)
-                        })
         
         elif analysis_type == "outliers":
-            numeric_df = df.select_dtypes(include=[np.number])
+            if method not in METODOS_OUTLIERS:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Método de outliers deve ser um de: {', '.join(METODOS_OUTLIERS)}"
+                )
+            numeric_df = armazenamento_sessoes.abrir(session_id, colunas_numericas)
+            # Limites de todas as colunas de uma vez; devolve contagens e índices de linha
             result = {
                 "type": "outliers",
-                "outliers_by_column": {}
+                **await run_in_threadpool(detectar_outliers, numeric_df, method, factor)
             }
-            
-            for col in numeric_df.columns:
-                Q1 = numeric_df[col].quantile(0.25)
-                Q3 = numeric_df[col].quantile(0.75)
-                IQR = Q3 - Q1
-                lower_bound = Q1 - 1.5 * IQR
-                upper_bound = Q3 + 1.5 * IQR
-                
-                outliers = numeric_df[(numeric_df[col] < lower_bound) | (numeric_df[col] > upper_bound)][col]
-                result["outliers_by_column"][col] = {
-                    "count": len(outliers),
-                    "percentage": (len(outliers) / len(numeric_df)) * 100,
-                    "values": outliers.tolist()[:20]  # Limitar a 20 valores
-                }
         
         else:
             raise HTTPException(status_code=400, detail="Tipo de análise não suportado")
         
-        result["timestamp"] = datetime.now().isoformat()
-        return result
+        cache_analises.guardar(impressao, analysis_type, parametros, result)
         
+        # Matrizes e resumos grandes vão direto para o orjson, sem o jsonable_encoder
+        return RespostaORJSON(dict(result, timestamp=datetime.now().isoformat()))
+
+    except HTTPException:
+        raise
+    except SessaoNaoEncontrada:
+        raise HTTPException(status_code=404, detail="Sessão não encontrada")
     except Exception as e:
         logger.error(f"Erro na análise: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro na análise: {str(e)}")
@@ -220,12 +294,12 @@ async def analyze_data(session_id: str, analysis_type: str = "descriptive"):
 async def list_sessions():
     """Listar todas as sessões ativas"""
     sessions = []
-    for session_id, data in dados_sessao.items():
+    for data in armazenamento_sessoes.listar():
         sessions.append({
-            "session_id": session_id,
-            "filename": data["analysis"]["filename"],
-            "rows": data["analysis"]["rows"],
-            "columns": data["analysis"]["columns"],
+            "session_id": data["session_id"],
+            "filename": data["filename"],
+            "rows": data["rows"],
+            "columns": data["columns"],
             "uploaded_at": data["uploaded_at"]
         })
     return {"sessions": sessions}
@@ -233,12 +307,51 @@ async def list_sessions():
 @app.delete("/api/sessions/{session_id}")
 async def delete_session(session_id: str):
     """Deletar uma sessão específica"""
-    if session_id not in dados_sessao:
+    try:
+        impressao = armazenamento_sessoes.metadados(session_id).get("fingerprint")
+        armazenamento_sessoes.remover(session_id)
+    except SessaoNaoEncontrada:
         raise HTTPException(status_code=404, detail="Sessão não encontrada")
     
-    del dados_sessao[session_id]
+    if impressao:
+        cache_analises.invalidar(impressao)
     return {"message": f"Sessão {session_id} deletada com sucesso"}
 
+@app.get("/api/sessions/{session_id}/export")
+async def export_session(session_id: str, file_format: str = Query("parquet", alias="format")):
+    """
+    Exportar os dados da sessão em parquet, feather/arrow ou csv,
+    convertidos lote a lote a partir do arquivo colunar da sessão
+    """
+    if file_format not in FORMATOS_EXPORTACAO:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Formato de exportação deve ser um de: {', '.join(FORMATOS_EXPORTACAO)}"
+        )
+    try:
+        nome = os.path.splitext(armazenamento_sessoes.metadados(session_id)["filename"])[0]
+        descritor, caminho = tempfile.mkstemp(suffix=f".{file_format}")
+        os.close(descritor)
+        try:
+            await run_in_threadpool(armazenamento_sessoes.exportar, session_id, file_format, caminho)
+        except Exception:
+            os.remove(caminho)
+            raise
+    except SessaoNaoEncontrada:
+        raise HTTPException(status_code=404, detail="Sessão não encontrada")
+    
+    return FileResponse(
+        caminho,
+        media_type=TIPOS_MIDIA[file_format],
+        filename=f"{nome}.{file_format}",
+        background=BackgroundTask(os.remove, caminho)
+    )
+
+@app.get("/api/cache")
+async def cache_stats():
+    """Estatísticas do cache de resultados de análises"""
+    return cache_analises.estatisticas()
+
 # Endpoints específicos de Santa Catarina
 @app.get("/api/sc/municipios")
 async def get_municipios_sc():
@@ -0,0 +1,23 @@
+"""
+Configuração dos testes: banco SQLite e diretórios de dados temporários.
+As variáveis de ambiente são definidas aqui, antes de qualquer import de
+`app`, porque a engine e os serviços as leem na importação (e os processos
+do executor de tarefas as herdam).
+"""
+
+import os
+import shutil
+import tempfile
+
+DIRETORIO_TESTES = tempfile.mkdtemp(prefix="testes_backend_")
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(DIRETORIO_TESTES, 'testes.db')}"
+os.environ["ARTEFATOS_DIR"] = os.path.join(DIRETORIO_TESTES, "artefatos")
+os.environ["SESSOES_DIR"] = os.path.join(DIRETORIO_TESTES, "sessoes")
+os.environ["CANONICOS_DIR"] = os.path.join(DIRETORIO_TESTES, "canonicos")
+os.environ["CORRELACAO_DIR"] = os.path.join(DIRETORIO_TESTES, "correlacao")
+os.environ["TAREFAS_MAX_PROCESSOS"] = "2"
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(DIRETORIO_TESTES, ignore_errors=True)
@@ -0,0 +1,129 @@
+"""
+Artefatos de análises: migração de documentos grandes para fora do banco
+e a rota /resultados transmitindo-os do disco, completos ou por faixas
+(Range), com ETag, em artefatos com e sem compressão
+"""
+
+import asyncio
+
+import httpx
+import orjson
+from fastapi import FastAPI
+
+from app.database.conexao import SessionLocal, externalizar_documentos_grandes, inicializar_database
+from app.modelos.analise import Analise, StatusAnalise, TipoAnalise
+from app.servicos.armazenamento_artefatos import ARTEFATOS_LIMIAR_BYTES, TAMANHO_BLOCO, armazenamento_artefatos
+
+
+def documento_grande() -> dict:
+    """Documento acima do limiar e de um bloco de leitura, para que as faixas atravessem blocos"""
+    linhas = [{"indice": i, "valor": i * 0.5, "rotulo": f"linha-{i:07d}"} for i in range(40_000)]
+    documento = {
+        "resultados": {"linhas": linhas, "total": len(linhas)},
+        "graficos": {"tipo": "histograma", "barras": list(range(1000))},
+        "relatorio": "Relatório de teste"
+    }
+    assert len(orjson.dumps(documento)) > max(ARTEFATOS_LIMIAR_BYTES, 2 * TAMANHO_BLOCO)
+    return documento
+
+
+def semear_analise(documento: dict) -> int:
+    """Análise concluída antiga, com o documento inteiro nas colunas do banco"""
+    from app.modelos.dataset import Dataset
+    from app.modelos.projeto import Projeto
+    from app.modelos.usuario import Usuario
+
+    db = SessionLocal()
+    db.merge(Usuario(id=2, nome="artefatos", email="artefatos@local", senha_hash="x"))
+    db.merge(Projeto(id=2, nome="artefatos", usuario_id=2))
+    db.merge(Dataset(id=2, nome="artefatos", arquivo_original="a.csv", caminho_arquivo="a.csv", tipo_arquivo="csv", projeto_id=2))
+    analise = Analise(
+        nome="Análise antiga",
+        tipo=TipoAnalise.DESCRITIVA,
+        status=StatusAnalise.CONCLUIDA,
+        projeto_id=2,
+        dataset_id=2,
+        **documento
+    )
+    db.add(analise)
+    db.commit()
+    analise_id = analise.id
+    db.close()
+    return analise_id
+
+
+def migrar(documento: dict, compressao: str) -> int:
+    compressao_anterior = armazenamento_artefatos.compressao
+    armazenamento_artefatos.compressao = compressao
+    try:
+        analise_id = semear_analise(documento)
+        externalizar_documentos_grandes()
+    finally:
+        armazenamento_artefatos.compressao = compressao_anterior
+
+    db = SessionLocal()
+    analise = db.get(Analise, analise_id)
+    db.close()
+    # O banco fica só com a referência e o resumo (entradas pequenas de resultados)
+    assert analise.artefato["compressao"] == compressao
+    assert analise.resultados == {"total": 40_000, "omitidos": ["linhas"]}
+    assert analise.graficos is None and analise.relatorio is None
+    assert armazenamento_artefatos.existe(analise.artefato)
+    assert armazenamento_artefatos.ler_documento(analise.artefato) == documento
+    return analise_id
+
+
+async def conferir_rota(cliente: httpx.AsyncClient, analise_id: int, documento: dict):
+    completa = await cliente.get(f"/resultados/{analise_id}")
+    assert completa.status_code == 200
+    corpo = completa.content
+    assert int(completa.headers["content-length"]) == len(corpo)
+    resposta = orjson.loads(corpo)
+    assert resposta["id"] == analise_id
+    assert {chave: resposta[chave] for chave in documento} == documento
+
+    etag = completa.headers["etag"]
+    inicio_artefato = corpo.index(b'"resultados"')
+    faixas = [
+        (0, 9),
+        # Atravessa a junção entre os metadados e o artefato (sem o "{" do artefato)
+        (inicio_artefato - 5, inicio_artefato + 20),
+        # Começa além do primeiro bloco de leitura do artefato
+        (TAMANHO_BLOCO + 12_345, TAMANHO_BLOCO + 99_999),
+        (len(corpo) - 50, len(corpo) - 1)
+    ]
+    for inicio, fim in faixas:
+        parcial = await cliente.get(f"/resultados/{analise_id}", headers={"Range": f"bytes={inicio}-{fim}"})
+        assert parcial.status_code == 206
+        assert parcial.headers["content-range"] == f"bytes {inicio}-{fim}/{len(corpo)}"
+        assert parcial.content == corpo[inicio:fim + 1]
+
+    sufixo = await cliente.get(f"/resultados/{analise_id}", headers={"Range": "bytes=-100"})
+    assert sufixo.status_code == 206 and sufixo.content == corpo[-100:]
+
+    fora = await cliente.get(f"/resultados/{analise_id}", headers={"Range": f"bytes={len(corpo)}-"})
+    assert fora.status_code == 416
+
+    # If-Range de outra versão: documento completo
+    outra_versao = await cliente.get(f"/resultados/{analise_id}", headers={"Range": "bytes=0-9", "If-Range": '"outra"'})
+    assert outra_versao.status_code == 200 and outra_versao.content == corpo
+
+    nao_modificada = await cliente.get(f"/resultados/{analise_id}", headers={"If-None-Match": etag})
+    assert nao_modificada.status_code == 304
+    assert nao_modificada.content == b""
+
+
+def test_documentos_migrados_e_servidos_por_faixas():
+    from app.rotas.analise import router
+
+    async def cenario(ids):
+        app = FastAPI()
+        app.include_router(router)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://teste") as cliente:
+            for analise_id in ids:
+                await conferir_rota(cliente, analise_id, documento)
+
+    asyncio.run(inicializar_database())
+    documento = documento_grande()
+    ids = [migrar(documento, "zstd"), migrar(documento, "none")]
+    asyncio.run(cenario(ids))
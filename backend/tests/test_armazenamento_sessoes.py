@@ -0,0 +1,144 @@
+"""
+Armazenamento de sessões: gravação em blocos com promoção de tipos e
+dicionários em delta, leitura sem cópia, expiração, remoção LRU pelo mtime,
+limite de bytes e mutações sob flock
+"""
+
+import fcntl
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from app.servicos.armazenamento_sessoes import ArmazenamentoSessoes, SessaoNaoEncontrada
+
+
+def gravar_em_blocos(armazenamento: ArmazenamentoSessoes, session_id: str, blocos):
+    escritor = armazenamento.criar_escritor(session_id)
+    for bloco in blocos:
+        escritor.escrever(bloco)
+    escritor.finalizar()
+    armazenamento.publicar(escritor, {"filename": f"{session_id}.csv"})
+
+
+def envelhecer(caminho: str, segundos: float):
+    momento = time.time() - segundos
+    os.utime(caminho, (momento, momento))
+
+
+def test_blocos_com_tipos_promovidos_e_dicionario_em_delta(tmp_path):
+    armazenamento = ArmazenamentoSessoes(str(tmp_path))
+    gravar_em_blocos(armazenamento, "blocos", [
+        pd.DataFrame({"n": [1, 2, 3, 4], "v": [0.5, 1.5, 2.5, 3.5], "cor": ["azul", "azul", "verde", "azul"], "codigo": [10, 20, 30, 40]}),
+        # n ganha nulos (inteiro -> real), codigo ganha texto (inteiro -> texto), cor ganha um valor novo
+        pd.DataFrame({"n": [5.0, None, 7.0, 8.0], "v": [4.5, 5.5, 6.5, 7.5], "cor": ["vermelho", "azul", None, "verde"], "codigo": ["x", "60", "70", "80"]}),
+        pd.DataFrame({"n": [9.0, 10.0, 11.0, 12.0], "v": [8.5, 9.5, 10.5, 11.5], "cor": ["roxo", "roxo", "azul", "verde"], "codigo": ["90", "100", "110", "120"]})
+    ])
+
+    with pa.memory_map(armazenamento.caminho_dados("blocos"), "r") as origem:
+        leitor = pa.ipc.open_file(origem)
+        assert leitor.num_record_batches == 3
+        assert pa.types.is_dictionary(leitor.schema.field("cor").type)
+        for i in range(leitor.num_record_batches):
+            leitor.get_batch(i)
+        # O primeiro lote grava o dicionário inteiro; os seguintes, só os valores novos
+        assert leitor.stats.num_dictionary_deltas == 2
+
+    df = armazenamento.abrir("blocos", colunas=["n", "cor", "codigo"])
+    assert list(df.columns) == ["n", "cor", "codigo"]
+    assert df["n"].dtype == np.float64
+    assert df["n"].isna().tolist() == [False] * 5 + [True] + [False] * 6
+    assert df["cor"].fillna("-").tolist() == [
+        "azul", "azul", "verde", "azul",
+        "vermelho", "azul", "-", "verde",
+        "roxo", "roxo", "azul", "verde"
+    ]
+    assert df["codigo"].tolist()[:5] == ["10", "20", "30", "40", "x"]
+
+    assert armazenamento.colunas_numericas("blocos") == ["n", "v"]
+    blocos = list(armazenamento.iterar_blocos("blocos", colunas=["v"]))
+    assert [len(bloco) for bloco in blocos] == [4, 4, 4]
+
+
+def test_colunas_numericas_lidas_sem_copia(tmp_path):
+    armazenamento = ArmazenamentoSessoes(str(tmp_path))
+    armazenamento.salvar("numeros", pd.DataFrame({
+        "real": np.linspace(0, 1, 1000),
+        "inteiro": np.arange(1000, dtype=np.int64),
+        "texto": ["a"] * 1000
+    }), {})
+
+    df = armazenamento.abrir("numeros", colunas=["real", "inteiro"])
+    assert df.dtypes.to_dict() == {"real": np.float64, "inteiro": np.int64}
+    for coluna in ("real", "inteiro"):
+        # Visão somente leitura sobre o arquivo mapeado em memória, não uma cópia
+        valores = df[coluna].to_numpy()
+        assert not valores.flags.writeable
+        assert not valores.flags.owndata
+    assert df["inteiro"].sum() == 499500
+
+
+def test_sessoes_expiradas_somem(tmp_path):
+    armazenamento = ArmazenamentoSessoes(str(tmp_path), ttl_segundos=60)
+    armazenamento.salvar("antiga", pd.DataFrame({"a": [1]}), {})
+    assert armazenamento.existe("antiga")
+
+    envelhecer(armazenamento.caminho_metadados("antiga"), 120)
+    assert not armazenamento.existe("antiga")
+    assert armazenamento.listar() == []
+    with pytest.raises(SessaoNaoEncontrada):
+        armazenamento.abrir("antiga")
+
+    # A próxima publicação apaga os arquivos expirados
+    armazenamento.salvar("nova", pd.DataFrame({"a": [1]}), {})
+    assert not os.path.exists(armazenamento.caminho_dados("antiga"))
+    assert [sessao["session_id"] for sessao in armazenamento.listar()] == ["nova"]
+
+
+def test_limite_de_bytes_remove_as_menos_usadas_pelo_mtime(tmp_path):
+    df = pd.DataFrame({"a": np.arange(10_000, dtype=np.int64)})
+    sonda = ArmazenamentoSessoes(str(tmp_path / "sonda"))
+    sonda.salvar("sonda", df, {})
+    tamanho = sonda.metadados("sonda")["bytes"]
+
+    # Cabem duas sessões, não três
+    armazenamento = ArmazenamentoSessoes(str(tmp_path / "sessoes"), limite_bytes=2 * tamanho + tamanho // 2)
+    armazenamento.salvar("primeira", df, {})
+    armazenamento.salvar("segunda", df, {})
+    envelhecer(armazenamento.caminho_dados("primeira"), 30)
+    envelhecer(armazenamento.caminho_dados("segunda"), 20)
+
+    # Ler a primeira atualiza o mtime: a segunda passa a ser a menos usada
+    armazenamento.abrir("primeira")
+    armazenamento.salvar("terceira", df, {})
+    assert sorted(sessao["session_id"] for sessao in armazenamento.listar()) == ["primeira", "terceira"]
+
+    # Uma sessão maior que o limite sozinha é mantida; as demais saem
+    grande = pd.DataFrame({"a": np.arange(100_000, dtype=np.int64)})
+    armazenamento.salvar("grande", grande, {})
+    assert [sessao["session_id"] for sessao in armazenamento.listar()] == ["grande"]
+
+
+def test_mutacoes_aguardam_a_trava_de_outro_processo(tmp_path):
+    armazenamento = ArmazenamentoSessoes(str(tmp_path))
+    armazenamento.salvar("travada", pd.DataFrame({"a": [1]}), {})
+
+    # Outro processo segurando a trava (flock vale por descritor aberto)
+    with open(os.path.join(str(tmp_path), ".lock"), "a") as trava:
+        fcntl.flock(trava, fcntl.LOCK_EX)
+        remocao = threading.Thread(target=armazenamento.remover, args=("travada",))
+        remocao.start()
+        time.sleep(0.2)
+        assert remocao.is_alive()
+        assert armazenamento.existe("travada")
+        fcntl.flock(trava, fcntl.LOCK_UN)
+    remocao.join(timeout=5)
+
+    assert not remocao.is_alive()
+    assert not armazenamento.existe("travada")
+    with pytest.raises(SessaoNaoEncontrada):
+        armazenamento.remover("travada")
@@ -0,0 +1,39 @@
+"""
+Treinamento dos candidatos do AutoML: um fold da validação cruzada que
+falha vale NaN, como no cross_val_score, e não descarta o algoritmo
+"""
+
+import numpy as np
+from sklearn.base import BaseEstimator, RegressorMixin
+from sklearn.linear_model import LinearRegression
+from sklearn.model_selection import cross_val_score
+
+from app.rotas.automl import treinar_candidatos
+
+
+class FalhaSemPrimeiraLinha(RegressorMixin, BaseEstimator):
+    """Falha ao treinar sem a linha de x = 0 (só no primeiro fold do KFold)"""
+
+    def fit(self, X, y):
+        if 0 not in X[:, 0]:
+            raise ValueError("linha obrigatória ausente")
+        self.media_ = float(np.mean(y))
+        return self
+
+    def predict(self, X):
+        return np.full(len(X), self.media_)
+
+
+def test_fold_com_erro_vale_nan():
+    X = np.arange(50, dtype=np.float64).reshape(-1, 1)
+    y = 3 * X[:, 0] + 1
+
+    ajustes = treinar_candidatos({"falha": FalhaSemPrimeiraLinha(), "linear": LinearRegression()}, X, y, cv=5)
+
+    modelo, scores = ajustes["falha"]
+    assert isinstance(modelo, FalhaSemPrimeiraLinha)
+    assert np.isnan(scores[0]) and not np.isnan(scores[1:]).any()
+    np.testing.assert_allclose(scores, cross_val_score(FalhaSemPrimeiraLinha(), X, y, cv=5))
+
+    modelo, scores = ajustes["linear"]
+    np.testing.assert_allclose(scores, np.ones(5))
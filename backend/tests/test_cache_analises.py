@@ -0,0 +1,70 @@
+"""
+Cache de análises: limites de itens e de bytes e impressões digitais de
+arquivos (uma versão por arquivo, em quantidade limitada)
+"""
+
+import os
+
+import app.servicos.cache_analises as modulo
+from app.servicos.cache_analises import CacheAnalises, impressao_digital_arquivo
+
+
+def resultado(tamanho: int) -> dict:
+    return {"texto": "x" * tamanho}
+
+
+def test_limite_de_bytes_remove_os_menos_usados():
+    tamanho = len(modulo.dumps(resultado(1000)))
+    cache = CacheAnalises(max_itens=100, limite_bytes=3 * tamanho)
+    for impressao in ("a", "b", "c"):
+        cache.guardar(impressao, "descritiva", None, resultado(1000))
+    assert cache.estatisticas()["bytes"] == 3 * tamanho
+
+    cache.obter("a", "descritiva")
+    cache.guardar("d", "descritiva", None, resultado(1000))
+    # "b" era o menos usado
+    assert cache.obter("b", "descritiva") is None
+    assert all(cache.obter(impressao, "descritiva") for impressao in ("a", "c", "d"))
+    assert cache.estatisticas()["remocoes"] == 1
+
+    # Substituir um item não conta o tamanho antigo
+    cache.guardar("a", "descritiva", None, resultado(10))
+    assert cache.estatisticas()["bytes"] == 2 * tamanho + len(modulo.dumps(resultado(10)))
+
+    # Maior que o limite inteiro: não é memorizado e não esvazia o cache
+    cache.guardar("e", "descritiva", None, resultado(10 * tamanho))
+    assert cache.obter("e", "descritiva") is None
+    assert cache.estatisticas()["itens"] == 3
+
+    assert cache.invalidar("c") == 1
+    cache.limpar()
+    assert cache.estatisticas()["bytes"] == 0
+
+
+def test_limite_de_itens():
+    cache = CacheAnalises(max_itens=2)
+    for impressao in ("a", "b", "c"):
+        cache.guardar(impressao, "correlacao", {"metodo": "pearson"}, resultado(10))
+    assert cache.obter("a", "correlacao", {"metodo": "pearson"}) is None
+    assert cache.obter("c", "correlacao", {"metodo": "pearson"}) is not None
+    assert cache.obter("c", "correlacao", {"metodo": "spearman"}) is None
+
+
+def test_impressoes_de_arquivos_uma_versao_por_arquivo(tmp_path, monkeypatch):
+    monkeypatch.setattr(modulo, "_impressoes_arquivos", modulo.OrderedDict())
+    monkeypatch.setattr(modulo, "MAX_IMPRESSOES_ARQUIVOS", 2)
+    caminho = tmp_path / "dados.csv"
+    caminho.write_text("a\n1\n")
+    primeira = impressao_digital_arquivo(str(caminho))
+
+    caminho.write_text("a\n2\n")
+    os.utime(caminho, ns=(0, os.stat(caminho).st_mtime_ns + 10 ** 9))
+    segunda = impressao_digital_arquivo(str(caminho))
+    assert segunda != primeira
+    # A versão nova substitui a anterior
+    assert len(modulo._impressoes_arquivos) == 1
+
+    for nome in ("b.csv", "c.csv"):
+        (tmp_path / nome).write_text(nome)
+        impressao_digital_arquivo(str(tmp_path / nome))
+    assert list(modulo._impressoes_arquivos) == [str(tmp_path / "b.csv"), str(tmp_path / "c.csv")]
@@ -0,0 +1,48 @@
+"""
+Carregador de datasets: cópia canônica em Parquet por dataset e versão do
+arquivo, substituída quando o arquivo muda e removida junto com o dataset
+"""
+
+import os
+
+import pandas as pd
+
+from conftest import DIRETORIO_TESTES
+
+
+def test_copia_canonica_por_versao_e_removida_com_o_dataset():
+    from app.database.conexao import SessionLocal
+    from app.modelos.dataset import Dataset
+    from app.modelos.projeto import Projeto
+    from app.modelos.usuario import Usuario
+    from app.servicos.carregador_datasets import carregador_datasets
+    from app.servicos.formato_colunar import diretorio_canonico
+
+    caminho = os.path.join(DIRETORIO_TESTES, "vendas.csv")
+    pd.DataFrame({"loja": ["a", "b", "a"], "valor": [1.5, 2.5, 3.5]}).to_csv(caminho, index=False)
+
+    db = SessionLocal()
+    db.merge(Usuario(id=3, nome="canonicos", email="canonicos@local", senha_hash="x"))
+    db.merge(Projeto(id=3, nome="canonicos", usuario_id=3))
+    db.add(Dataset(id=3, nome="vendas", arquivo_original="vendas.csv", caminho_arquivo=caminho, tipo_arquivo="csv", projeto_id=3))
+    db.commit()
+    try:
+        assert carregador_datasets.carregar_por_id(db, 3, ["valor"])["valor"].sum() == 7.5
+        # Fora do diretório do upload, uma cópia por dataset
+        assert not [nome for nome in os.listdir(DIRETORIO_TESTES) if nome.startswith("vendas.") and nome != "vendas.csv"]
+        primeira = os.listdir(diretorio_canonico(3))
+        assert len(primeira) == 1
+
+        # Nova versão do arquivo: a cópia anterior é substituída
+        pd.DataFrame({"loja": ["c"], "valor": [10.0]}).to_csv(caminho, index=False)
+        os.utime(caminho, ns=(0, os.stat(caminho).st_mtime_ns + 10 ** 9))
+        assert carregador_datasets.carregar_por_id(db, 3)["loja"].tolist() == ["c"]
+        segunda = os.listdir(diretorio_canonico(3))
+        assert len(segunda) == 1 and segunda != primeira
+
+        db.delete(db.get(Dataset, 3))
+        db.commit()
+        assert not os.path.exists(diretorio_canonico(3))
+        assert 3 not in carregador_datasets._itens
+    finally:
+        db.close()
@@ -0,0 +1,129 @@
+"""
+Cliente do IBGE contra um transporte simulado: TTL, resposta obsoleta
+servida durante a revalidação, busca única por URL, revalidação condicional
+e cópia antiga servida quando o IBGE falha
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from app.servicos.cliente_ibge import ClienteIBGE, ErroFonteDados
+
+URL = "https://ibge.teste/api/v1/localidades"
+
+
+class IBGESimulado:
+    """Responde com ETag e conta as requisições; `falhar` e `atraso` mudam o comportamento"""
+
+    def __init__(self):
+        self.requisicoes = []
+        self.versao = 1
+        self.falhar = False
+        self.atraso = 0.0
+
+    async def __call__(self, requisicao: httpx.Request) -> httpx.Response:
+        self.requisicoes.append(requisicao)
+        if self.atraso:
+            await asyncio.sleep(self.atraso)
+        if self.falhar:
+            return httpx.Response(500)
+        etag = f'"v{self.versao}"'
+        if requisicao.headers.get("if-none-match") == etag:
+            return httpx.Response(304, headers={"ETag": etag})
+        return httpx.Response(
+            200,
+            json={"versao": self.versao},
+            headers={"ETag": etag, "Last-Modified": "Wed, 01 Jan 2025 00:00:00 GMT"}
+        )
+
+
+def envelhecer(cliente: ClienteIBGE, segundos: float):
+    cliente._entradas[URL].obtida_em -= segundos
+
+
+async def aguardar_buscas(cliente: ClienteIBGE):
+    await asyncio.gather(*cliente._em_andamento.values(), return_exceptions=True)
+
+
+def executar(cenario):
+    async def com_cliente():
+        ibge = IBGESimulado()
+        cliente = ClienteIBGE(ttl=60, janela_obsoleta=600, transport=httpx.MockTransport(ibge))
+        try:
+            await cenario(cliente, ibge)
+        finally:
+            await cliente.fechar()
+
+    asyncio.run(com_cliente())
+
+
+def test_ttl_e_resposta_obsoleta_durante_revalidacao():
+    async def cenario(cliente: ClienteIBGE, ibge: IBGESimulado):
+        primeira = await cliente.obter_json(URL)
+        assert await cliente.obter_json(URL) is primeira
+        assert len(ibge.requisicoes) == 1
+
+        # Vencida, mas dentro da janela obsoleta: a cópia antiga sai na hora
+        ibge.versao = 2
+        envelhecer(cliente, 61)
+        assert await cliente.obter_json(URL) == {"versao": 1}
+        await aguardar_buscas(cliente)
+        assert len(ibge.requisicoes) == 2
+        assert await cliente.obter_json(URL) == {"versao": 2}
+
+        # Além da janela obsoleta: a requisição espera a resposta nova
+        ibge.versao = 3
+        envelhecer(cliente, 61 + 600)
+        assert await cliente.obter_json(URL) == {"versao": 3}
+        assert cliente.estatisticas()["downloads"] == 3
+
+    executar(cenario)
+
+
+def test_revalidacao_condicional():
+    async def cenario(cliente: ClienteIBGE, ibge: IBGESimulado):
+        primeira = await cliente.obter_json(URL)
+        envelhecer(cliente, 61 + 600)
+        # Sem mudança no IBGE: 304 e o mesmo objeto, com o TTL renovado
+        assert await cliente.obter_json(URL) is primeira
+        revalidacao = ibge.requisicoes[-1]
+        assert revalidacao.headers["if-none-match"] == '"v1"'
+        assert revalidacao.headers["if-modified-since"] == "Wed, 01 Jan 2025 00:00:00 GMT"
+        assert cliente.estatisticas()["revalidacoes"] == 1
+        assert cliente._entradas[URL].idade < 60
+
+    executar(cenario)
+
+
+def test_requisicoes_simultaneas_compartilham_uma_busca():
+    async def cenario(cliente: ClienteIBGE, ibge: IBGESimulado):
+        ibge.atraso = 0.05
+        respostas = await asyncio.gather(*[cliente.obter_json(URL) for _ in range(20)])
+        assert len(ibge.requisicoes) == 1
+        assert all(resposta is respostas[0] for resposta in respostas)
+
+        # A revalidação em segundo plano também é única
+        envelhecer(cliente, 61)
+        await asyncio.gather(*[cliente.obter_json(URL) for _ in range(20)])
+        await aguardar_buscas(cliente)
+        assert len(ibge.requisicoes) == 2
+
+    executar(cenario)
+
+
+def test_falha_do_ibge_serve_a_ultima_copia():
+    async def cenario(cliente: ClienteIBGE, ibge: IBGESimulado):
+        ibge.falhar = True
+        with pytest.raises(ErroFonteDados):
+            await cliente.obter_json(URL)
+
+        ibge.falhar = False
+        await cliente.obter_json(URL)
+        ibge.falhar = True
+        envelhecer(cliente, 61 + 600)
+        assert await cliente.obter_json(URL) == {"versao": 1}
+        assert cliente.estatisticas()["erros"] == 2
+
+    executar(cenario)
@@ -0,0 +1,105 @@
+"""
+Executor de tarefas: fila limitada, limites por tipo (TAREFAS_LIMITES),
+recriação do pool depois de um worker morrer e encerramento
+"""
+
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from app.servicos.executor_tarefas import ExecutorTarefas, FilaCheia, _ler_limites
+
+
+def test_limites_por_tipo_lidos_de_tarefas_limites(monkeypatch):
+    assert _ler_limites("automl=2, correlacao=8,invalido")["automl"] == 2
+    assert _ler_limites("automl=2, correlacao=8,invalido")["correlacao"] == 8
+    assert _ler_limites(None)["descritiva"] == 4
+
+    monkeypatch.setenv("TAREFAS_LIMITES", "automl=3,lote=2")
+    executor = ExecutorTarefas(max_processos=2)
+    assert executor.limites["automl"] == 3
+    assert executor.limites["lote"] == 2
+    # Tipos sem limite configurado usam o número de processos
+    assert executor.estatisticas()["por_tipo"]["lote"]["limite"] == 2
+
+
+def test_fila_cheia_recusa_novas_tarefas():
+    async def cenario():
+        executor = ExecutorTarefas(max_processos=1, max_fila=1)
+        try:
+            tarefa = executor.submeter("descritiva", time.sleep, 0.2)
+            assert executor.fila_cheia()
+            with pytest.raises(FilaCheia):
+                executor.submeter("descritiva", time.sleep, 0)
+            await tarefa
+            assert not executor.fila_cheia()
+        finally:
+            executor.encerrar()
+
+    asyncio.run(cenario())
+
+
+def test_semaforo_limita_execucoes_simultaneas_do_tipo():
+    async def cenario():
+        executor = ExecutorTarefas(max_processos=2, limites={"automl": 1})
+        try:
+            tarefas = [executor.submeter("automl", time.sleep, 0.5) for _ in range(2)]
+            tarefas.append(executor.submeter("outro", time.sleep, 0.5))
+            await asyncio.sleep(0.2)
+            por_tipo = executor.estatisticas()["por_tipo"]
+            # Duas tarefas de automl pendentes, só uma em execução; o outro tipo não espera por elas
+            assert por_tipo["automl"] == {"pendentes": 2, "em_execucao": 1, "limite": 1}
+            assert por_tipo["outro"]["em_execucao"] == 1
+            await asyncio.gather(*tarefas)
+            assert executor.total_pendentes == 0
+        finally:
+            executor.encerrar()
+
+    asyncio.run(cenario())
+
+
+def test_pool_quebrado_e_recriado():
+    async def cenario():
+        executor = ExecutorTarefas(max_processos=1)
+        falhas = []
+        resultados = []
+        try:
+            # O worker morre sem devolver resposta: o pool inteiro fica inutilizável
+            await executor.submeter("descritiva", os._exit, 1, ao_falhar=falhas.append)
+            assert falhas and type(falhas[0]).__name__ == "BrokenProcessPool"
+            assert executor._pool is None
+
+            await executor.submeter("descritiva", os.getpid, ao_concluir=resultados.append)
+            assert resultados and resultados[0] != os.getpid()
+            assert executor.total_pendentes == 0
+        finally:
+            executor.encerrar()
+
+    asyncio.run(cenario())
+
+
+def test_encerrar_libera_pool_e_retransmissor():
+    async def cenario():
+        executor = ExecutorTarefas(max_processos=1)
+        resultados = []
+        await executor.submeter("descritiva", os.getpid, ao_concluir=resultados.append)
+        retransmissor = executor._retransmissor._thread
+
+        executor.encerrar()
+        retransmissor.join(timeout=5)
+        assert not retransmissor.is_alive()
+        assert executor._pool is None and executor._retransmissor is None
+
+        # Um novo uso recria o pool e o retransmissor
+        await executor.submeter("descritiva", os.getpid, ao_concluir=resultados.append)
+        assert len(resultados) == 2
+        novo_retransmissor = executor._retransmissor._thread
+        assert novo_retransmissor is not retransmissor
+        executor.encerrar()
+        novo_retransmissor.join(timeout=5)
+        assert not any(thread.name == "retransmissor-progresso" for thread in threading.enumerate())
+
+    asyncio.run(cenario())
@@ -0,0 +1,39 @@
+"""
+Resumo de uploads em blocos: quartis exatos enquanto o arquivo cabe na
+amostra de reservatório e marcados como amostrados acima dela
+"""
+
+import io
+
+import numpy as np
+import pandas as pd
+
+from app.servicos.estatisticas import TAMANHO_AMOSTRA_QUARTIS
+from app.servicos.ingestao import ingerir_arquivo
+
+
+def csv_em_memoria(linhas: int) -> io.BytesIO:
+    conteudo = pd.DataFrame({"valor": np.arange(linhas, dtype=np.float64)}).to_csv(index=False)
+    return io.BytesIO(conteudo.encode())
+
+
+def test_quartis_exatos_dentro_da_amostra():
+    resumo = ingerir_arquivo(csv_em_memoria(1001), "pequeno.csv", linhas_por_bloco=100)["analysis"]
+    assert "quartiles_sampled" not in resumo
+    assert resumo["statistics"]["valor"]["quartiles"] == {0.25: 250.0, 0.5: 500.0, 0.75: 750.0}
+
+
+def test_quartis_marcados_como_amostrados_acima_da_amostra():
+    linhas = TAMANHO_AMOSTRA_QUARTIS + 10_000
+    resultado = ingerir_arquivo(csv_em_memoria(linhas), "grande.csv", linhas_por_bloco=20_000)
+    resumo = resultado["analysis"]
+    assert resumo["quartiles_sampled"] is True
+    # Média e extremos continuam exatos; a mediana é estimada pela amostra
+    estatisticas = resumo["statistics"]["valor"]
+    assert estatisticas["mean"] == (linhas - 1) / 2
+    assert (estatisticas["min"], estatisticas["max"]) == (0.0, linhas - 1)
+    assert abs(estatisticas["median"] - (linhas - 1) / 2) < 0.02 * linhas
+
+    # Os sketches do modo aproximado têm limites de erro próprios
+    aproximado = ingerir_arquivo(csv_em_memoria(linhas), "grande.csv", linhas_por_bloco=20_000, aproximado=True)
+    assert "quartiles_sampled" not in aproximado["analysis"] and aproximado["analysis"]["approximate"]
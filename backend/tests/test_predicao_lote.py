@@ -0,0 +1,28 @@
+"""
+Predição em lote em NDJSON: uma linha JSON válida por registro, com
+predição e probabilidades nulas nas linhas com valores ausentes
+"""
+
+import numpy as np
+import orjson
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+
+from app.servicos.predicao_lote import gerar_ndjson
+from app.servicos.registro_modelos import PacoteModelo
+
+
+def test_ndjson_por_registro():
+    X = np.array([[0.0], [1.0], [2.0], [3.0]])
+    modelo = LogisticRegression().fit(X, np.array([0, 0, 1, 1]))
+    pacote = PacoteModelo(1, modelo, None, ["x"], (), 0)
+    lotes = [pd.DataFrame({"x": [0.0, np.nan]}), pd.DataFrame({"x": [3.0]})]
+
+    corpo = b"".join(gerar_ndjson(pacote, iter(lotes)))
+    registros = [orjson.loads(linha) for linha in corpo.splitlines()]
+
+    assert [registro["indice"] for registro in registros] == [0, 1, 2]
+    assert [registro["predicao"] for registro in registros] == [0, None, 1]
+    assert registros[1]["probabilidades"] is None
+    assert set(registros[2]["probabilidades"]) == {"0", "1"}
+    assert registros[2]["probabilidades"]["1"] > 0.5
@@ -0,0 +1,252 @@
+"""
+Rotas de análise de ponta a ponta: cada análise roda no pool de processos
+do executor de tarefas, publica o progresso, grava o resultado no banco e uma
+segunda solicitação idêntica sai do cache
+"""
+
+import asyncio
+import os
+import time
+
+import httpx
+import numpy as np
+import orjson
+import pandas as pd
+from fastapi import FastAPI
+
+from conftest import DIRETORIO_TESTES
+
+
+def preparar_dataset() -> int:
+    from app.database.conexao import SessionLocal
+    from app.modelos.dataset import Dataset
+    from app.modelos.projeto import Projeto
+    from app.modelos.usuario import Usuario
+
+    gerador = np.random.default_rng(0)
+    x = gerador.normal(size=500)
+    caminho = f"{DIRETORIO_TESTES}/medidas.csv"
+    pd.DataFrame({
+        "x": x,
+        "y": 2 * x + gerador.normal(scale=0.1, size=500),
+        "z": gerador.normal(size=500),
+        "grupo": gerador.choice(["a", "b"], size=500)
+    }).to_csv(caminho, index=False)
+
+    db = SessionLocal()
+    db.merge(Usuario(id=1, nome="teste", email="teste@local", senha_hash="x"))
+    db.merge(Projeto(id=1, nome="teste", usuario_id=1))
+    db.merge(Dataset(id=1, nome="medidas", arquivo_original="medidas.csv", caminho_arquivo=caminho, tipo_arquivo="csv", projeto_id=1))
+    db.commit()
+    db.close()
+    return 1
+
+
+def eventos_sse(corpo: str):
+    for mensagem in corpo.strip().split("\n\n"):
+        linhas = dict(linha.split(": ", 1) for linha in mensagem.split("\n") if not linha.startswith(":"))
+        if linhas:
+            yield linhas["event"], orjson.loads(linhas["data"])
+
+
+async def executar_analise(cliente: httpx.AsyncClient, rota: str, corpo: dict) -> dict:
+    """Inicia a análise, acompanha o fluxo de progresso até o fim e devolve a resposta da solicitação e os resultados"""
+    from app.servicos.executor_tarefas import executor_tarefas
+
+    resposta = await cliente.post(rota, json=corpo)
+    assert resposta.status_code == 200, resposta.text
+    inicio = resposta.json()
+
+    progresso = await cliente.get(f"/progresso/{inicio['analise_id']}")
+    assert progresso.headers["content-type"].startswith("text/event-stream")
+    eventos = list(eventos_sse(progresso.text))
+    tipo, final = eventos[-1]
+    assert tipo == "concluida", eventos
+    assert final["referencia"]["analise_id"] == inicio["analise_id"]
+
+    # Os callbacks (ex.: gravar no cache) rodam no event loop depois do processo
+    while executor_tarefas.total_pendentes:
+        await asyncio.sleep(0.05)
+
+    status = (await cliente.get(f"/status/{inicio['analise_id']}")).json()
+    assert status["status"] == "concluida", status
+
+    resposta = await cliente.get(f"/resultados/{inicio['analise_id']}")
+    assert resposta.status_code == 200, resposta.text
+    return inicio, resposta.json()
+
+
+async def cenario():
+    from app.database.conexao import inicializar_database
+    from app.rotas.analise import router
+    from app.servicos.cache_analises import cache_analises
+    from app.servicos.correlacao import armazenamento_matrizes
+    from app.servicos.executor_tarefas import executor_tarefas
+
+    await inicializar_database()
+    dataset_id = preparar_dataset()
+
+    app = FastAPI()
+    app.include_router(router)
+    transporte = httpx.ASGITransport(app=app)
+    corpo = {"dataset_id": dataset_id, "tipo_analise": "correlacao"}
+    try:
+        async with httpx.AsyncClient(transport=transporte, base_url="http://teste", timeout=120) as cliente:
+            _, descritiva = await executar_analise(cliente, "/descritiva", {"dataset_id": dataset_id, "tipo_analise": "descritiva"})
+            estatisticas = descritiva["resultados"]["estatisticas_numericas"]
+            assert set(estatisticas) == {"x", "y", "z"}
+            assert estatisticas["x"]["contagem"] == 500
+            assert descritiva["relatorio"]
+
+            _, correlacao = await executar_analise(cliente, "/correlacao", corpo)
+            fortes = correlacao["resultados"]["correlacoes_fortes"]
+            assert [(par["variavel1"], par["variavel2"]) for par in fortes] == [("x", "y")]
+            assert correlacao["resultados"]["matriz_correlacao"]["x"]["x"] == 1.0
+
+            acertos = cache_analises.estatisticas()["acertos"]
+            inicio, repetida = await executar_analise(cliente, "/correlacao", corpo)
+            assert inicio["status"] == "concluida"
+            assert cache_analises.estatisticas()["acertos"] == acertos + 1
+            assert repetida["resultados"] == correlacao["resultados"]
+
+            # Uma tarefa que falha marca a análise como erro e encerra o fluxo de progresso
+            resposta = await cliente.post("/descritiva", json={
+                "dataset_id": dataset_id,
+                "tipo_analise": "descritiva",
+                "colunas_selecionadas": ["inexistente"]
+            })
+            analise_id = resposta.json()["analise_id"]
+            tipo, final = list(eventos_sse((await cliente.get(f"/progresso/{analise_id}")).text))[-1]
+            assert tipo == "erro" and final["mensagem"]
+            status = (await cliente.get(f"/status/{analise_id}")).json()
+            assert status["status"] == "erro"
+
+            # Matriz em blocos: lida do disco; a repetição vinda do cache ganha os arquivos por link
+            em_blocos = {**corpo, "parametros": {"em_blocos": True}}
+            original, resultado = await executar_analise(cliente, "/correlacao", em_blocos)
+            assert resultado["resultados"]["matriz"] == {"formato": "npy", "dimensao": [3, 3], "dtype": "float64"}
+            bloco = (await cliente.get(f"/correlacao/{original['analise_id']}/bloco", params={"tamanho": 2})).json()
+            assert bloco["linhas"] == ["x", "y"] and bloco["valores"][0][0] == 1.0
+
+            copia, _ = await executar_analise(cliente, "/correlacao", em_blocos)
+            assert copia["status"] == "concluida"
+            assert os.path.samefile(
+                armazenamento_matrizes.caminho(original["analise_id"]),
+                armazenamento_matrizes.caminho(copia["analise_id"])
+            )
+
+            # Remover a análise apaga só os arquivos dela
+            assert (await cliente.delete(f"/{original['analise_id']}")).status_code == 200
+            assert (await cliente.get(f"/status/{original['analise_id']}")).status_code == 404
+            assert not armazenamento_matrizes.existe(original["analise_id"])
+            assert (await cliente.get(f"/correlacao/{copia['analise_id']}/bloco")).status_code == 200
+
+            # O item do cache apontava para os arquivos removidos: a análise é recalculada
+            recalculada, _ = await executar_analise(cliente, "/correlacao", em_blocos)
+            assert recalculada["status"] == "iniciada"
+            assert armazenamento_matrizes.existe(recalculada["analise_id"])
+    finally:
+        executor_tarefas.encerrar()
+
+
+def test_analises_descritiva_e_correlacao_no_pool_de_processos():
+    asyncio.run(cenario())
+
+
+def test_parametros_da_correlacao_validados():
+    from app.database.conexao import inicializar_database
+    from app.rotas.analise import parametro_booleano, parametro_inteiro, router
+
+    assert parametro_booleano({"float32": "false"}, "float32") is False
+    assert parametro_booleano({"float32": "True"}, "float32") is True
+    assert parametro_booleano({}, "float32") is False
+    assert parametro_inteiro({"top_k": "10"}, "top_k", minimo=1) == 10
+    assert parametro_inteiro({"top_k": None}, "top_k", minimo=1) is None
+
+    async def cenario():
+        await inicializar_database()
+        dataset_id = preparar_dataset()
+        app = FastAPI()
+        app.include_router(router)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://teste") as cliente:
+            for parametros in (
+                {"top_k": "dez"},
+                {"top_k": 0},
+                {"top_k": 2.5},
+                {"float32": "talvez"},
+                {"em_blocos": [True]},
+                {"limiar": "alto"},
+                {"limiar": 1.5}
+            ):
+                resposta = await cliente.post("/correlacao", json={
+                    "dataset_id": dataset_id,
+                    "tipo_analise": "correlacao",
+                    "parametros": parametros
+                })
+                assert resposta.status_code == 400, parametros
+                assert list(parametros)[0] in resposta.json()["detail"]
+
+    asyncio.run(cenario())
+
+
+def test_matrizes_sem_leituras_expiram(tmp_path):
+    from app.servicos.correlacao import ArmazenamentoMatrizes
+
+    armazenamento = ArmazenamentoMatrizes(str(tmp_path), ttl_segundos=60)
+    df = pd.DataFrame(np.random.default_rng(0).normal(size=(50, 4)), columns=list("abcd"))
+    armazenamento.gravar(1, df, "pearson", False, 0.5, None)
+    armazenamento.vincular(1, 2)
+    momento = time.time() - 120
+    os.utime(armazenamento.caminho(1), (momento, momento))
+
+    # A leitura renova o prazo (o mtime é do arquivo, compartilhado pelos links)
+    armazenamento.ler_bloco(2, 0, 0, 2)
+    assert armazenamento.remover_expiradas() == 0
+
+    os.utime(armazenamento.caminho(1), (momento, momento))
+    armazenamento.gravar(3, df, "pearson", False, 0.5, None)
+    assert not armazenamento.existe(1) and not armazenamento.existe(2)
+    assert sorted(os.listdir(tmp_path)) == ["correlacao_3.json", "correlacao_3.npy"]
+
+
+def test_fila_cheia_responde_503(monkeypatch):
+    from app.database.conexao import SessionLocal, inicializar_database
+    from app.modelos.analise import Analise, StatusAnalise
+    from app.rotas.analise import router
+    from app.servicos.executor_tarefas import FilaCheia, executor_tarefas
+
+    def recusar(*args, **kwargs):
+        raise FilaCheia("Limite de tarefas pendentes atingido")
+
+    async def cenario():
+        await inicializar_database()
+        dataset_id = preparar_dataset()
+
+        app = FastAPI()
+        app.include_router(router)
+        corpo = {"dataset_id": dataset_id, "tipo_analise": "descritiva", "colunas_selecionadas": ["x", "z"]}
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://teste") as cliente:
+            # Fila cheia antes de criar a análise: nenhum registro novo
+            monkeypatch.setattr(executor_tarefas, "max_fila", 0)
+            resposta = await cliente.post("/descritiva", json=corpo)
+            assert resposta.status_code == 503
+            monkeypatch.undo()
+
+            # A fila enche entre a verificação e o envio: a análise criada termina com erro
+            monkeypatch.setattr(executor_tarefas, "submeter", recusar)
+            resposta = await cliente.post("/descritiva", json=corpo)
+            assert resposta.status_code == 503
+            assert resposta.json()["detail"] == "Fila de análises cheia. Tente novamente em instantes."
+
+    db = SessionLocal()
+    antes = db.query(Analise).count()
+    db.close()
+
+    asyncio.run(cenario())
+
+    db = SessionLocal()
+    novas = db.query(Analise).order_by(Analise.id).all()[antes:]
+    db.close()
+    assert len(novas) == 1
+    assert novas[0].status == StatusAnalise.ERRO
+    assert novas[0].resultados == {"erro": "Limite de tarefas pendentes atingido"}
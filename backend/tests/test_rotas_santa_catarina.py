@@ -0,0 +1,110 @@
+"""
+Séries de Santa Catarina: paginação por cursor e transmissão em NDJSON/CSV
+sobre um agregado simulado do IBGE
+"""
+
+import asyncio
+import csv
+import io
+import json
+
+import httpx
+from fastapi import FastAPI
+
+from app.servicos.tabelas_ibge import LINHAS_POR_BLOCO_STREAM, TabelaIndicador, codificar_cursor, decodificar_cursor
+
+MUNICIPIOS = 700
+ANOS = ("2010", "2020")
+
+
+def agregado() -> list:
+    """Resposta de /api/v3/agregados com um município sem dado em 2010"""
+    series = [
+        {
+            "localidade": {"id": str(4200000 + i), "nome": f"Município {i}"},
+            "serie": {ano: "..." if (i == 3 and ano == "2010") else str(1000 + i * 10 + int(ano) % 7) for ano in ANOS}
+        }
+        for i in range(MUNICIPIOS)
+    ]
+    return [{"resultados": [{"series": series}]}]
+
+
+def test_cursor_codifica_a_chave():
+    assert decodificar_cursor(codificar_cursor(42000012020)) == 42000012020
+    tabela = TabelaIndicador.de_payload(agregado())
+    posicoes = tabela.selecionar()
+    assert len(posicoes) == 2 * MUNICIPIOS - 1
+    assert len(tabela.apos_cursor(posicoes, tabela.cursor_de(posicoes[9]))) == len(posicoes) - 10
+
+
+def test_geradores_ndjson_e_csv_em_blocos():
+    tabela = TabelaIndicador.de_payload(agregado())
+    posicoes = tabela.selecionar()
+
+    blocos = list(tabela.gerar_ndjson(posicoes, "populacao"))
+    assert len(blocos) == -(-len(posicoes) // LINHAS_POR_BLOCO_STREAM)
+    registros = [json.loads(linha) for linha in b"".join(blocos).decode().splitlines()]
+    assert registros == tabela.registros(posicoes, "populacao")
+
+    blocos = list(tabela.gerar_csv(posicoes, "populacao"))
+    linhas = list(csv.DictReader(io.StringIO(b"".join(blocos).decode())))
+    # Cabeçalho só no primeiro bloco
+    assert len(blocos) > 1 and len(linhas) == len(posicoes)
+    assert linhas[0] == {"municipio_id": "4200000", "municipio_nome": "Município 0", "ano": "2010", "populacao": "1001"}
+
+    assert b"".join(tabela.gerar_csv(posicoes[:0], "populacao")) == b"municipio_id,municipio_nome,ano,populacao\r\n"
+
+
+def test_populacao_paginada_e_transmitida(monkeypatch):
+    from app.rotas.santa_catarina_completo import router
+    from app.servicos.cliente_ibge import cliente_ibge
+    from app.servicos.tabelas_ibge import tabelas_ibge
+
+    requisicoes = []
+
+    def ibge(requisicao: httpx.Request) -> httpx.Response:
+        requisicoes.append(requisicao)
+        return httpx.Response(200, json=agregado())
+
+    monkeypatch.setattr(cliente_ibge, "transport", httpx.MockTransport(ibge))
+    monkeypatch.setattr(cliente_ibge, "_entradas", {})
+    monkeypatch.setattr(tabelas_ibge, "_tabelas", {})
+
+    async def cenario():
+        app = FastAPI()
+        app.include_router(router)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://teste") as cliente:
+            vistos, cursor = [], None
+            while True:
+                parametros = {"limite": 300, **({"cursor": cursor} if cursor else {})}
+                pagina = (await cliente.get("/populacao", params=parametros)).json()
+                assert pagina["total_registros"] == 2 * MUNICIPIOS - 1
+                vistos += [(registro["municipio_id"], registro["ano"]) for registro in pagina["dados"]]
+                cursor = pagina["proximo_cursor"]
+                if cursor is None:
+                    break
+            # Todas as linhas com valor, em ordem, sem repetição
+            assert len(vistos) == len(set(vistos)) == 2 * MUNICIPIOS - 1
+            assert vistos == sorted(vistos, key=lambda chave: (int(chave[0]), chave[1]))
+            assert ("4200003", "2010") not in vistos
+
+            filtrada = (await cliente.get("/populacao", params={"municipio_id": 4200005, "ano": 2020})).json()
+            assert [registro["municipio_id"] for registro in filtrada["dados"]] == ["4200005"]
+            assert filtrada["anos_disponiveis"] == list(ANOS)
+
+            # A partir do cursor: tudo depois das duas linhas do primeiro município
+            ndjson = await cliente.get("/populacao", params={"formato": "ndjson", "cursor": codificar_cursor(42000002020)})
+            assert ndjson.headers["content-type"] == "application/x-ndjson"
+            assert len(ndjson.text.splitlines()) == 2 * MUNICIPIOS - 3
+
+            planilha = await cliente.get("/populacao", params={"formato": "csv", "ano": 2010})
+            assert planilha.headers["content-disposition"] == 'attachment; filename="populacao_sc.csv"'
+            assert len(list(csv.DictReader(io.StringIO(planilha.text)))) == MUNICIPIOS - 1
+
+            assert (await cliente.get("/populacao", params={"cursor": "!!"})).status_code == 400
+            assert (await cliente.get("/populacao", params={"formato": "xml"})).status_code == 400
+        await cliente_ibge.fechar()
+
+    asyncio.run(cenario())
+    # A tabela é montada uma vez e servida do cache nas demais requisições
+    assert len(requisicoes) == 1
@@ -0,0 +1,35 @@
+"""Conversão para os tipos registrados de um dataset"""
+
+import numpy as np
+import pandas as pd
+
+from app.servicos.tipos_colunas import aplicar_tipos
+
+
+def test_aplicar_tipos_mantem_colunas_que_nao_cabem_no_tipo():
+    df = pd.DataFrame({
+        "estoura": [1, 300, 70000],
+        "fracionario": [1.5, 2.0, 3.0],
+        "arredonda": [0.1, 0.2, 0.3],
+        "cabe": [1, 100, -3],
+        "inteiro_em_real": [1.0, 2.0, 3.0],
+        "exato_em_float32": [0.5, 2.0, np.nan]
+    })
+    tipos = {
+        "estoura": "int8",
+        "fracionario": "int8",
+        "arredonda": "float32",
+        "cabe": "int8",
+        "inteiro_em_real": "int16",
+        "exato_em_float32": "float32"
+    }
+
+    convertido = aplicar_tipos(df, tipos)
+
+    assert convertido["estoura"].tolist() == [1, 300, 70000]
+    assert convertido["estoura"].dtype == np.int64
+    assert convertido["fracionario"].dtype == np.float64
+    assert convertido["arredonda"].dtype == np.float64
+    assert convertido["cabe"].dtype == np.int8
+    assert convertido["inteiro_em_real"].dtype == np.int16
+    assert convertido["exato_em_float32"].dtype == np.float32